@@ -0,0 +1,199 @@
+"""
+Rasterized road-quality cost field.
+
+Segments are burned into a sparse grid of small lat/lon cells, stored as
+dense TILE x TILE NumPy tiles created on first use. Each cell holds the
+preference-independent metrics of the segments whose midpoint lies in it
+(pothole count, maintenance / suboptimal / medium length in meters) plus their
+warnings, so any preference or weight vector can be scored from the sums.
+
+Scoring a route walks the cells its edges cross (Bresenham between the cells
+of consecutive vertices), widens them by a disk of `radius_cells` to cover
+the proximity tolerance, and sums those cells. The cost depends on the route
+length only, not on how many segments exist.
+
+Updates are incremental: `upsert` / `remove` rebuild only the one cell the
+segment's midpoint falls in.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from segment_store import STATUS_MAINTENANCE, STATUS_MEDIUM, STATUS_SUBOPTIMAL
+
+Cell = Tuple[int, int]
+
+TILE = 64
+# Metric channels stored per cell
+POTHOLES, MAINTENANCE_M, SUBOPTIMAL_M, MEDIUM_M = range(4)
+_CHANNELS = 4
+
+
+class _Contribution:
+    __slots__ = ("cell", "values", "warnings")
+
+    def __init__(self, cell: Cell, values: np.ndarray, warnings: List[Dict[str, Any]]):
+        self.cell = cell
+        self.values = values
+        self.warnings = warnings
+
+
+class CostRaster:
+    """Sparse tiled grid of per-cell road metrics and warnings."""
+
+    def __init__(self, cell_size_deg: float = 0.0008, radius_cells: int = 2):
+        self.cell_size_deg = cell_size_deg
+        self.radius_cells = radius_cells
+        self._tiles: Dict[Cell, np.ndarray] = {}  # tile -> (_CHANNELS, TILE, TILE)
+        self._cell_members: Dict[Cell, Set[int]] = {}
+        self._cell_warnings: Dict[Cell, List[Dict[str, Any]]] = {}
+        self._contrib: Dict[int, _Contribution] = {}
+        # Disk rather than square neighbourhood, so the band a route covers is
+        # about as wide (2r + 1 cells) in every direction
+        r = radius_cells
+        self._offsets = np.array([
+            (dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1)
+            if dx * dx + dy * dy <= (r + 0.5) ** 2
+        ])
+
+    def __len__(self) -> int:
+        return len(self._contrib)
+
+    @property
+    def reach_deg(self) -> float:
+        """Farthest a counted segment midpoint can be from the route."""
+        return self.cell_size_deg * (self.radius_cells + 1)
+
+    def cell_of(self, lon: float, lat: float) -> Cell:
+        return (math.floor(lon / self.cell_size_deg), math.floor(lat / self.cell_size_deg))
+
+    # ---- updates ----
+    def upsert(
+        self,
+        segment_id: int,
+        mid_lat: float, mid_lon: float,
+        status: int,
+        pothole: bool,
+        length_m: float,
+    ) -> None:
+        """Burn (or re-burn) a segment; status is a segment_store status code."""
+        values = np.zeros(_CHANNELS)
+        values[POTHOLES] = float(pothole)
+        if status == STATUS_MAINTENANCE:
+            values[MAINTENANCE_M] = length_m
+        elif status == STATUS_SUBOPTIMAL:
+            values[SUBOPTIMAL_M] = length_m
+        elif status == STATUS_MEDIUM:
+            values[MEDIUM_M] = length_m
+        warnings = []
+        if pothole:
+            warnings.append({"lat": mid_lat, "lon": mid_lon, "type": "Pothole"})
+        if status == STATUS_MAINTENANCE:
+            # A pothole warning at the same spot already covers the road work
+            if not pothole:
+                warnings.append({"lat": mid_lat, "lon": mid_lon, "type": "Road Work"})
+        elif status == STATUS_SUBOPTIMAL:
+            warnings.append({"lat": mid_lat, "lon": mid_lon, "type": "Bad Road"})
+
+        old = self._contrib.get(segment_id)
+        cell = self.cell_of(mid_lon, mid_lat)
+        self._contrib[segment_id] = _Contribution(cell, values, warnings)
+        self._cell_members.setdefault(cell, set()).add(segment_id)
+        if old is not None and old.cell != cell:
+            self._cell_members[old.cell].discard(segment_id)
+            self._rebuild(old.cell)
+        self._rebuild(cell)
+
+    def remove(self, segment_id: int) -> None:
+        old = self._contrib.pop(segment_id, None)
+        if old is None:
+            return
+        self._cell_members[old.cell].discard(segment_id)
+        self._rebuild(old.cell)
+
+    def _rebuild(self, cell: Cell) -> None:
+        """Recompute one cell from its members (exact, no running float sums)."""
+        members = sorted(self._cell_members.get(cell, ()))
+        tile_key = (cell[0] // TILE, cell[1] // TILE)
+        tile = self._tiles.get(tile_key)
+        if tile is None:
+            if not members:
+                return
+            tile = self._tiles[tile_key] = np.zeros((_CHANNELS, TILE, TILE))
+        lx, ly = cell[0] % TILE, cell[1] % TILE
+        tile[:, lx, ly] = sum((self._contrib[sid].values for sid in members), np.zeros(_CHANNELS))
+        warnings = [w for sid in members for w in self._contrib[sid].warnings]
+        if warnings:
+            self._cell_warnings[cell] = warnings
+        else:
+            self._cell_warnings.pop(cell, None)
+        if not members:
+            del self._cell_members[cell]
+            if not tile.any():
+                del self._tiles[tile_key]
+
+    # ---- scoring ----
+    def route_cells(self, coords: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        (K, 2) cells within radius_cells of the cells the route crosses, in
+        order of first visit. coords: [lon, lat] pairs.
+        """
+        if not len(coords):
+            return np.empty((0, 2), dtype=np.int64)
+        vertices = np.floor(np.asarray(coords, dtype=np.float64) / self.cell_size_deg).astype(np.int64)
+        if len(vertices) == 1:
+            crossed = vertices
+        else:
+            # Bresenham on every edge at once: one cell per step along the major axis
+            start, delta = vertices[:-1], np.diff(vertices, axis=0)
+            steps = np.abs(delta).max(axis=1)
+            edge = np.repeat(np.arange(len(steps)), steps)
+            k = np.arange(len(edge)) - np.repeat(np.cumsum(steps) - steps, steps)
+            frac = (k / np.maximum(steps[edge], 1))[:, None]
+            crossed = np.vstack([start[edge] + np.rint(frac * delta[edge]).astype(np.int64), vertices[-1:]])
+        widened = (crossed[:, None, :] + self._offsets[None, :, :]).reshape(-1, 2)
+        _, first = np.unique(widened, axis=0, return_index=True)
+        return widened[np.sort(first)]
+
+    def route_metrics(self, coords: Sequence[Sequence[float]]) -> Dict[str, Any]:
+        """Same metrics as main.route_metrics, summed over the route's cells."""
+        cells = self.route_cells(coords)
+        totals = np.zeros(_CHANNELS)
+        if len(cells) and self._tiles:
+            local = cells % TILE
+            tiles, which = np.unique(cells // TILE, axis=0, return_inverse=True)
+            which = which.reshape(-1)
+            for i, (tx, ty) in enumerate(tiles.tolist()):
+                tile = self._tiles.get((tx, ty))
+                if tile is None:
+                    continue
+                mask = which == i
+                totals += tile[:, local[mask, 0], local[mask, 1]].sum(axis=1)
+
+        warnings: List[Dict[str, Any]] = []
+        if self._cell_warnings:
+            for cell in map(tuple, cells.tolist()):
+                found = self._cell_warnings.get(cell)
+                if found:
+                    warnings.extend(found)
+
+        maintenance_m = float(totals[MAINTENANCE_M])
+        return {
+            "pothole_count": int(round(totals[POTHOLES])),
+            "maintenance_length_m": maintenance_m,
+            "bad_road_length_m": maintenance_m + float(totals[SUBOPTIMAL_M]),
+            "medium_length_m": float(totals[MEDIUM_M]),
+            "warnings": warnings,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "segments": len(self._contrib),
+            "cells": len(self._cell_members),
+            "tiles": len(self._tiles),
+            "cell_size_deg": self.cell_size_deg,
+            "radius_cells": self.radius_cells,
+        }
@@ -0,0 +1,123 @@
+"""
+Geodesy helpers on NumPy arrays.
+
+Coordinates follow the GeoJSON convention used across the backend: lists of
+[lon, lat] pairs. Distances are great-circle (haversine) meters.
+
+A polyline's cumulative distance array (`cumulative_distances`) is the
+building block for everything along-route: total length is its last value,
+and positions at a given distance are found by binary search instead of
+walking the polyline.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000.0
+
+ArrayLike = Union[float, np.ndarray]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters (scalar)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def haversine_np(lat1: ArrayLike, lon1: ArrayLike, lat2: ArrayLike, lon2: ArrayLike) -> np.ndarray:
+    """Great-circle distance in meters, broadcast over NumPy arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dl = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def as_array(coords: Sequence[Sequence[float]]) -> np.ndarray:
+    """[lon, lat] pairs -> (N, 2) float64 array."""
+    return np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+
+def edge_lengths(coords: Sequence[Sequence[float]]) -> np.ndarray:
+    """Length of each polyline edge in meters, shape (N-1,)."""
+    arr = as_array(coords)
+    if len(arr) < 2:
+        return np.zeros(0)
+    return haversine_np(arr[:-1, 1], arr[:-1, 0], arr[1:, 1], arr[1:, 0])
+
+
+def cumulative_distances(coords: Sequence[Sequence[float]]) -> np.ndarray:
+    """Distance from the first point to every point, shape (N,), starting at 0."""
+    lengths = edge_lengths(coords)
+    cum = np.zeros(len(lengths) + 1)
+    np.cumsum(lengths, out=cum[1:])
+    return cum
+
+
+def path_distance_m(coords: Sequence[Sequence[float]]) -> float:
+    """Total polyline length in meters."""
+    return float(edge_lengths(coords).sum())
+
+
+def line_coords(from_lat: float, from_lon: float, to_lat: float, to_lon: float, steps: int) -> List[List[float]]:
+    """steps+1 evenly spaced [lon, lat] points from start to end (inclusive)."""
+    t = np.linspace(0.0, 1.0, steps + 1)
+    lon = from_lon + (to_lon - from_lon) * t
+    lat = from_lat + (to_lat - from_lat) * t
+    return np.column_stack((lon, lat)).tolist()
+
+
+def interpolate_at_distance(
+    coords: Sequence[Sequence[float]],
+    cumulative: np.ndarray,
+    distance_m: float,
+) -> List[float]:
+    """[lon, lat] of the point distance_m along the polyline (clamped to its ends)."""
+    arr = as_array(coords)
+    total = cumulative[-1]
+    d = min(max(distance_m, 0.0), total)
+    i = int(np.searchsorted(cumulative, d, side="right")) - 1
+    i = min(max(i, 0), len(arr) - 2)
+    span = cumulative[i + 1] - cumulative[i]
+    t = (d - cumulative[i]) / span if span > 0 else 0.0
+    return (arr[i] + (arr[i + 1] - arr[i]) * t).tolist()
+
+
+def project_point_to_polyline(
+    coords: Sequence[Sequence[float]],
+    cumulative: np.ndarray,
+    lat: float,
+    lon: float,
+) -> Tuple[float, float, int]:
+    """
+    Nearest point on the polyline to (lat, lon).
+    Returns (offset_m, along_m, edge_index): distance from the polyline, distance
+    along the polyline to the projected point, and the edge it falls on.
+    Uses a local equirectangular projection around the query point.
+    """
+    arr = as_array(coords)
+    if len(arr) == 1:
+        return haversine_m(lat, lon, arr[0, 1], arr[0, 0]), 0.0, 0
+    k = math.pi / 180.0 * EARTH_RADIUS_M
+    xy = np.empty_like(arr)
+    xy[:, 0] = (arr[:, 0] - lon) * k * math.cos(math.radians(lat))
+    xy[:, 1] = (arr[:, 1] - lat) * k
+
+    a = xy[:-1]
+    ab = xy[1:] - a
+    ab_sq = np.einsum("ij,ij->i", ab, ab)
+    # Query point is the origin of the local frame
+    t = np.clip(np.einsum("ij,ij->i", -a, ab) / np.where(ab_sq > 0, ab_sq, 1.0), 0.0, 1.0)
+    proj = a + ab * t[:, None]
+    dist = np.hypot(proj[:, 0], proj[:, 1])
+    i = int(np.argmin(dist))
+    along = cumulative[i] + (cumulative[i + 1] - cumulative[i]) * t[i]
+    return float(dist[i]), float(along), i
@@ -0,0 +1,201 @@
+"""
+In-process background jobs for long-running maintenance work.
+
+Jobs are submitted by type to a bounded queue and run by a fixed number of
+asyncio worker tasks, so at most `concurrency` jobs are active at once and
+submissions beyond `max_queued` waiting jobs are refused. A handler is an
+async function of the job; it reports progress through `Job.set_progress`
+and should await between chunks of work, so interactive requests keep being
+served. Pure CPU-bound steps (picklable functions of picklable arguments) can
+be sent to a process pool with `JobManager.run_in_process`.
+
+Cancelling a queued job drops it; cancelling a running one cancels its task,
+which takes effect at the handler's next await. `JobManager.stop` cancels
+both. Finished jobs are kept for inspection, up to `history` of them.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: int, job_type: str, params: Dict[str, Any]):
+        self.id = job_id
+        self.type = job_type
+        self.params = params
+        self.status = QUEUED
+        self.done = 0
+        self.total: Optional[int] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def set_progress(self, done: int, total: Optional[int] = None) -> None:
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = datetime.utcnow().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": self.type,
+            # Bulk inputs (e.g. imported segments) are shown as their length
+            "params": {k: len(v) if isinstance(v, list) else v for k, v in self.params.items()},
+            "status": self.status,
+            "progress": {
+                "done": self.done,
+                "total": self.total,
+                "fraction": round(self.done / self.total, 3) if self.total else None,
+            },
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+Handler = Callable[[Job], Awaitable[Any]]
+
+
+class JobManager:
+    """Bounded job queue with a fixed number of asyncio workers and an optional process pool."""
+
+    def __init__(
+        self,
+        handlers: Dict[str, Handler],
+        concurrency: int = 2,
+        max_queued: int = 100,
+        process_workers: int = 2,
+        history: int = 200,
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.process_workers = process_workers
+        self.history = history
+        self._jobs: "OrderedDict[int, Job]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for job in self._jobs.values():
+            if job.status == RUNNING and job.task is not None:
+                job.task.cancel()
+                job.finish(CANCELLED)
+            elif job.status == QUEUED:
+                # Never picked up by a worker, and the queue goes away with them
+                job.finish(CANCELLED)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ---- jobs ----
+    def submit(self, job_type: str, params: Dict[str, Any]) -> Job:
+        """Queue a job. Raises KeyError for an unknown type, JobQueueFull when the queue is full."""
+        if job_type not in self.handlers:
+            raise KeyError(job_type)
+        if self._queue is None:
+            raise RuntimeError("job manager not started")
+        if self.queued() >= self.max_queued:
+            raise JobQueueFull()
+        job = Job(next(self._ids), job_type, params)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self._trim()
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None) -> List[Job]:
+        """Jobs newest first, optionally only those with the given status."""
+        return [job for job in reversed(self._jobs.values()) if status is None or job.status == status]
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job; False if it had already finished."""
+        job = self._jobs[job_id]
+        if job.status in FINISHED:
+            return False
+        if job.status == QUEUED:
+            job.finish(CANCELLED)  # the worker skips it
+        elif job.task is not None:
+            job.task.cancel()
+        return True
+
+    def queued(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == QUEUED)
+
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == RUNNING)
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.status != QUEUED:
+                continue  # cancelled while waiting
+            job.status = RUNNING
+            job.started_at = datetime.utcnow().isoformat()
+            task = job.task = asyncio.create_task(self.handlers[job.type](job))
+            try:
+                # wait() rather than awaiting the task: stopping the worker must
+                # not look like a job cancellation (stop() cancels jobs itself)
+                await asyncio.wait({task})
+            finally:
+                job.task = None
+            if task.cancelled():
+                job.finish(CANCELLED)
+            elif task.exception() is not None:  # a failing job must not stop the worker
+                exc = task.exception()
+                job.error = str(exc) or type(exc).__name__
+                job.finish(FAILED)
+            else:
+                job.result = task.result()
+                job.finish(SUCCEEDED)
+            self._trim()
+
+    # ---- process pool ----
+    async def run_in_process(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a picklable CPU-bound function in the process pool (inline when process_workers is 0)."""
+        if self.process_workers <= 0:
+            return fn(*args, **kwargs)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
@@ -1,18 +1,68 @@
 from __future__ import annotations
 
+import asyncio
 import math
+import os
 import random
 import hashlib
+import json
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
-import httpx
-from fastapi import FastAPI, HTTPException, Query, Header
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+import osrm_client
+import geodesy
+from cost_raster import CostRaster
+from geodesy import cumulative_distances, line_coords
+from jobs import Job, JobManager, JobQueueFull
+from map_matching import match_trace, segment_traversals, trace_index
+from path_cache import PathResultCache
+from polyline import decode_polyline, encode_polyline
+from report_aggregates import BUCKETS as REPORT_BUCKETS, ReportAggregates
+from report_classifier import classify_note
+from road_graph import RoadGraph, load_road_graph
+from route_similarity import cluster_routes, routes_similar
+from segment_store import (
+    STATUS_CODES,
+    STATUS_INDEX,
+    STATUS_MAINTENANCE,
+    STATUS_MEDIUM,
+    STATUS_SUBOPTIMAL,
+    SegmentStore,
+)
+from sensor_ingest import (
+    SEVERITY_LABELS, BatchTooLarge, parse_columnar, parse_float32, parse_ndjson, severity_codes,
+)
+from sensor_store import SENSOR_DTYPE, SensorStore, make_records, to_dicts, to_timestamp_us
+from simplify import SIMPLIFY_METHODS, point_importance, simplify_with_importance, zoom_tolerance_m
+from spatial_index import SegmentGridIndex
+from store_index import SortedIndex
+
+logger = logging.getLogger(__name__)
+
 
-app = FastAPI(title="BBP + Road Frontend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler = asyncio.create_task(freshness_scheduler())
+    await JOBS.start()
+    yield
+    await JOBS.stop()
+    scheduler.cancel()
+    with suppress(asyncio.CancelledError):
+        await scheduler
+    await osrm_client.close_client()
+
+
+app = FastAPI(title="BBP + Road Frontend", lifespan=lifespan)
 
 # ---- Internationalization (i18n) ----
 # Translations for English, Chinese, Italian
@@ -242,61 +292,9 @@ class WeatherService:
 
 
 # ---- OSRM Routing Service ----
-OSRM_BASE_URL = "http://router.project-osrm.org"
-OSRM_TIMEOUT = 10.0
-
-
-def fetch_osrm_route(
-    from_lat: float, from_lon: float,
-    to_lat: float, to_lon: float,
-    profile: str = "bike",
-    alternatives: bool = True
-) -> Optional[Dict[str, Any]]:
-    """
-    Fetch route from OSRM (synchronous).
-    Returns OSRM response with real road geometry.
-    """
-    alt_param = "true" if alternatives else "false"
-    url = (
-        f"{OSRM_BASE_URL}/route/v1/{profile}/"
-        f"{from_lon},{from_lat};{to_lon},{to_lat}"
-        f"?overview=full&geometries=geojson&alternatives={alt_param}&steps=true"
-    )
-    try:
-        resp = httpx.get(url, timeout=OSRM_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
-        if data.get("code") == "Ok" and data.get("routes"):
-            return data
-        return None
-    except Exception:
-        return None
-
-
-def fetch_osrm_route_via_waypoint(
-    from_lat: float, from_lon: float,
-    via_lat: float, via_lon: float,
-    to_lat: float, to_lon: float,
-    profile: str = "bike"
-) -> Optional[Dict[str, Any]]:
-    """
-    Fetch route from OSRM with an intermediate waypoint.
-    Used to generate diverse candidate routes.
-    """
-    url = (
-        f"{OSRM_BASE_URL}/route/v1/{profile}/"
-        f"{from_lon},{from_lat};{via_lon},{via_lat};{to_lon},{to_lat}"
-        "?overview=full&geometries=geojson&alternatives=false&steps=true"
-    )
-    try:
-        resp = httpx.get(url, timeout=OSRM_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
-        if data.get("code") == "Ok" and data.get("routes"):
-            return data
-        return None
-    except Exception:
-        return None
+# Requests go through the pooled async client in osrm_client.py
+fetch_osrm_route = osrm_client.fetch_route
+fetch_osrm_route_via_waypoint = osrm_client.fetch_route_via_waypoint
 
 
 def calculate_perpendicular_waypoints(
@@ -346,14 +344,18 @@ def calculate_perpendicular_waypoints(
 def routes_are_similar(route1_coords: List[List[float]], route2_coords: List[List[float]], 
                        route1_dist: float, route2_dist: float,
                        distance_threshold: float = 0.02,
-                       coord_similarity_threshold: float = 0.8) -> bool:
+                       coord_similarity_threshold: float = 0.8,
+                       method: str = "overlap",
+                       tolerance_m: float = 50.0) -> bool:
     """
     Check if two routes are essentially the same.
     Returns True if routes are similar (should be deduplicated).
     
     Uses two criteria:
     1. Distance similarity (within threshold percentage)
-    2. Coordinate overlap (percentage of points that are close)
+    2. Shape similarity in meters (see route_similarity.routes_similar):
+       "overlap" = share of sampled route1 points within tolerance_m of route2,
+       "hausdorff"/"frechet" = shape distance within tolerance_m
     """
     # Check distance similarity
     if route1_dist > 0 and route2_dist > 0:
@@ -361,32 +363,12 @@ def routes_are_similar(route1_coords: List[List[float]], route2_coords: List[Lis
         if dist_diff > distance_threshold:
             return False  # Significantly different distances = different routes
     
-    # Check coordinate similarity by sampling
-    if not route1_coords or not route2_coords:
-        return True
-    
-    # Sample every Nth point from route1 and check if it's close to route2
-    sample_step = max(1, len(route1_coords) // 10)
-    close_count = 0
-    total_sampled = 0
-    
-    for i in range(0, len(route1_coords), sample_step):
-        total_sampled += 1
-        pt1 = route1_coords[i]
-        
-        # Check if this point is close to any point in route2
-        min_dist = float('inf')
-        for pt2 in route2_coords:
-            dist = math.sqrt((pt1[0] - pt2[0])**2 + (pt1[1] - pt2[1])**2)
-            min_dist = min(min_dist, dist)
-            if dist < 0.0005:  # ~50m tolerance
-                break
-        
-        if min_dist < 0.0005:
-            close_count += 1
-    
-    similarity = close_count / total_sampled if total_sampled > 0 else 1.0
-    return similarity >= coord_similarity_threshold
+    return routes_similar(
+        route1_coords, route2_coords,
+        method=method,
+        tolerance_m=tolerance_m,
+        overlap_threshold=coord_similarity_threshold,
+    )
 
 # CORS for Vite dev server (5173), local builds, and LAN access
 app.add_middleware(
@@ -402,25 +384,9 @@ def now_iso() -> str:
     return datetime.utcnow().isoformat()
 
 
-def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Great-circle distance in meters."""
-    R = 6_371_000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
-    return 2 * R * math.asin(math.sqrt(a))
-
-
 def path_line(from_lat: float, from_lon: float, to_lat: float, to_lon: float, steps: int = 30) -> List[List[float]]:
-    coords: List[List[float]] = []  # GeoJSON coords: [lon, lat]
-    for i in range(steps + 1):
-        t = i / steps
-        lat = from_lat + (to_lat - from_lat) * t
-        lon = from_lon + (to_lon - from_lon) * t
-        coords.append([lon, lat])
-    return coords
+    # GeoJSON coords: [lon, lat]
+    return line_coords(from_lat, from_lon, to_lat, to_lon, steps)
 
 
 def path_via(
@@ -438,18 +404,92 @@ def path_via(
 
 
 def path_distance_m(coords: List[List[float]]) -> float:
-    d = 0.0
-    for i in range(1, len(coords)):
-        lon1, lat1 = coords[i - 1]
-        lon2, lat2 = coords[i]
-        d += haversine_m(lat1, lon1, lat2, lon2)
-    return d
+    return geodesy.path_distance_m(coords)
 
 
 def estimate_duration_s(distance_m: float, speed_mps: float = 11.0) -> float:
     return distance_m / speed_mps
 
 
+# ---- Geometry encoding ----
+# "geojson": {"type": "LineString", ...} objects, "polyline": encoded polyline strings, "both": both
+GEOMETRY_FORMATS = {"geojson", "polyline", "both"}
+
+
+def check_geometry_format(geometry_format: str) -> None:
+    if geometry_format not in GEOMETRY_FORMATS:
+        raise HTTPException(status_code=400, detail="invalid geometry_format")
+
+
+def format_geometry_fields(obj: Dict[str, Any], geometry_format: str, key: str = "geometry") -> Dict[str, Any]:
+    """
+    Return a copy of obj where the GeoJSON LineString under `key` is replaced by
+    (or complemented with) its encoded polyline under `{key}_polyline`.
+    """
+    if geometry_format == "geojson" or key not in obj:
+        return obj
+    out = dict(obj)
+    out[f"{key}_polyline"] = encode_polyline(obj[key]["coordinates"])
+    if geometry_format == "polyline":
+        del out[key]
+    return out
+
+
+# ---- Geometry simplification ----
+# Map payloads can be thinned per zoom level (?zoom=) or explicit tolerance (?tolerance_m=).
+# Per-vertex importances are computed once per geometry (see simplify.py).
+SIMPLIFY_METHOD = os.environ.get("ROUTE_SIMPLIFY_METHOD", "dp")
+if SIMPLIFY_METHOD not in SIMPLIFY_METHODS:
+    SIMPLIFY_METHOD = "dp"
+
+SIMPLIFIABLE_KEYS = ("geometry", "_private_geometry")
+
+
+def resolve_tolerance_m(zoom: Optional[float], tolerance_m: Optional[float], lat: float) -> Optional[float]:
+    """Explicit tolerance wins over zoom; None means full resolution."""
+    if tolerance_m is not None:
+        return tolerance_m
+    if zoom is not None:
+        return zoom_tolerance_m(zoom, lat)
+    return None
+
+
+def geometry_importance(obj: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    return {
+        key: point_importance(obj[key]["coordinates"], SIMPLIFY_METHOD)
+        for key in SIMPLIFIABLE_KEYS
+        if key in obj
+    }
+
+
+def simplify_geometry_fields(
+    obj: Dict[str, Any],
+    tolerance_m: Optional[float],
+    importance: Optional[Dict[str, np.ndarray]] = None,
+) -> Dict[str, Any]:
+    """
+    Return a copy of obj with its LineString geometries simplified to tolerance_m.
+    `importance` holds precomputed per-vertex importances by key; missing ones
+    are computed on the fly.
+    """
+    if tolerance_m is None:
+        return obj
+    out = dict(obj)
+    for key in SIMPLIFIABLE_KEYS:
+        if key not in obj:
+            continue
+        coords = obj[key]["coordinates"]
+        imp = (importance or {}).get(key)
+        if imp is None or len(imp) != len(coords):
+            imp = point_importance(coords, SIMPLIFY_METHOD)
+        out[key] = {
+            "type": "LineString",
+            "coordinates": simplify_with_importance(coords, imp, tolerance_m, SIMPLIFY_METHOD),
+        }
+    out["geometry_tolerance_m"] = round(tolerance_m, 2)
+    return out
+
+
 # ---- Privacy By Design Helpers ----
 PRIVACY_FUZZ_METERS = 150  # Obfuscation radius in meters (~100-200m as per RASD)
 PRIVACY_GRID_SIZE_DEG = 0.002  # ~200m grid for snapping
@@ -492,7 +532,8 @@ def obfuscate_location(lat: float, lon: float, method: str = "noise") -> tuple:
 
 def obfuscate_trip_geometry(
     coords: List[List[float]], 
-    fuzz_distance_m: float = 150
+    fuzz_distance_m: float = 150,
+    cumulative: Optional[np.ndarray] = None,
 ) -> List[List[float]]:
     """
     Obfuscate the first and last ~fuzz_distance_m of a trip geometry
@@ -500,36 +541,27 @@ def obfuscate_trip_geometry(
     
     coords: List of [lon, lat] pairs (GeoJSON format)
     fuzz_distance_m: Distance in meters to obfuscate from start/end
+    cumulative: Optional precomputed cumulative distance array of coords;
+                trim points are then found by binary search
     
     Returns: Sanitized coordinate list with fuzzed start/end points
     """
     if len(coords) < 2:
         return coords
     
-    # Calculate total path distance and find trim indices
     result = coords.copy()
+    if cumulative is None:
+        cumulative = cumulative_distances(coords)
+    total = cumulative[-1]
+    
+    # First point at least fuzz_distance_m from the start
+    start_trim_idx = max(1, int(np.searchsorted(cumulative, fuzz_distance_m, side="left")))
+    if start_trim_idx >= len(coords):
+        start_trim_idx = 0
     
-    # Calculate distances from start
-    dist_from_start = 0.0
-    start_trim_idx = 0
-    for i in range(1, len(coords)):
-        lon1, lat1 = coords[i - 1]
-        lon2, lat2 = coords[i]
-        dist_from_start += haversine_m(lat1, lon1, lat2, lon2)
-        if dist_from_start >= fuzz_distance_m:
-            start_trim_idx = i
-            break
-    
-    # Calculate distances from end
-    dist_from_end = 0.0
-    end_trim_idx = len(coords) - 1
-    for i in range(len(coords) - 1, 0, -1):
-        lon1, lat1 = coords[i]
-        lon2, lat2 = coords[i - 1]
-        dist_from_end += haversine_m(lat1, lon1, lat2, lon2)
-        if dist_from_end >= fuzz_distance_m:
-            end_trim_idx = i
-            break
+    # Last point at least fuzz_distance_m from the end
+    j = int(np.searchsorted(cumulative, total - fuzz_distance_m, side="right")) - 1
+    end_trim_idx = min(j, len(coords) - 2) + 1 if j >= 0 else len(coords) - 1
     
     # If trip is too short, just obfuscate endpoints
     if start_trim_idx >= end_trim_idx:
@@ -566,6 +598,32 @@ AGGREGATION_THRESHOLD_BAD = 0.6  # If negative_score > this, segment is "mainten
 AGGREGATION_THRESHOLD_MEDIUM = 0.3  # If negative_score > this, segment is "medium"
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def report_timestamp(report: Dict[str, Any]) -> Optional[float]:
+    """
+    Creation time of a report in epoch seconds: created_ts, set by create_report,
+    or created_at parsed as a fallback. None if missing or malformed.
+    """
+    ts = report.get("created_ts")
+    if ts is not None:
+        return ts
+    try:
+        return (datetime.fromisoformat(report.get("created_at", "").replace("Z", "")) - _EPOCH).total_seconds()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def report_weight(fresh: bool, confirmed: bool) -> float:
+    weight = 1.0
+    if fresh:
+        weight *= AGGREGATION_FRESHNESS_WEIGHT
+    if confirmed:
+        weight *= AGGREGATION_CONFIRMED_WEIGHT
+    return weight
+
+
 def calculate_report_weight(report: Dict[str, Any]) -> float:
     """
     Calculate the weight of a report based on freshness and confirmation status.
@@ -575,23 +633,174 @@ def calculate_report_weight(report: Dict[str, Any]) -> float:
     - Confirmed reports get 1.5x weight
     - Base weight is 1.0
     """
-    weight = 1.0
-    
-    # Freshness weight
-    created_at_str = report.get("created_at", "")
+    ts = report_timestamp(report)
+    fresh = ts is not None and (time.time() - ts) // 86400 <= AGGREGATION_FRESHNESS_DAYS
+    return report_weight(fresh, bool(report.get("confirmed", False)))
+
+
+# Per count-matrix column (see report_aggregates.BUCKETS): report weight, and the
+# share of it voting negative / positive. Neutral reports lean slightly negative for safety.
+_BUCKET_WEIGHTS = np.array([report_weight(fresh, confirmed) for fresh, confirmed, _ in REPORT_BUCKETS])
+_NEGATIVE_SHARE = np.array([{"negative": 1.0, "positive": 0.0, "neutral": 0.3}[p] for _, _, p in REPORT_BUCKETS])
+_POSITIVE_SHARE = np.array([{"negative": 0.0, "positive": 1.0, "neutral": 0.7}[p] for _, _, p in REPORT_BUCKETS])
+_CONFIRMED_BUCKETS = np.array([confirmed for _, confirmed, _ in REPORT_BUCKETS])
+_FRESH_BUCKETS = np.array([fresh for fresh, _, _ in REPORT_BUCKETS])
+
+
+def aggregate_segments(segment_ids: Sequence[int]) -> List[Dict[str, Any]]:
+    """
+    aggregate_segment_reports for many segments at once: scores are computed
+    from REPORT_AGGREGATES.count_matrix with array operations, and status
+    changes are written back in one batch. All ids must be in SEGMENTS.
+    """
+    counts, current = _aggregation_inputs(segment_ids)
+    results, recommended = score_segments(segment_ids, counts, current)
+    return _store_recommended_statuses(results, recommended, current)
+
+
+async def _score_off_loop(
+    segment_ids: List[int],
+    counts: np.ndarray,
+    current: np.ndarray,
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """score_segments in the JOBS process pool, or a worker thread when it has no processes."""
+    if JOBS.process_workers > 0:
+        return await JOBS.run_in_process(score_segments, segment_ids, counts, current)
+    return await asyncio.to_thread(score_segments, segment_ids, counts, current)
+
+
+async def aggregate_partitions(
+    partitions: Sequence[Tuple[Tuple[int, int], List[int]]],
+) -> AsyncIterator[Tuple[Tuple[int, int], List[Dict[str, Any]]]]:
+    """
+    aggregate_segments over (tile, segment ids) partitions, yielding
+    (tile, results) in partition order. One chunk per JOBS process worker is
+    scored concurrently off the event loop (_score_off_loop); inputs are
+    snapshotted and statuses written back on the loop, one batch per chunk.
+    Segments deleted before their chunk is written back are left out.
+    """
+    pending: Deque[Tuple[Tuple[int, int], np.ndarray, "asyncio.Future"]] = deque()
+    remaining = iter(partitions)
+
+    def submit_next() -> bool:
+        for tile, segment_ids in remaining:
+            segment_ids = [sid for sid in segment_ids if sid in SEGMENTS]
+            counts, current = _aggregation_inputs(segment_ids)
+            pending.append((tile, current, asyncio.ensure_future(_score_off_loop(segment_ids, counts, current))))
+            return True
+        return False
+
     try:
-        created_at = datetime.fromisoformat(created_at_str.replace("Z", ""))
-        age_days = (datetime.utcnow() - created_at).days
-        if age_days <= AGGREGATION_FRESHNESS_DAYS:
-            weight *= AGGREGATION_FRESHNESS_WEIGHT
-    except (ValueError, TypeError):
-        pass  # If date parsing fails, use base weight
-    
-    # Confirmation weight
-    if report.get("confirmed", False):
-        weight *= AGGREGATION_CONFIRMED_WEIGHT
+        while len(pending) < max(1, JOBS.process_workers) and submit_next():
+            pass
+        while pending:
+            tile, current, scoring = pending.popleft()
+            results, recommended = await scoring
+            yield tile, _store_recommended_statuses(results, recommended, current)
+            submit_next()
+    finally:
+        for _, _, scoring in pending:
+            scoring.cancel()
+
+
+def _aggregation_inputs(segment_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Report count matrix and current status codes (a copy) of the segments."""
+    counts = REPORT_AGGREGATES.count_matrix(segment_ids, time.time())
+    return counts, SEGMENTS.status[SEGMENTS.rows_of(segment_ids)]
+
+
+def score_segments(
+    segment_ids: Sequence[int],
+    counts: np.ndarray,
+    current: np.ndarray,
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Weighted report scores of segments from their count matrix and current
+    status codes. Returns (results, recommended status codes); reads no
+    global state, so it can run off the event loop.
+    """
+    weighted = counts * _BUCKET_WEIGHTS
+    total_weight = weighted.sum(axis=1)
+    has_weight = total_weight > 0
+    safe_total = np.where(has_weight, total_weight, 1.0)
+    # Calculate normalized scores
+    negative_score = np.where(has_weight, weighted @ _NEGATIVE_SHARE / safe_total, 0.0)
+    positive_score = np.where(has_weight, weighted @ _POSITIVE_SHARE / safe_total, 0.0)
+    reports_total = counts.sum(axis=1)
+    confirmed_count = counts[:, _CONFIRMED_BUCKETS].sum(axis=1)
+    fresh_count = counts[:, _FRESH_BUCKETS].sum(axis=1)
     
-    return weight
+    # Determine recommended status
+    recommended = np.select(
+        [
+            negative_score >= AGGREGATION_THRESHOLD_BAD,
+            negative_score >= AGGREGATION_THRESHOLD_MEDIUM,
+            positive_score > 0.7,
+        ],
+        [STATUS_INDEX["maintenance"], STATUS_INDEX["medium"], STATUS_INDEX["optimal"]],
+        default=STATUS_INDEX["medium"],
+    )
+    recommended = np.where(reports_total > 0, recommended, current)
+    changed = recommended != current
+    aggregated_at = now_iso()
+    
+    results: List[Dict[str, Any]] = []
+    for i, segment_id in enumerate(segment_ids):
+        if not reports_total[i]:
+            results.append({
+                "segment_id": segment_id,
+                "reports_total": 0,
+                "weighted_negative_score": 0.0,
+                "weighted_positive_score": 0.0,
+                "recommended_status": STATUS_CODES[current[i]],
+                "status_changed": False,
+            })
+            continue
+        results.append({
+            "segment_id": segment_id,
+            "reports_total": int(reports_total[i]),
+            "reports_confirmed": int(confirmed_count[i]),
+            "reports_fresh": int(fresh_count[i]),
+            "weighted_negative_score": round(float(negative_score[i]), 3),
+            "weighted_positive_score": round(float(positive_score[i]), 3),
+            "previous_status": STATUS_CODES[current[i]],
+            "recommended_status": STATUS_CODES[recommended[i]],
+            "status_changed": bool(changed[i]),
+            "aggregated_at": aggregated_at,
+        })
+    return results, recommended
+
+
+def _store_recommended_statuses(
+    results: List[Dict[str, Any]],
+    recommended: np.ndarray,
+    current: np.ndarray,
+) -> List[Dict[str, Any]]:
+    """
+    Write back changed statuses in one batch. `current` holds the statuses the
+    results were scored from: a segment whose status has changed since keeps
+    it (its result reports status_changed false). Results of segments no
+    longer in SEGMENTS are dropped.
+    """
+    present = [i for i, result in enumerate(results) if result["segment_id"] in SEGMENTS]
+    if len(present) < len(results):
+        results = [results[i] for i in present]
+        recommended, current = recommended[present], current[present]
+    changed = [i for i, result in enumerate(results) if result["status_changed"]]
+    if changed:
+        rows = SEGMENTS.rows_of([results[i]["segment_id"] for i in changed])
+        unchanged_since = SEGMENTS.status[rows] == current[changed]
+        for i in np.asarray(changed)[~unchanged_since].tolist():
+            results[i] = {**results[i], "status_changed": False}
+        changed = np.asarray(changed)[unchanged_since]
+        rows = rows[unchanged_since]
+    if len(changed):
+        SEGMENTS.set_status_rows(rows, recommended[changed], aggregated_at=results[changed[0]]["aggregated_at"])
+        for i in changed.tolist():
+            segment_id = results[i]["segment_id"]
+            SEGMENT_INDEX.touch(segment_id)
+            burn_segment(segment_id)
+    return results
 
 
 def aggregate_segment_reports(segment_id: int) -> Dict[str, Any]:
@@ -599,7 +808,8 @@ def aggregate_segment_reports(segment_id: int) -> Dict[str, Any]:
     Aggregate reports for a segment using weighted voting.
     
     Algorithm:
-    1. Collect all reports for the segment
+    1. Read the segment's running report counts (REPORT_AGGREGATES), kept
+       per freshness / confirmation / note class by every report mutation
     2. Calculate weighted scores based on:
        - Report freshness (recent = higher weight)
        - Confirmation status (confirmed = higher weight)
@@ -612,107 +822,48 @@ def aggregate_segment_reports(segment_id: int) -> Dict[str, Any]:
     """
     if segment_id not in SEGMENTS:
         return {"error": "segment_id not found"}
-    
-    reports = [r for r in REPORTS.values() if r["segment_id"] == segment_id]
-    
-    if not reports:
-        return {
-            "segment_id": segment_id,
-            "reports_total": 0,
-            "weighted_negative_score": 0.0,
-            "weighted_positive_score": 0.0,
-            "recommended_status": SEGMENTS[segment_id]["status"],
-            "status_changed": False,
-        }
-    
-    # Keywords for classification
-    negative_keywords = ["bad", "pothole", "damage", "broken", "crack", "hole", 
-                         "rough", "dangerous", "hazard", "poor", "terrible"]
-    positive_keywords = ["good", "fixed", "repaired", "smooth", "clear", 
-                         "excellent", "optimal", "safe", "fine"]
-    
-    total_weight = 0.0
-    negative_weight = 0.0
-    positive_weight = 0.0
-    confirmed_count = 0
-    fresh_count = 0
-    
-    for report in reports:
-        weight = calculate_report_weight(report)
-        total_weight += weight
-        
-        if report.get("confirmed"):
-            confirmed_count += 1
-        
-        # Check freshness
-        try:
-            created_at = datetime.fromisoformat(report.get("created_at", "").replace("Z", ""))
-            if (datetime.utcnow() - created_at).days <= AGGREGATION_FRESHNESS_DAYS:
-                fresh_count += 1
-        except (ValueError, TypeError):
-            pass
-        
-        # Classify report
-        note = (report.get("note") or "").lower()
-        is_negative = any(kw in note for kw in negative_keywords)
-        is_positive = any(kw in note for kw in positive_keywords)
-        
-        # If no keywords, consider it neutral (slightly negative for caution)
-        if is_negative:
-            negative_weight += weight
-        elif is_positive:
-            positive_weight += weight
-        else:
-            # Neutral reports lean slightly negative for safety
-            negative_weight += weight * 0.3
-            positive_weight += weight * 0.7
-    
-    # Calculate normalized scores
-    if total_weight > 0:
-        negative_score = negative_weight / total_weight
-        positive_score = positive_weight / total_weight
-    else:
-        negative_score = 0.0
-        positive_score = 0.0
-    
-    # Determine recommended status
-    current_status = SEGMENTS[segment_id]["status"]
-    if negative_score >= AGGREGATION_THRESHOLD_BAD:
-        recommended_status = "maintenance"
-    elif negative_score >= AGGREGATION_THRESHOLD_MEDIUM:
-        recommended_status = "medium"
-    elif positive_score > 0.7:
-        recommended_status = "optimal"
-    else:
-        recommended_status = "medium"
-    
-    # Update segment status if changed
-    status_changed = False
-    if recommended_status != current_status:
-        SEGMENTS[segment_id]["status"] = recommended_status
-        SEGMENTS[segment_id]["last_aggregated"] = now_iso()
-        status_changed = True
-    
-    return {
-        "segment_id": segment_id,
-        "reports_total": len(reports),
-        "reports_confirmed": confirmed_count,
-        "reports_fresh": fresh_count,
-        "weighted_negative_score": round(negative_score, 3),
-        "weighted_positive_score": round(positive_score, 3),
-        "previous_status": current_status,
-        "recommended_status": recommended_status,
-        "status_changed": status_changed,
-        "aggregated_at": now_iso(),
-    }
+    return aggregate_segments([segment_id])[0]
 
 
 # ---- in-memory stores ----
 USERS: Dict[int, Dict[str, Any]] = {}
-SEGMENTS: Dict[int, Dict[str, Any]] = {}
+SEGMENTS = SegmentStore()  # columnar; segment dicts are materialized on read
 REPORTS: Dict[int, Dict[str, Any]] = {}
 TRIPS: Dict[int, Dict[str, Any]] = {}
-SENSOR_READINGS: Dict[int, List[Dict[str, Any]]] = {}  # user_id -> list of readings
+# user_id -> ring of the newest readings as NumPy records; older ones spill to disk
+SENSOR_READINGS_PER_USER = int(os.environ.get("SENSOR_READINGS_PER_USER", "1000"))
+SENSOR_READINGS = SensorStore(
+    capacity=SENSOR_READINGS_PER_USER,
+    spill_dir=os.environ.get("SENSOR_SPILL_DIR", ""),
+    spill_block=int(os.environ.get("SENSOR_SPILL_BLOCK", "256")),
+)
+TRIP_DISTANCE_PROFILES: Dict[int, np.ndarray] = {}  # trip_id -> cumulative distances of raw geometry
+TRIP_PUBLIC_DISTANCE_PROFILES: Dict[int, np.ndarray] = {}  # trip_id -> cumulative distances of public geometry
+TRIP_SIMPLIFICATION: Dict[int, Dict[str, np.ndarray]] = {}  # trip_id -> per-vertex importance by geometry key
+TRIP_TRAVERSALS: Dict[int, List[Dict[str, Any]]] = {}  # trip_id -> map-matched segment traversals, in ride order
+SEGMENT_USAGE: Dict[int, int] = {}  # segment_id -> number of trips that traversed it
+# Per-segment report counts behind aggregation, kept in sync by every report mutation
+REPORT_AGGREGATES = ReportAggregates(AGGREGATION_FRESHNESS_DAYS)
+
+# Secondary indexes, updated wherever the store above is inserted into or deleted from
+USERNAMES: Dict[str, int] = {}  # username -> user id
+REPORTS_BY_SEGMENT = SortedIndex()  # segment_id -> report ids, in creation order
+TRIPS_BY_USER = SortedIndex()  # user_id -> trip ids, by created_at
+
+# Spatial index over SEGMENTS geometry, kept in sync by every segment mutation
+SEGMENT_INDEX = SegmentGridIndex()
+# path_search results, invalidated through SEGMENT_INDEX cell versions
+PATH_RESULT_CACHE = PathResultCache(
+    SEGMENT_INDEX,
+    max_entries=int(os.environ.get("PATH_CACHE_SIZE", "512")),
+    ttl_s=float(os.environ.get("PATH_CACHE_TTL_S", "300")),
+)
+# Preference-independent candidate sets (routes + raw metrics) behind path_search and rerank
+CANDIDATE_CACHE = PathResultCache(
+    SEGMENT_INDEX,
+    max_entries=int(os.environ.get("PATH_CACHE_SIZE", "512")),
+    ttl_s=float(os.environ.get("PATH_CACHE_TTL_S", "300")),
+)
 
 _next_user_id = 1
 _next_segment_id = 1
@@ -762,11 +913,21 @@ class TripCreate(BaseModel):
     to_lat: float
     to_lon: float
     geometry: Optional[GeoJSONLineString] = None
+    geometry_polyline: Optional[str] = None  # encoded polyline, alternative to geometry
     distance_m: Optional[float] = None
     duration_s: Optional[float] = None
     use_osrm: bool = False
 
 
+MAX_TRACE_POINTS = 20000
+
+
+class TraceUpload(BaseModel):
+    user_id: int
+    points: List[Tuple[float, float]] = Field(min_length=2, max_length=MAX_TRACE_POINTS)  # [lat, lon] fixes
+    duration_s: Optional[float] = None
+
+
 class RoutesRequest(BaseModel):
     from_lat: float
     from_lon: float
@@ -784,6 +945,48 @@ class PathSearchRequest(BaseModel):
     origin: Coordinate
     destination: Coordinate
     preferences: str = Field(default="balanced")  # "safety_first", "shortest", "balanced"
+    budget_ms: Optional[float] = Field(default=None, gt=0)  # candidate generation deadline
+
+
+MAX_BATCH_PAIRS = 5000
+
+
+class PathSearchPair(BaseModel):
+    origin: Coordinate
+    destination: Coordinate
+    id: Optional[str] = None  # client reference, echoed back in the result line
+    preferences: Optional[str] = None  # overrides the batch preferences
+
+
+class PathSearchBatchRequest(BaseModel):
+    pairs: List[PathSearchPair] = Field(min_length=1, max_length=MAX_BATCH_PAIRS)
+    preferences: str = Field(default="balanced")
+    concurrency: int = Field(default=8, ge=1, le=32)  # pairs searched at the same time
+    budget_ms: Optional[float] = Field(default=None, gt=0)  # per pair, see PathSearchRequest
+
+
+MAX_MATRIX_POINTS = 500
+
+
+class MatrixRequest(BaseModel):
+    sources: List[Coordinate] = Field(min_length=1, max_length=MAX_MATRIX_POINTS)
+    destinations: Optional[List[Coordinate]] = Field(default=None, max_length=MAX_MATRIX_POINTS)  # default: sources
+
+
+class PenaltyWeights(BaseModel):
+    """Custom route penalty weights (same meaning as ROUTE_PENALTY_WEIGHTS entries)."""
+    pothole: float = Field(default=500, ge=0)  # per pothole
+    maintenance_m: float = Field(default=4.0, ge=0)  # per meter under maintenance
+    bad_m: float = Field(default=2.0, ge=0)  # per meter of bad road (maintenance included)
+    medium_m: float = Field(default=0.5, ge=0)  # per meter of medium road
+
+
+class RerankRequest(BaseModel):
+    origin: Coordinate
+    destination: Coordinate
+    preferences: Optional[List[str]] = None  # default: all built-in preferences
+    weights: Optional[PenaltyWeights] = None  # adds a "custom" ranking
+    budget_ms: Optional[float] = Field(default=None, gt=0)
 
 
 class SegmentWarning(BaseModel):
@@ -813,6 +1016,7 @@ def seed_demo_data():
         return
     u = {"id": _next_user_id, "username": "alice", "created_at": now_iso()}
     USERS[u["id"]] = u
+    USERNAMES[u["username"]] = u["id"]
     _next_user_id += 1
     
     # Initialize default settings for demo user
@@ -914,11 +1118,9 @@ def seed_demo_data():
     for seg in demo_segments:
         sid = _next_segment_id
         _next_segment_id += 1
-        SEGMENTS[sid] = {
-            "id": sid,
-            **seg,
-            "created_at": now_iso(),
-        }
+        SEGMENTS.add(sid, created_at=now_iso(), **seg)
+        SEGMENT_INDEX.insert(sid, seg["start_lat"], seg["start_lon"], seg["end_lat"], seg["end_lon"])
+        burn_segment(sid)
 
 
 @app.get("/")
@@ -933,13 +1135,14 @@ def root():
 @app.post("/api/users")
 def create_user(payload: UserCreate):
     global _next_user_id
-    for u in USERS.values():
-        if u["username"] == payload.username:
-            return u
+    existing = USERNAMES.get(payload.username)
+    if existing is not None:
+        return USERS[existing]
     uid = _next_user_id
     _next_user_id += 1
     u = {"id": uid, "username": payload.username, "created_at": now_iso()}
     USERS[uid] = u
+    USERNAMES[payload.username] = uid
     return u
 
 
@@ -953,11 +1156,10 @@ def list_users():
 def list_segments(user_id: Optional[int] = Query(default=None)):
     """List all segments with localized status labels."""
     lang = get_user_language(user_id)
-    segments = []
-    for seg in SEGMENTS.values():
-        seg_copy = dict(seg)
-        seg_copy["status_localized"] = translate(seg["status"], lang)
-        segments.append(seg_copy)
+    status_localized = {st: translate(st, lang) for st in STATUS_CODES}
+    segments = SEGMENTS.values()
+    for seg in segments:
+        seg["status_localized"] = status_localized[seg["status"]]
     return segments
 
 
@@ -971,18 +1173,19 @@ def create_segment(payload: SegmentCreate):
 
     sid = _next_segment_id
     _next_segment_id += 1
-    s = {
-        "id": sid,
-        "user_id": payload.user_id,
-        "start_lat": payload.start_lat,
-        "start_lon": payload.start_lon,
-        "end_lat": payload.end_lat,
-        "end_lon": payload.end_lon,
-        "status": payload.status,
-        "obstacle": payload.obstacle,
-        "created_at": now_iso(),
-    }
-    SEGMENTS[sid] = s
+    s = SEGMENTS.add(
+        sid,
+        user_id=payload.user_id,
+        start_lat=payload.start_lat,
+        start_lon=payload.start_lon,
+        end_lat=payload.end_lat,
+        end_lon=payload.end_lon,
+        status=payload.status,
+        obstacle=payload.obstacle,
+        created_at=now_iso(),
+    )
+    SEGMENT_INDEX.insert(sid, s["start_lat"], s["start_lon"], s["end_lat"], s["end_lon"])
+    burn_segment(sid)
     return s
 
 
@@ -993,11 +1196,15 @@ def delete_segment(segment_id: int):
         raise HTTPException(status_code=404, detail="segment_id not found")
     
     # Delete associated reports
-    report_ids_to_delete = [rid for rid, r in REPORTS.items() if r["segment_id"] == segment_id]
+    report_ids_to_delete = REPORTS_BY_SEGMENT.pop_group(segment_id)
+    REPORT_AGGREGATES.remove_segment(segment_id)
     for rid in report_ids_to_delete:
         del REPORTS[rid]
     
-    del SEGMENTS[segment_id]
+    SEGMENTS.remove(segment_id)
+    SEGMENT_INDEX.remove(segment_id)
+    COST_RASTER.remove(segment_id)
+    SEGMENT_USAGE.pop(segment_id, None)
     return {"ok": True, "deleted": segment_id, "reports_deleted": len(report_ids_to_delete)}
 
 
@@ -1009,14 +1216,20 @@ def create_report(segment_id: int, payload: ReportCreate):
         raise HTTPException(status_code=404, detail="segment_id not found")
     rid = _next_report_id
     _next_report_id += 1
+    created_at = datetime.utcnow()
     r = {
         "id": rid,
         "segment_id": segment_id,
         "note": payload.note,
         "confirmed": False,
-        "created_at": now_iso(),
+        "created_at": created_at.isoformat(),
+        # Classified once here; aggregation never looks at the note or created_at text again
+        "label": classify_note(payload.note),
+        "created_ts": (created_at - _EPOCH).total_seconds(),
     }
     REPORTS[rid] = r
+    REPORTS_BY_SEGMENT.add(rid, segment_id, rid)
+    REPORT_AGGREGATES.add(rid, segment_id, r["created_ts"], False, r["label"], r["created_ts"])
     return r
 
 
@@ -1024,7 +1237,7 @@ def create_report(segment_id: int, payload: ReportCreate):
 def list_reports(segment_id: int):
     if segment_id not in SEGMENTS:
         raise HTTPException(status_code=404, detail="segment_id not found")
-    return [r for r in REPORTS.values() if r["segment_id"] == segment_id]
+    return [REPORTS[rid] for rid in REPORTS_BY_SEGMENT.ids(segment_id)]
 
 
 @app.post("/api/reports/{report_id}/confirm")
@@ -1032,6 +1245,7 @@ def confirm_report(report_id: int):
     if report_id not in REPORTS:
         raise HTTPException(status_code=404, detail="report_id not found")
     REPORTS[report_id]["confirmed"] = True
+    REPORT_AGGREGATES.set_confirmed(report_id)
     return REPORTS[report_id]
 
 
@@ -1041,6 +1255,8 @@ def delete_report(report_id: int):
     if report_id not in REPORTS:
         raise HTTPException(status_code=404, detail="report_id not found")
     del REPORTS[report_id]
+    REPORTS_BY_SEGMENT.remove(report_id)
+    REPORT_AGGREGATES.remove(report_id)
     return {"ok": True, "deleted": report_id}
 
 
@@ -1072,14 +1288,8 @@ def trigger_aggregation_all():
     
     Returns summary of all segments processed and status changes.
     """
-    results = []
-    status_changes = 0
-    
-    for segment_id in SEGMENTS:
-        result = aggregate_segment_reports(segment_id)
-        if result.get("status_changed"):
-            status_changes += 1
-        results.append(result)
+    results = aggregate_segments(SEGMENTS.id_list())
+    status_changes = sum(1 for result in results if result["status_changed"])
     
     return {
         "triggered_at": now_iso(),
@@ -1089,9 +1299,139 @@ def trigger_aggregation_all():
     }
 
 
+# Partitions of the streamed city-wide aggregation: midpoint tiles (~5km), split into chunks
+AGGREGATION_TILE_DEG = float(os.environ.get("AGGREGATION_TILE_DEG", "0.05"))
+AGGREGATION_CHUNK_SIZE = int(os.environ.get("AGGREGATION_CHUNK_SIZE", "5000"))
+
+
+def aggregation_partitions() -> List[Tuple[Tuple[int, int], List[int]]]:
+    """
+    (tile, segment ids) chunks covering every segment: segments grouped by the
+    AGGREGATION_TILE_DEG tile of their midpoint, at most AGGREGATION_CHUNK_SIZE per chunk.
+    """
+    rows = SEGMENTS.active_rows()
+    if not len(rows):
+        return []
+    tiles = np.floor(np.column_stack([SEGMENTS.mid_lon[rows], SEGMENTS.mid_lat[rows]]) / AGGREGATION_TILE_DEG)
+    keys, which = np.unique(tiles.astype(np.int64), axis=0, return_inverse=True)
+    which = which.reshape(-1)
+    order = np.argsort(which, kind="stable")
+    bounds = np.searchsorted(which[order], np.arange(len(keys) + 1))
+    ids = SEGMENTS.ids[rows]
+    partitions = []
+    for k, (tx, ty) in enumerate(keys.tolist()):
+        tile_ids = np.sort(ids[order[bounds[k]:bounds[k + 1]]]).tolist()
+        for start in range(0, len(tile_ids), AGGREGATION_CHUNK_SIZE):
+            partitions.append(((tx, ty), tile_ids[start:start + AGGREGATION_CHUNK_SIZE]))
+    return partitions
+
+
+@app.post("/api/aggregation/trigger/stream")
+async def trigger_aggregation_stream(summary_only: bool = Query(default=False)):
+    """
+    City-wide aggregation streamed as NDJSON, for stores too large for one response.
+    
+    Segments are split into spatial chunks (see aggregation_partitions), scored in
+    parallel in the JOBS process pool (see aggregate_partitions) with each chunk's
+    status changes written back in one batch, so other requests are served
+    meanwhile. Chunks are streamed in order. Lines:
+    - {"type": "segment", ...aggregate_segment_reports result} per segment, or with
+      summary_only a {"type": "tile", "tile", "segments", "status_changes"} line per chunk
+    - a final {"type": "summary", "triggered_at", "segments_processed", "status_changes", "chunks", "elapsed_ms"}
+    """
+    async def stream():
+        started = time.perf_counter()
+        triggered_at = now_iso()
+        processed = status_changes = chunks = 0
+        async for tile, results in aggregate_partitions(aggregation_partitions()):
+            changes = sum(1 for result in results if result["status_changed"])
+            processed += len(results)
+            status_changes += changes
+            chunks += 1
+            if summary_only:
+                yield json.dumps({"type": "tile", "tile": tile, "segments": len(results), "status_changes": changes}) + "\n"
+            else:
+                yield "".join(json.dumps({"type": "segment", **result}) + "\n" for result in results)
+        yield json.dumps({
+            "type": "summary",
+            "triggered_at": triggered_at,
+            "segments_processed": processed,
+            "status_changes": status_changes,
+            "chunks": chunks,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# ---- Report freshness scheduler ----
+# Report weights drop once they age past AGGREGATION_FRESHNESS_DAYS. Instead of
+# re-aggregating every segment periodically, a background task sleeps until the
+# next report expiry (REPORT_AGGREGATES heap) and re-evaluates only the
+# segments whose reports just went stale.
+# Longest sleep between checks, so reports with an earlier expiry added meanwhile are still picked up
+FRESHNESS_SCHEDULER_MAX_SLEEP_S = float(os.environ.get("FRESHNESS_SCHEDULER_MAX_SLEEP_S", "60"))
+FRESHNESS_SCHEDULER_STATS: Dict[str, Any] = {
+    "runs": 0,
+    "segments_reevaluated": 0,
+    "status_changes": 0,
+    "last_run_at": None,
+    "errors": 0,
+    "last_error": None,
+}
+
+
+def expire_report_freshness(now: float) -> List[Dict[str, Any]]:
+    """Age out reports no longer fresh at `now` and re-aggregate their segments."""
+    REPORT_AGGREGATES.expire(now)
+    results = [
+        aggregate_segment_reports(segment_id)
+        for segment_id in REPORT_AGGREGATES.take_expired_segments()
+        if segment_id in SEGMENTS
+    ]
+    FRESHNESS_SCHEDULER_STATS["runs"] += 1
+    FRESHNESS_SCHEDULER_STATS["segments_reevaluated"] += len(results)
+    FRESHNESS_SCHEDULER_STATS["status_changes"] += sum(1 for r in results if r.get("status_changed"))
+    FRESHNESS_SCHEDULER_STATS["last_run_at"] = now_iso()
+    return results
+
+
+async def freshness_scheduler() -> None:
+    """Lifespan task: run expire_report_freshness whenever a report ages out."""
+    while True:
+        next_expiry = REPORT_AGGREGATES.next_expiry()
+        delay = FRESHNESS_SCHEDULER_MAX_SLEEP_S
+        if next_expiry is not None:
+            delay = min(delay, max(0.0, next_expiry - time.time()))
+        await asyncio.sleep(delay)
+        try:
+            expire_report_freshness(time.time())
+        except Exception as exc:  # a failing run must not stop the scheduler
+            logger.exception("report freshness run failed")
+            FRESHNESS_SCHEDULER_STATS["errors"] += 1
+            FRESHNESS_SCHEDULER_STATS["last_error"] = str(exc) or type(exc).__name__
+
+
+@app.get("/api/aggregation/scheduler")
+def freshness_scheduler_status():
+    """Counters of the report freshness scheduler and its next wake-up."""
+    next_expiry = REPORT_AGGREGATES.next_expiry()
+    return {
+        **FRESHNESS_SCHEDULER_STATS,
+        "scheduled_expiries": REPORT_AGGREGATES.scheduled_expiries(),
+        "next_expiry_at": datetime.utcfromtimestamp(next_expiry).isoformat() if next_expiry is not None else None,
+    }
+
+
 # ---- trips ----
 @app.post("/api/trips")
-def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
+async def create_trip(
+    payload: TripCreate,
+    use_osrm: bool = Query(default=False),
+    geometry_format: str = Query(default="geojson"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+):
     """
     Create a trip with Privacy By Design:
     - Raw coordinates are stored privately
@@ -1099,8 +1439,11 @@ def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
     - Includes weather information for the trip
     
     If use_osrm=true, query OSRM for real road geometry; otherwise fallback to straight interpolation.
+    geometry_format: "geojson" (default), "polyline" or "both" for the returned geometry.
+    zoom / tolerance_m: simplify the returned geometry (the stored trip keeps full resolution).
     """
     global _next_trip_id
+    check_geometry_format(geometry_format)
     if payload.user_id not in USERS:
         raise HTTPException(status_code=404, detail="user_id not found")
 
@@ -1112,7 +1455,7 @@ def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
 
     if use_osrm or payload.use_osrm:
         # Try OSRM for real road geometry (use bike profile)
-        osrm_data = fetch_osrm_route(
+        osrm_data = await fetch_osrm_route(
             payload.from_lat, payload.from_lon,
             payload.to_lat, payload.to_lon,
             profile="bike",
@@ -1132,9 +1475,17 @@ def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
             dur = estimate_duration_s(dist)
             route_source = "fallback"
     else:
+        uploaded: List[List[float]] = []
+        if payload.geometry_polyline:
+            try:
+                uploaded = decode_polyline(payload.geometry_polyline)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="invalid geometry_polyline")
+        elif payload.geometry and payload.geometry.coordinates:
+            uploaded = payload.geometry.coordinates
         coords = (
-            payload.geometry.coordinates
-            if payload.geometry and payload.geometry.coordinates
+            uploaded
+            if uploaded
             else path_line(payload.from_lat, payload.from_lon, payload.to_lat, payload.to_lon, steps=30)
         )
         dist = payload.distance_m if payload.distance_m is not None else path_distance_m(coords)
@@ -1142,7 +1493,8 @@ def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
 
     # Privacy By Design: Obfuscate start/end locations
     # Store raw coordinates privately, but create sanitized public version
-    public_coords = obfuscate_trip_geometry(coords, fuzz_distance_m=PRIVACY_FUZZ_METERS)
+    cumulative = cumulative_distances(coords)
+    public_coords = obfuscate_trip_geometry(coords, fuzz_distance_m=PRIVACY_FUZZ_METERS, cumulative=cumulative)
     
     # Obfuscate exact from/to coordinates for public display
     obf_from = obfuscate_location(payload.from_lat, payload.from_lon, "truncate")
@@ -1152,6 +1504,7 @@ def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
     mid_lat = (payload.from_lat + payload.to_lat) / 2
     mid_lon = (payload.from_lon + payload.to_lon) / 2
     weather = WeatherService.get_weather(mid_lat, mid_lon, lang)
+    matched = await match_trace_in_thread(coords)
 
     tid = _next_trip_id
     _next_trip_id += 1
@@ -1182,9 +1535,15 @@ def create_trip(payload: TripCreate, use_osrm: bool = Query(default=False)):
         "route_source": route_source,
     }
     TRIPS[tid] = trip
+    TRIPS_BY_USER.add(tid, trip["user_id"], trip["created_at"])
+    TRIP_DISTANCE_PROFILES[tid] = cumulative
+    TRIP_SIMPLIFICATION[tid] = geometry_importance(trip)
+    record_trip_traversals(tid, matched, cumulative)
     
     # Return public version (exclude private fields)
-    return {k: v for k, v in trip.items() if not k.startswith("_private")}
+    tolerance = resolve_tolerance_m(zoom, tolerance_m, payload.from_lat)
+    public = simplify_geometry_fields(sanitize_trip(trip), tolerance, TRIP_SIMPLIFICATION[tid])
+    return format_geometry_fields(public, geometry_format)
 
 
 # ---- Trip history ----
@@ -1193,17 +1552,43 @@ def sanitize_trip(trip: Dict[str, Any]) -> Dict[str, Any]:
     return {k: v for k, v in trip.items() if not k.startswith("_private")}
 
 
+def trip_importance(trip_id: int) -> Dict[str, np.ndarray]:
+    """Cached per-vertex importances of a trip's geometries (computed on first use)."""
+    importance = TRIP_SIMPLIFICATION.get(trip_id)
+    if importance is None:
+        importance = TRIP_SIMPLIFICATION[trip_id] = geometry_importance(TRIPS[trip_id])
+    return importance
+
+
+def render_trip(trip: Dict[str, Any], geometry_format: str, tolerance_m: Optional[float]) -> Dict[str, Any]:
+    if tolerance_m is not None:
+        trip = simplify_geometry_fields(trip, tolerance_m, trip_importance(trip["id"]))
+    trip = format_geometry_fields(trip, geometry_format)
+    return format_geometry_fields(trip, geometry_format, "_private_geometry")
+
+
 @app.get("/api/trips")
-def list_trips(user_id: int = Query(default=None), include_private: bool = Query(default=False)):
+def list_trips(
+    user_id: int = Query(default=None),
+    include_private: bool = Query(default=False),
+    geometry_format: str = Query(default="geojson"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+):
     """
     List all trips, optionally filtered by user_id.
     
     Privacy By Design: Private location data is only returned if include_private=true
     and the requesting user owns the trip (simplified: based on user_id filter).
+    geometry_format: "geojson" (default), "polyline" or "both".
+    zoom / tolerance_m: return simplified geometry for map overviews.
     """
-    trips = list(TRIPS.values())
+    check_geometry_format(geometry_format)
+    # Newest first
     if user_id is not None:
-        trips = [t for t in trips if t["user_id"] == user_id]
+        trips = [TRIPS[tid] for tid in TRIPS_BY_USER.ids(user_id, reverse=True)]
+    else:
+        trips = sorted(TRIPS.values(), key=lambda t: t["created_at"], reverse=True)
     
     # Only include private data if explicitly requested AND filtered by owner
     if include_private and user_id is not None:
@@ -1211,24 +1596,123 @@ def list_trips(user_id: int = Query(default=None), include_private: bool = Query
     else:
         result = [sanitize_trip(t) for t in trips]
     
-    return sorted(result, key=lambda t: t["created_at"], reverse=True)
+    if geometry_format != "geojson" or zoom is not None or tolerance_m is not None:
+        result = [
+            render_trip(t, geometry_format, resolve_tolerance_m(zoom, tolerance_m, t["from_lat"]))
+            for t in result
+        ]
+    return result
+
+
+SIMILARITY_METHODS = {"overlap", "hausdorff", "frechet"}
+
+
+@app.get("/api/trips/clusters")
+def cluster_trips(
+    user_id: int = Query(...),
+    method: str = Query(default="frechet"),
+    tolerance_m: float = Query(default=150.0, gt=0),
+):
+    """
+    Group a user's trips that follow (nearly) the same path, e.g. a daily commute.
+    Clustering uses the raw geometry server-side; only trip ids are returned.
+    """
+    if user_id not in USERS:
+        raise HTTPException(status_code=404, detail="user_id not found")
+    if method not in SIMILARITY_METHODS:
+        raise HTTPException(status_code=400, detail="invalid method")
+    
+    trips = [TRIPS[tid] for tid in TRIPS_BY_USER.ids(user_id)]
+    groups = cluster_routes(
+        [t["_private_geometry"]["coordinates"] for t in trips],
+        method=method,
+        tolerance_m=tolerance_m,
+    )
+    return {
+        "user_id": user_id,
+        "method": method,
+        "tolerance_m": tolerance_m,
+        "clusters": [
+            {
+                "trip_ids": [trips[i]["id"] for i in group],
+                "count": len(group),
+                "avg_distance_m": round(sum(trips[i]["distance_m"] for i in group) / len(group), 1),
+            }
+            for group in groups
+        ],
+    }
 
 
 @app.get("/api/trips/{trip_id}")
-def get_trip(trip_id: int, include_private: bool = Query(default=False)):
+def get_trip(
+    trip_id: int,
+    include_private: bool = Query(default=False),
+    geometry_format: str = Query(default="geojson"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+):
     """
     Get a single trip.
     
     Privacy By Design: Private location data is only returned if include_private=true.
     In production, this would also verify user ownership.
     """
+    check_geometry_format(geometry_format)
+    if trip_id not in TRIPS:
+        raise HTTPException(status_code=404, detail="trip_id not found")
+    
+    trip = TRIPS[trip_id] if include_private else sanitize_trip(TRIPS[trip_id])
+    return render_trip(trip, geometry_format, resolve_tolerance_m(zoom, tolerance_m, trip["from_lat"]))
+
+
+@app.get("/api/trips/{trip_id}/locate")
+def locate_on_trip(
+    trip_id: int,
+    distance_m: Optional[float] = Query(default=None, ge=0),
+    lat: Optional[float] = Query(default=None),
+    lon: Optional[float] = Query(default=None),
+    include_private: bool = Query(default=False),
+):
+    """
+    Along-route lookups on a trip, answered by binary search / one vectorized pass
+    over the trip's stored cumulative distance array.
+    
+    - distance_m: the point that far from the start of the trip
+    - lat/lon: projection of a position onto the trip (distance along it, offset from it)
+    
+    Privacy By Design: unless include_private=true, both lookups work on the
+    public (obfuscated) geometry and its length, so no answer depends on the
+    hidden first/last ~150m.
+    """
     if trip_id not in TRIPS:
         raise HTTPException(status_code=404, detail="trip_id not found")
     
-    trip = TRIPS[trip_id]
     if include_private:
-        return trip
-    return sanitize_trip(trip)
+        coords = TRIPS[trip_id]["_private_geometry"]["coordinates"]
+        profiles = TRIP_DISTANCE_PROFILES
+    else:
+        coords = TRIPS[trip_id]["geometry"]["coordinates"]
+        profiles = TRIP_PUBLIC_DISTANCE_PROFILES
+    cumulative = profiles.get(trip_id)
+    if cumulative is None:
+        cumulative = profiles[trip_id] = cumulative_distances(coords)
+    total = float(cumulative[-1])
+    
+    if distance_m is not None:
+        d = min(float(distance_m), total)
+        lon_at, lat_at = geodesy.interpolate_at_distance(coords, cumulative, d)
+        return {"trip_id": trip_id, "total_distance_m": round(total, 1), "distance_m": round(d, 1), "lat": lat_at, "lon": lon_at}
+    
+    if lat is None or lon is None:
+        raise HTTPException(status_code=400, detail="distance_m or lat/lon required")
+    offset_m, along_m, _ = geodesy.project_point_to_polyline(coords, cumulative, lat, lon)
+    return {
+        "trip_id": trip_id,
+        "total_distance_m": round(total, 1),
+        "distance_along_m": round(along_m, 1),
+        "offset_m": round(offset_m, 1),
+        "progress": round(along_m / total, 4) if total > 0 else 0.0,
+    }
 
 
 @app.delete("/api/trips/{trip_id}")
@@ -1236,9 +1720,111 @@ def delete_trip(trip_id: int):
     if trip_id not in TRIPS:
         raise HTTPException(status_code=404, detail="trip_id not found")
     del TRIPS[trip_id]
+    TRIPS_BY_USER.remove(trip_id)
+    TRIP_DISTANCE_PROFILES.pop(trip_id, None)
+    TRIP_PUBLIC_DISTANCE_PROFILES.pop(trip_id, None)
+    TRIP_SIMPLIFICATION.pop(trip_id, None)
+    forget_trip_traversals(trip_id)
     return {"ok": True, "deleted": trip_id}
 
 
+# ---- Map matching ----
+async def match_trace_in_thread(coords: List[List[float]]) -> List[Optional[int]]:
+    """
+    Map-match a raw trip geometry onto SEGMENTS (match_trace) in a worker
+    thread, against a snapshot of the segments near the trace, so long traces
+    do not block the event loop.
+    """
+    index = trace_index(SEGMENT_INDEX, coords)
+    return await asyncio.to_thread(match_trace, index, coords)
+
+
+def record_trip_traversals(trip_id: int, matched: List[Optional[int]], cumulative: np.ndarray) -> None:
+    """Store a trip's traversals from its matched segment ids and count its segments' usage."""
+    # Segments deleted while the trace was being matched are left out
+    matched = [sid if sid is not None and sid in SEGMENTS else None for sid in matched]
+    traversals = segment_traversals(matched, cumulative)
+    TRIP_TRAVERSALS[trip_id] = traversals
+    for sid in {t["segment_id"] for t in traversals}:
+        SEGMENT_USAGE[sid] = SEGMENT_USAGE.get(sid, 0) + 1
+
+
+def forget_trip_traversals(trip_id: int) -> None:
+    for sid in {t["segment_id"] for t in TRIP_TRAVERSALS.pop(trip_id, [])}:
+        if sid in SEGMENT_USAGE:
+            SEGMENT_USAGE[sid] -= 1
+            if not SEGMENT_USAGE[sid]:
+                del SEGMENT_USAGE[sid]
+
+
+def public_traversals(trip_id: int) -> List[Dict[str, Any]]:
+    """
+    Traversals outside the obfuscated first/last PRIVACY_FUZZ_METERS of the
+    trip, so segment ids do not reveal where it started or ended.
+    """
+    cumulative = TRIP_DISTANCE_PROFILES[trip_id]
+    total = float(cumulative[-1]) if len(cumulative) else 0.0
+    return [
+        t for t in TRIP_TRAVERSALS.get(trip_id, [])
+        if cumulative[t["from_index"]] >= PRIVACY_FUZZ_METERS
+        and cumulative[t["to_index"]] <= total - PRIVACY_FUZZ_METERS
+    ]
+
+
+@app.post("/api/trips/trace")
+async def upload_trace(
+    payload: TraceUpload,
+    geometry_format: str = Query(default="geojson"),
+):
+    """
+    Create a trip from a recorded GPS trace ([lat, lon] fixes, as collected by
+    the live tracker) and return it with its map-matched segment traversals.
+    """
+    points = payload.points
+    trip = await create_trip(
+        TripCreate(
+            user_id=payload.user_id,
+            from_lat=points[0][0], from_lon=points[0][1],
+            to_lat=points[-1][0], to_lon=points[-1][1],
+            geometry=GeoJSONLineString(coordinates=[[lon, lat] for lat, lon in points]),
+            duration_s=payload.duration_s,
+        ),
+        use_osrm=False,
+        geometry_format=geometry_format,
+        zoom=None,
+        tolerance_m=None,
+    )
+    return {**trip, "traversals": public_traversals(trip["id"])}
+
+
+@app.get("/api/trips/{trip_id}/segments")
+def trip_segments(trip_id: int, include_private: bool = Query(default=False)):
+    """
+    Segments a trip traversed, in ride order, from map matching its raw trace.
+    
+    Privacy By Design: traversals inside the obfuscated start/end zones are
+    only returned with include_private=true.
+    """
+    if trip_id not in TRIPS:
+        raise HTTPException(status_code=404, detail="trip_id not found")
+    traversals = TRIP_TRAVERSALS.get(trip_id, []) if include_private else public_traversals(trip_id)
+    return {"trip_id": trip_id, "traversals": traversals}
+
+
+@app.get("/api/segments/usage")
+def segments_usage(limit: int = Query(default=50, ge=1, le=1000)):
+    """Most ridden segments: number of trips whose trace was matched to each segment."""
+    ranked = sorted(SEGMENT_USAGE.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{"segment_id": sid, "trips": count} for sid, count in ranked]
+
+
+@app.get("/api/segments/{segment_id}/usage")
+def segment_usage(segment_id: int):
+    if segment_id not in SEGMENTS:
+        raise HTTPException(status_code=404, detail="segment_id not found")
+    return {"segment_id": segment_id, "trips": SEGMENT_USAGE.get(segment_id, 0)}
+
+
 # ---- Sensor Readings ----
 class SensorReadingCreate(BaseModel):
     """Model for creating sensor readings."""
@@ -1251,60 +1837,150 @@ class SensorReadingCreate(BaseModel):
     longitude: Optional[float] = None
 
 
+SENSOR_BATCH_MAX = int(os.environ.get("SENSOR_BATCH_MAX", "100000"))
+# Body size cap of a batch request, checked before it is read (~512 bytes per NDJSON sample)
+SENSOR_BATCH_MAX_BYTES = int(os.environ.get("SENSOR_BATCH_MAX_BYTES", str(SENSOR_BATCH_MAX * 512)))
+
+
 @app.get("/api/sensor-readings")
-def get_sensor_readings(user_id: int = Query(...)):
-    """Get sensor readings for a user."""
+def get_sensor_readings(
+    user_id: int = Query(...),
+    limit: int = Query(default=SENSOR_READINGS_PER_USER, ge=1, le=100000),
+):
+    """Get a user's latest sensor readings, oldest first."""
     if user_id not in USERS:
         raise HTTPException(status_code=404, detail="user_id not found")
     
-    readings = SENSOR_READINGS.get(user_id, [])
-    return readings
+    return to_dicts(SENSOR_READINGS.latest(user_id, limit), user_id)
 
 
-@app.post("/api/sensor-readings")
-def create_sensor_reading(user_id: int = Query(...), data: SensorReadingCreate = None):
+@app.get("/api/sensor-readings/stats")
+def get_sensor_reading_stats(user_id: int = Query(...)):
+    """How many of a user's readings are kept, in memory and spilled to disk."""
+    if user_id not in USERS:
+        raise HTTPException(status_code=404, detail="user_id not found")
+    return {"user_id": user_id, **SENSOR_READINGS.stats(user_id)}
+
+
+@app.get("/api/sensor-readings/export")
+def export_sensor_readings(user_id: int = Query(...)):
+    """
+    All of a user's readings as packed little-endian records (see
+    sensor_store.SENSOR_DTYPE), oldest first. Spilled readings are streamed
+    straight from the memory-mapped file.
+    """
+    if user_id not in USERS:
+        raise HTTPException(status_code=404, detail="user_id not found")
+    ring = SENSOR_READINGS.ring(user_id) if user_id in SENSOR_READINGS else None
+
+    def chunks():
+        if ring is None:
+            return
+        history, recent = ring.history(), ring.recent(ring.in_memory)
+        step = 1 << 16
+        for start in range(0, len(history), step):
+            yield memoryview(history[start:start + step]).cast("B")
+        yield recent.tobytes()
+
+    return StreamingResponse(
+        chunks(),
+        media_type="application/octet-stream",
+        headers={"X-Record-Bytes": str(SENSOR_DTYPE.itemsize)},
+    )
+
+
+@app.post("/api/sensor-readings")
+def create_sensor_reading(user_id: int = Query(...), data: SensorReadingCreate = None):
     """Record a new sensor reading."""
     global _next_sensor_id
     
     if user_id not in USERS:
         raise HTTPException(status_code=404, detail="user_id not found")
     
-    if user_id not in SENSOR_READINGS:
-        SENSOR_READINGS[user_id] = []
-    
-    # Calculate severity based on acceleration
-    z_peak = abs(data.acceleration_z) if data else 0
-    if z_peak > 25:
-        severity = "severe"
-    elif z_peak > 15:
-        severity = "pothole"
-    elif z_peak > 8:
-        severity = "bump"
-    else:
-        severity = "smooth"
-    
-    reading = {
-        "id": _next_sensor_id,
-        "user_id": user_id,
-        "acceleration_x": data.acceleration_x if data else 0,
-        "acceleration_y": data.acceleration_y if data else 0,
-        "acceleration_z": data.acceleration_z if data else 0,
-        "speed_mps": data.speed_mps if data else 0,
-        "gps_accuracy_m": data.gps_accuracy_m if data else None,
-        "latitude": data.latitude if data else None,
-        "longitude": data.longitude if data else None,
-        "severity": severity,
-        "timestamp": now_iso()
+    reading = data or SensorReadingCreate(acceleration_x=0, acceleration_y=0, acceleration_z=0)
+    columns = {
+        name: np.array([np.nan if value is None else value], dtype=np.float64)
+        for name, value in reading.model_dump().items()
     }
-    
-    SENSOR_READINGS[user_id].append(reading)
+    records = make_records(
+        _next_sensor_id,
+        to_timestamp_us(datetime.utcnow()),
+        columns,
+        severity_codes(columns["acceleration_z"]),
+    )
     _next_sensor_id += 1
-    
-    # Keep only last 1000 readings per user
-    if len(SENSOR_READINGS[user_id]) > 1000:
-        SENSOR_READINGS[user_id] = SENSOR_READINGS[user_id][-1000:]
-    
-    return reading
+    SENSOR_READINGS.append(user_id, records)
+    return to_dicts(records, user_id)[0]
+
+
+async def _read_body_limited(request: Request, max_bytes: int) -> bytes:
+    """Request body; 413 from Content-Length, or once more than max_bytes have arrived."""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail="batch too large")
+    chunks: List[bytes] = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail="batch too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@app.post("/api/sensor-readings/batch")
+async def create_sensor_readings_batch(
+    request: Request,
+    user_id: int = Query(...),
+    fields: Optional[str] = Query(default=None),
+):
+    """
+    Record many sensor readings in one request. The body is columnar JSON
+    ({"acceleration_x": [...], ...}), NDJSON (Content-Type
+    application/x-ndjson, one reading per line) or packed little-endian
+    float32 records (application/octet-stream) of the comma-separated
+    `fields`, all sensor fields in declaration order by default.
+    The batch is classified with NumPy and appended at once.
+    Batches over SENSOR_BATCH_MAX_BYTES or SENSOR_BATCH_MAX samples get a 413
+    as soon as that is known, without reading or parsing the rest.
+    """
+    global _next_sensor_id
+
+    if user_id not in USERS:
+        raise HTTPException(status_code=404, detail="user_id not found")
+    body = await _read_body_limited(request, SENSOR_BATCH_MAX_BYTES)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        if content_type == "application/octet-stream":
+            columns = parse_float32(body, fields.split(",") if fields else None, SENSOR_BATCH_MAX)
+        elif content_type == "application/x-ndjson":
+            columns = parse_ndjson(body, SENSOR_BATCH_MAX)
+        else:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise ValueError("invalid JSON")
+            columns = parse_columnar(payload, SENSOR_BATCH_MAX)
+    except BatchTooLarge:
+        raise HTTPException(status_code=413, detail="batch too large")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    size = len(columns["acceleration_z"])
+
+    codes = severity_codes(columns["acceleration_z"])
+    columns["speed_mps"] = np.where(np.isnan(columns["speed_mps"]), 0.0, columns["speed_mps"])
+    records = make_records(_next_sensor_id, to_timestamp_us(datetime.utcnow()), columns, codes)
+    _next_sensor_id += size
+    SENSOR_READINGS.append(user_id, records)
+
+    counts = np.bincount(codes, minlength=len(SEVERITY_LABELS))
+    return {
+        "user_id": user_id,
+        "received": size,
+        "first_id": int(records["id"][0]) if size else None,
+        "last_id": int(records["id"][-1]) if size else None,
+        "severity_counts": dict(zip(SEVERITY_LABELS, counts.tolist())),
+    }
 
 
 # ---- Auto-detection & batch confirmation ----
@@ -1401,8 +2077,10 @@ def apply_detection(segment_id: int, new_status: str = Query(...)):
     if new_status not in {"optimal", "medium", "maintenance", "suboptimal"}:
         raise HTTPException(status_code=400, detail="invalid status")
     
-    old_status = SEGMENTS[segment_id]["status"]
-    SEGMENTS[segment_id]["status"] = new_status
+    old_status = SEGMENTS.status_of(segment_id)
+    SEGMENTS.set_status(segment_id, new_status)
+    SEGMENT_INDEX.touch(segment_id)
+    burn_segment(segment_id)
     return {
         "segment_id": segment_id,
         "old_status": old_status,
@@ -1418,6 +2096,7 @@ def batch_confirm_reports(report_ids: List[int]):
     for rid in report_ids:
         if rid in REPORTS:
             REPORTS[rid]["confirmed"] = True
+            REPORT_AGGREGATES.set_confirmed(rid)
             results.append({"id": rid, "confirmed": True})
         else:
             results.append({"id": rid, "error": "not found"})
@@ -1433,17 +2112,28 @@ def auto_confirm_reports(segment_id: int, threshold: int = Query(default=2)):
     if segment_id not in SEGMENTS:
         raise HTTPException(status_code=404, detail="segment_id not found")
     
-    reports = [r for r in REPORTS.values() if r["segment_id"] == segment_id and not r["confirmed"]]
-    if len(reports) < threshold:
+    confirmed_ids = auto_confirm_segment(segment_id, threshold)
+    if confirmed_ids is None:
         return {"auto_confirmed": 0, "message": f"Need at least {threshold} unconfirmed reports"}
+    return {"auto_confirmed": len(confirmed_ids), "report_ids": confirmed_ids}
+
+
+def auto_confirm_segment(segment_id: int, threshold: int) -> Optional[List[int]]:
+    """
+    Confirm all unconfirmed reports of a segment if there are at least threshold.
+    Returns their ids, None when there are too few.
+    """
+    reports = [REPORTS[rid] for rid in REPORTS_BY_SEGMENT.ids(segment_id) if not REPORTS[rid]["confirmed"]]
+    if len(reports) < threshold:
+        return None
     
     # Simple pattern: confirm all if we have enough reports
     confirmed_ids = []
     for r in reports:
         REPORTS[r["id"]]["confirmed"] = True
+        REPORT_AGGREGATES.set_confirmed(r["id"])
         confirmed_ids.append(r["id"])
-    
-    return {"auto_confirmed": len(confirmed_ids), "report_ids": confirmed_ids}
+    return confirmed_ids
 
 
 # ---- Settings ----
@@ -1543,13 +2233,11 @@ def get_stats(user_id: Optional[int] = Query(default=None)):
     total_trips = len(TRIPS)
     confirmed_reports = sum(1 for r in REPORTS.values() if r["confirmed"])
     
-    status_counts = {}
+    status_counts = SEGMENTS.status_counts()
     status_counts_localized = {}
-    for seg in SEGMENTS.values():
-        st = seg["status"]
-        status_counts[st] = status_counts.get(st, 0) + 1
+    for st, count in status_counts.items():
         st_loc = translate(st, lang)
-        status_counts_localized[st_loc] = status_counts_localized.get(st_loc, 0) + 1
+        status_counts_localized[st_loc] = status_counts_localized.get(st_loc, 0) + count
     
     total_distance = sum(t.get("distance_m", 0) for t in TRIPS.values())
     
@@ -1565,16 +2253,25 @@ def get_stats(user_id: Optional[int] = Query(default=None)):
 
 
 @app.post("/api/routes")
-def preview_routes(req: RoutesRequest, user_id: Optional[int] = Query(default=None)):
+async def preview_routes(
+    req: RoutesRequest,
+    user_id: Optional[int] = Query(default=None),
+    geometry_format: str = Query(default="geojson"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+):
     """
     Preview multiple route options between two points.
     Uses OSRM for real road geometry when available.
+    geometry_format: "geojson" (default), "polyline" or "both".
+    zoom / tolerance_m: simplify the returned geometries.
     """
+    check_geometry_format(geometry_format)
     lang = get_user_language(user_id)
     route_source = "osrm"
     
     # Try OSRM first
-    osrm_data = fetch_osrm_route(
+    osrm_data = await fetch_osrm_route(
         req.from_lat, req.from_lon,
         req.to_lat, req.to_lon,
         profile="bike",
@@ -1654,15 +2351,52 @@ def preview_routes(req: RoutesRequest, user_id: Optional[int] = Query(default=No
     mid_lat = (req.from_lat + req.to_lat) / 2
     mid_lon = (req.from_lon + req.to_lon) / 2
     weather = WeatherService.get_weather(mid_lat, mid_lon, lang)
+    tolerance = resolve_tolerance_m(zoom, tolerance_m, req.from_lat)
     
     return {
-        "routes": routes,
+        "routes": [
+            format_geometry_fields(simplify_geometry_fields(r, tolerance), geometry_format)
+            for r in routes
+        ],
         "route_source": route_source,
         "weather_summary": weather["summary"],
         "weather": weather,
     }
 
 
+@app.post("/api/matrix")
+async def distance_matrix(req: MatrixRequest):
+    """
+    Many-to-many bike distances (m) and durations (s), sources x destinations
+    (destinations default to the sources).
+    
+    Cells come from an OSRM table request, cached per cell (see
+    osrm_client.fetch_matrix); cells OSRM cannot answer are estimated from the
+    great-circle distance and flagged in `estimated`.
+    """
+    destinations = req.destinations if req.destinations is not None else req.sources
+    src = [(p.lat, p.lon) for p in req.sources]
+    dst = [(p.lat, p.lon) for p in destinations]
+    durations, distances, counts = await osrm_client.fetch_matrix(src, dst, profile="bike")
+    
+    estimated = np.isnan(durations) | np.isnan(distances)
+    if estimated.any():
+        src_lat, src_lon = np.array(src).T
+        dst_lat, dst_lon = np.array(dst).T
+        straight_m = geodesy.haversine_np(src_lat[:, None], src_lon[:, None], dst_lat[None, :], dst_lon[None, :])
+        distances = np.where(estimated, straight_m, distances)
+        durations = np.where(estimated, estimate_duration_s(straight_m), durations)
+    
+    return {
+        "durations": np.round(durations, 1).tolist(),
+        "distances": np.round(distances, 1).tolist(),
+        "estimated": estimated.tolist(),
+        "sources": len(src),
+        "destinations": len(dst),
+        "cells": {**counts, "estimated": int(np.count_nonzero(estimated))},
+    }
+
+
 # ---- i18n API ----
 @app.get("/api/i18n/translations")
 def get_translations(lang: str = Query(default="en")):
@@ -1693,135 +2427,165 @@ def get_available_languages():
 
 
 # ---- Path Search with Scoring ----
-def point_to_segment_distance(px: float, py: float, ax: float, ay: float, bx: float, by: float) -> float:
-    """Distance from point (px, py) to line segment (ax, ay)-(bx, by)."""
-    abx = bx - ax
-    aby = by - ay
-    apx = px - ax
-    apy = py - ay
-    ab_sq = abx * abx + aby * aby
-    if ab_sq == 0:
-        return math.sqrt(apx * apx + apy * apy)
-    t = max(0, min(1, (apx * abx + apy * aby) / ab_sq))
-    proj_x = ax + t * abx
-    proj_y = ay + t * aby
-    return math.sqrt((px - proj_x) ** 2 + (py - proj_y) ** 2)
-
-
-def find_segments_near_route(route_coords: List[List[float]], tolerance_deg: float = 0.002) -> List[Dict[str, Any]]:
-    """
-    Find all segments in the database that are near the given route.
+SEGMENT_PROXIMITY_DEG = 0.002
+
+# Candidate road metrics:
+# "segments": exact, from the segments whose midpoint is within SEGMENT_PROXIMITY_DEG
+# "raster": summed from COST_RASTER cells around the route, cost independent of segment count
+ROUTE_SCORING = os.environ.get("ROUTE_SCORING", "segments")
+COST_RASTER_CELL_DEG = float(os.environ.get("COST_RASTER_CELL_DEG", "0.0008"))
+# Kept in sync with SEGMENTS by every mutation, whatever ROUTE_SCORING is.
+# The covered band, 2r + 1 cells wide, approximates the 2 * SEGMENT_PROXIMITY_DEG one.
+COST_RASTER = CostRaster(
+    cell_size_deg=COST_RASTER_CELL_DEG,
+    radius_cells=max(0, round(SEGMENT_PROXIMITY_DEG / COST_RASTER_CELL_DEG - 0.5)),
+)
+# How far from a route a segment can affect its metrics (cache invalidation reach)
+SCORING_REACH_DEG = COST_RASTER.reach_deg if ROUTE_SCORING == "raster" else SEGMENT_PROXIMITY_DEG
+
+
+def burn_segment(segment_id: int) -> None:
+    """(Re)write a segment's metrics into COST_RASTER from the store columns."""
+    row = SEGMENTS.row(segment_id)
+    COST_RASTER.upsert(
+        segment_id,
+        float(SEGMENTS.mid_lat[row]), float(SEGMENTS.mid_lon[row]),
+        int(SEGMENTS.status[row]),
+        bool(SEGMENTS.pothole[row]),
+        float(SEGMENTS.length_m[row]),
+    )
+
+
+def find_segment_ids_near_route(route_coords: List[List[float]], tolerance_deg: float = SEGMENT_PROXIMITY_DEG) -> List[int]:
+    """
+    Find the ids of all segments in the database that are near the given route.
     route_coords: list of [lon, lat] pairs
     tolerance_deg: roughly ~200m at equator
+
+    A segment matches when its midpoint lies within tolerance_deg of any route edge.
+    Candidates are pruned through SEGMENT_INDEX, so only segments in grid cells
+    the route passes through are checked.
     """
-    nearby_segments = []
-    for seg in SEGMENTS.values():
-        seg_start = (seg["start_lon"], seg["start_lat"])
-        seg_end = (seg["end_lon"], seg["end_lat"])
-        seg_mid_lon = (seg_start[0] + seg_end[0]) / 2
-        seg_mid_lat = (seg_start[1] + seg_end[1]) / 2
-        
-        # Check if segment midpoint is close to any point in route
-        for i in range(len(route_coords) - 1):
-            lon1, lat1 = route_coords[i]
-            lon2, lat2 = route_coords[i + 1]
-            dist = point_to_segment_distance(seg_mid_lon, seg_mid_lat, lon1, lat1, lon2, lat2)
-            if dist < tolerance_deg:
-                nearby_segments.append(seg)
-                break
-    return nearby_segments
+    return SEGMENT_INDEX.query_polyline(route_coords, tolerance_deg)
 
 
-def calculate_route_score(
-    distance_m: float,
-    nearby_segments: List[Dict[str, Any]],
-    preferences: str = "balanced"
-) -> tuple:
+def find_segments_near_route(route_coords: List[List[float]], tolerance_deg: float = SEGMENT_PROXIMITY_DEG) -> List[Dict[str, Any]]:
+    """Segments near the route as dicts (see find_segment_ids_near_route)."""
+    return SEGMENTS.records(find_segment_ids_near_route(route_coords, tolerance_deg))
+
+
+def nearby_segments_cached(
+    route_coords: List[List[float]],
+    proximity_cache: Optional[Dict[bytes, List[int]]] = None,
+) -> List[int]:
     """
-    Calculate route score. Returns (score, quality_score, pothole_count, bad_road_length, tags, warnings).
-    
-    Score formula varies by preference:
-    - safety_first: Heavy penalties for maintenance/potholes, prioritizes surface quality
-    - shortest: Minimal penalties, prioritizes distance
-    - balanced: Moderate penalties, balances distance and quality
+    find_segment_ids_near_route, memoized by exact geometry in proximity_cache.
+    Batch searches share one cache, so repeated candidates (same OSRM route for
+    several pairs, fallback lines) are looked up once.
+    """
+    if proximity_cache is None:
+        return find_segment_ids_near_route(route_coords)
+    key = np.asarray(route_coords, dtype=np.float64).tobytes()
+    found = proximity_cache.get(key)
+    if found is None:
+        found = proximity_cache[key] = find_segment_ids_near_route(route_coords)
+    return found
+
+
+# Penalty weights per preference (lower total score = better route)
+ROUTE_PENALTY_WEIGHTS: Dict[str, Dict[str, float]] = {
+    # VERY heavy penalty for maintenance segments (as per RASD requirement)
+    # Maintenance roads are essentially treated as impassable for safety
+    "safety_first": {"pothole": 1200, "maintenance_m": 10.0, "bad_m": 5.0, "medium_m": 1.5},
+    # Light penalty, prioritize distance; still consider safety but much lower weight
+    "shortest": {"pothole": 100, "maintenance_m": 0.8, "bad_m": 0.3, "medium_m": 0.1},
+    "balanced": {"pothole": 500, "maintenance_m": 4.0, "bad_m": 2.0, "medium_m": 0.5},
+}
+
+
+def segment_penalties(rows: np.ndarray, preferences: str = "balanced") -> np.ndarray:
+    """Penalty each segment row adds to a route score (same weights as calculate_route_score)."""
+    weights = ROUTE_PENALTY_WEIGHTS.get(preferences, ROUTE_PENALTY_WEIGHTS["balanced"])
+    per_m = np.array([0.0, weights["medium_m"], weights["bad_m"], weights["maintenance_m"] + weights["bad_m"]])
+    status = SEGMENTS.status[rows]
+    return SEGMENTS.pothole[rows] * weights["pothole"] + SEGMENTS.length_m[rows] * per_m[status]
+
+
+def route_metrics(nearby_segment_ids: Sequence[int]) -> Dict[str, Any]:
+    """
+    Preference-independent road metrics of a route: pothole count, maintenance /
+    bad / medium road length and warnings. Every preference (or custom weight
+    vector) scores from these without looking at the segments again.
+    """
+    # Totals are reductions over the segment store columns
+    rows = SEGMENTS.rows_of(nearby_segment_ids)
+    status = SEGMENTS.status[rows]
+    pothole = SEGMENTS.pothole[rows]
+    seg_lengths = SEGMENTS.length_m[rows]
+    is_maintenance = status == STATUS_MAINTENANCE
+    is_suboptimal = status == STATUS_SUBOPTIMAL
     
-    Lower score = better route
-    quality_score: 0-100 (higher is better) for display purposes
+    maintenance_length_m = float(seg_lengths[is_maintenance].sum())  # Track maintenance separately for safety_first
     
-    Tags are mutually exclusive where applicable:
-    - "Best Surface" only appears when no issues AND not marked as "Fastest"
-    - "Fastest" only appears for shortest preference on direct route
-    """
-    pothole_count = 0
-    bad_road_length_m = 0.0
-    maintenance_length_m = 0.0  # Track maintenance separately for safety_first
-    medium_length_m = 0.0  # Track medium quality roads
+    # Warnings only for flagged segments, in route order
     warnings = []
+    flagged = np.flatnonzero(pothole | is_maintenance | is_suboptimal)
+    mid_lats = SEGMENTS.mid_lat[rows[flagged]].tolist()
+    mid_lons = SEGMENTS.mid_lon[rows[flagged]].tolist()
+    pothole_lats: List[float] = []
+    for i, mid_lat, mid_lon in zip(flagged.tolist(), mid_lats, mid_lons):
+        if pothole[i]:
+            pothole_lats.append(mid_lat)
+            warnings.append({"lat": mid_lat, "lon": mid_lon, "type": "Pothole"})
+        if is_maintenance[i]:
+            if not any(abs(lat - mid_lat) < 0.0001 for lat in pothole_lats):
+                warnings.append({"lat": mid_lat, "lon": mid_lon, "type": "Road Work"})
+        elif is_suboptimal[i]:
+            warnings.append({"lat": mid_lat, "lon": mid_lon, "type": "Bad Road"})
     
-    for seg in nearby_segments:
-        status = seg.get("status", "optimal")
-        obstacle = seg.get("obstacle")
-        seg_len = haversine_m(
-            seg["start_lat"], seg["start_lon"],
-            seg["end_lat"], seg["end_lon"]
-        )
-        
-        # Count potholes
-        if obstacle and "pothole" in obstacle.lower():
-            pothole_count += 1
-            warnings.append({
-                "lat": (seg["start_lat"] + seg["end_lat"]) / 2,
-                "lon": (seg["start_lon"] + seg["end_lon"]) / 2,
-                "type": "Pothole"
-            })
-        
-        # Track road quality by status
-        if status == "maintenance":
-            maintenance_length_m += seg_len
-            bad_road_length_m += seg_len
-            if not any(w["type"] == "Pothole" for w in warnings if 
-                abs(w["lat"] - (seg["start_lat"] + seg["end_lat"]) / 2) < 0.0001):
-                warnings.append({
-                    "lat": (seg["start_lat"] + seg["end_lat"]) / 2,
-                    "lon": (seg["start_lon"] + seg["end_lon"]) / 2,
-                    "type": "Road Work"
-                })
-        elif status == "suboptimal":
-            bad_road_length_m += seg_len
-            warnings.append({
-                "lat": (seg["start_lat"] + seg["end_lat"]) / 2,
-                "lon": (seg["start_lon"] + seg["end_lon"]) / 2,
-                "type": "Bad Road"
-            })
-        elif status == "medium":
-            medium_length_m += seg_len
+    return {
+        "pothole_count": int(pothole.sum()),
+        "maintenance_length_m": maintenance_length_m,
+        "bad_road_length_m": maintenance_length_m + float(seg_lengths[is_suboptimal].sum()),
+        "medium_length_m": float(seg_lengths[status == STATUS_MEDIUM].sum()),  # Track medium quality roads
+        "warnings": warnings,
+    }
+
+
+def candidate_metrics(
+    route_coords: List[List[float]],
+    proximity_cache: Optional[Dict[bytes, List[int]]] = None,
+) -> Dict[str, Any]:
+    """route_metrics of a candidate route, exact or from COST_RASTER (see ROUTE_SCORING)."""
+    if ROUTE_SCORING == "raster":
+        return COST_RASTER.route_metrics(route_coords)
+    return route_metrics(nearby_segments_cached(route_coords, proximity_cache))
+
+
+def score_route(
+    distance_m: float,
+    metrics: Dict[str, Any],
+    preferences: str = "balanced",
+    weights: Optional[Dict[str, float]] = None,
+) -> Tuple[float, float, List[str]]:
+    """
+    Score a route from its metrics. Returns (score, quality_score, tags).
+    weights defaults to ROUTE_PENALTY_WEIGHTS[preferences].
+    """
+    pothole_count = metrics["pothole_count"]
+    maintenance_length_m = metrics["maintenance_length_m"]
+    bad_road_length_m = metrics["bad_road_length_m"]
+    medium_length_m = metrics["medium_length_m"]
     
     # Calculate penalty-based score (lower is better)
-    if preferences == "safety_first":
-        # VERY heavy penalty for maintenance segments (as per RASD requirement)
-        # Maintenance roads are essentially treated as impassable for safety
-        penalty = (
-            (pothole_count * 1200) +  # Very high pothole penalty
-            (maintenance_length_m * 10.0) +  # Extreme penalty for maintenance roads
-            (bad_road_length_m * 5.0) +  # High penalty for bad roads
-            (medium_length_m * 1.5)  # Moderate penalty for medium quality
-        )
-    elif preferences == "shortest":
-        # Light penalty, prioritize distance
-        # Still consider safety but much lower weight
-        penalty = (
-            (pothole_count * 100) + 
-            (maintenance_length_m * 0.8) +
-            (bad_road_length_m * 0.3) +
-            (medium_length_m * 0.1)
-        )
-    else:  # balanced
-        penalty = (
-            (pothole_count * 500) + 
-            (maintenance_length_m * 4.0) +
-            (bad_road_length_m * 2.0) +
-            (medium_length_m * 0.5)
-        )
+    if weights is None:
+        weights = ROUTE_PENALTY_WEIGHTS.get(preferences, ROUTE_PENALTY_WEIGHTS["balanced"])
+    penalty = (
+        (pothole_count * weights["pothole"]) +
+        (maintenance_length_m * weights["maintenance_m"]) +
+        (bad_road_length_m * weights["bad_m"]) +
+        (medium_length_m * weights["medium_m"])
+    )
     
     score = distance_m + penalty
     
@@ -1854,44 +2618,173 @@ def calculate_route_score(
     if medium_length_m > distance_m * 0.3:  # More than 30% medium quality
         tags.append("Mixed Surface")
     
-    return score, quality_score, pothole_count, bad_road_length_m, tags, warnings
+    return score, quality_score, tags
 
 
-def encode_polyline(coords: List[List[float]], precision: int = 5) -> str:
-    """
-    Encode coordinates to polyline format.
-    coords: list of [lon, lat] pairs
+def calculate_route_score(
+    distance_m: float,
+    nearby_segment_ids: Sequence[int],
+    preferences: str = "balanced"
+) -> tuple:
     """
-    def encode_value(value: int) -> str:
-        result = ""
-        value = ~(value << 1) if value < 0 else (value << 1)
-        while value >= 0x20:
-            result += chr((0x20 | (value & 0x1f)) + 63)
-            value >>= 5
-        result += chr(value + 63)
-        return result
+    Calculate route score. Returns (score, quality_score, pothole_count, bad_road_length, tags, warnings).
     
-    encoded = ""
-    prev_lat, prev_lon = 0, 0
-    multiplier = 10 ** precision
+    Score formula varies by preference:
+    - safety_first: Heavy penalties for maintenance/potholes, prioritizes surface quality
+    - shortest: Minimal penalties, prioritizes distance
+    - balanced: Moderate penalties, balances distance and quality
+    
+    Lower score = better route
+    quality_score: 0-100 (higher is better) for display purposes
     
-    for lon, lat in coords:
-        lat_int = round(lat * multiplier)
-        lon_int = round(lon * multiplier)
-        encoded += encode_value(lat_int - prev_lat)
-        encoded += encode_value(lon_int - prev_lon)
-        prev_lat, prev_lon = lat_int, lon_int
+    Tags are mutually exclusive where applicable:
+    - "Best Surface" only appears when no issues AND not marked as "Fastest"
+    - "Fastest" only appears for shortest preference on direct route
+    """
+    metrics = route_metrics(nearby_segment_ids)
+    score, quality_score, tags = score_route(distance_m, metrics, preferences)
+    return score, quality_score, metrics["pothole_count"], metrics["bad_road_length_m"], tags, metrics["warnings"]
+
+
+# ---- Local Road Graph Routing ----
+# "osrm": OSRM first, local graph only when OSRM returns nothing
+# "local": local graph only, no network on the path_search latency path
+ROUTING_ENGINE = os.environ.get("ROUTING_ENGINE", "osrm")
+ROAD_GRAPH_PATH = os.environ.get("ROAD_GRAPH_PATH")
+
+ROAD_GRAPH: Optional[RoadGraph] = load_road_graph(ROAD_GRAPH_PATH) if ROAD_GRAPH_PATH else None
+# preference -> (SEGMENT_INDEX.version, edge_id -> penalty)
+_ROAD_GRAPH_PENALTIES: Dict[str, Tuple[int, Dict[int, float]]] = {}
+# Graph edge each SEGMENTS row was snapped to (-1: none in range), with the id and
+# midpoint it was snapped for; only new, reused or moved rows are snapped again
+_SEGMENT_EDGES: Dict[float, Dict[str, np.ndarray]] = {}  # per tolerance_deg
+
+
+def set_road_graph(graph: Optional[RoadGraph]) -> None:
+    """Replace the local road graph (e.g. with a generated test graph)."""
+    global ROAD_GRAPH
+    ROAD_GRAPH = graph
+    _ROAD_GRAPH_PENALTIES.clear()
+    _SEGMENT_EDGES.clear()
+    PATH_RESULT_CACHE.clear()
+    CANDIDATE_CACHE.clear()
+
+
+def segment_graph_edges(rows: np.ndarray, tolerance_deg: float = 0.002) -> np.ndarray:
+    """Nearest ROAD_GRAPH edge of each segment row's midpoint, -1 if none within tolerance_deg."""
+    cache = _SEGMENT_EDGES.setdefault(tolerance_deg, {})
+    size = len(SEGMENTS.ids)
+    if len(cache.get("ids", ())) < size:
+        # The store grew: its new rows are not snapped yet
+        for name, fill, dtype in (
+            ("ids", -1, np.int64), ("mid_lat", np.nan, np.float64),
+            ("mid_lon", np.nan, np.float64), ("edge", -1, np.int64),
+        ):
+            grown = np.full(size, fill, dtype=dtype)
+            if name in cache:
+                grown[:len(cache[name])] = cache[name]
+            cache[name] = grown
+    stale = rows[
+        (cache["ids"][rows] != SEGMENTS.ids[rows])
+        | (cache["mid_lat"][rows] != SEGMENTS.mid_lat[rows])
+        | (cache["mid_lon"][rows] != SEGMENTS.mid_lon[rows])
+    ]
+    for row, mid_lat, mid_lon in zip(
+        stale.tolist(), SEGMENTS.mid_lat[stale].tolist(), SEGMENTS.mid_lon[stale].tolist()
+    ):
+        edge_id = ROAD_GRAPH.nearest_edge(mid_lat, mid_lon, tolerance_deg)
+        cache["edge"][row] = -1 if edge_id is None else edge_id
+    cache["ids"][stale] = SEGMENTS.ids[stale]
+    cache["mid_lat"][stale] = SEGMENTS.mid_lat[stale]
+    cache["mid_lon"][stale] = SEGMENTS.mid_lon[stale]
+    return cache["edge"][rows]
+
+
+def road_graph_edge_penalties(preferences: str, tolerance_deg: float = 0.002) -> Dict[int, float]:
+    """
+    Map SEGMENTS onto graph edges as penalties for one preference.
+
+    Each segment carries its full penalty on the single edge nearest its
+    midpoint (within tolerance_deg, the proximity rule of
+    find_segments_near_route), so a path pays for a segment at most once, as
+    route scoring counts it. A path passing near a segment without using
+    that edge does not pay for it: A* minimizes length + these penalties,
+    an approximation of the route score.
+    Recomputed only when SEGMENT_INDEX changes, with array operations;
+    segments are snapped to edges again only when new or moved.
+    """
+    cached = _ROAD_GRAPH_PENALTIES.get(preferences)
+    if cached is not None and cached[0] == SEGMENT_INDEX.version:
+        return cached[1]
+    
+    penalties: Dict[int, float] = {}
+    if ROAD_GRAPH is not None:
+        rows = SEGMENTS.active_rows()
+        edges = segment_graph_edges(rows, tolerance_deg)
+        seg_penalties = segment_penalties(rows, preferences)
+        keep = (edges >= 0) & (seg_penalties > 0)
+        totals = np.bincount(edges[keep], weights=seg_penalties[keep], minlength=len(ROAD_GRAPH.edges))
+        edge_ids = np.flatnonzero(totals)
+        penalties = dict(zip(edge_ids.tolist(), totals[edge_ids].tolist()))
+    _ROAD_GRAPH_PENALTIES[preferences] = (SEGMENT_INDEX.version, penalties)
+    return penalties
+
+
+def _local_graph_candidates(origin: Coordinate, dest: Coordinate) -> List[Dict[str, Any]]:
+    """
+    Optimal routes on the local road graph for each preference, for diversity
+    (duplicates removed). Ranking for the requested preference happens later.
+    """
+    if ROAD_GRAPH is None:
+        return []
     
-    return encoded
+    candidates: List[Dict[str, Any]] = []
+    for pref in ROUTE_PENALTY_WEIGHTS:
+        result = ROAD_GRAPH.route(
+            origin.lat, origin.lon,
+            dest.lat, dest.lon,
+            road_graph_edge_penalties(pref),
+        )
+        if result is None:
+            continue
+        # Connect the exact origin/destination to the snapped graph nodes
+        coords = [[origin.lon, origin.lat]] + result["coords"] + [[dest.lon, dest.lat]]
+        distance_m = path_distance_m(coords)
+        
+        if any(routes_are_similar(coords, c["coords"], distance_m, c["distance_m"]) for c in candidates):
+            continue
+        candidates.append({
+            "coords": coords,
+            "distance_m": distance_m,
+            "duration_s": estimate_duration_s(distance_m),
+            "source": "local_graph",
+        })
+    return candidates
+
+
+@app.get("/api/road-graph")
+def road_graph_status():
+    """Status of the local road graph routing engine."""
+    return {
+        "loaded": ROAD_GRAPH is not None,
+        "nodes": len(ROAD_GRAPH) if ROAD_GRAPH is not None else 0,
+        "edges": len(ROAD_GRAPH.edges) if ROAD_GRAPH is not None else 0,
+        "routing_engine": ROUTING_ENGINE,
+    }
+
+
+# Detour via points of fallback routes snap to a known segment this close
+FALLBACK_SNAP_DEG = 0.004
 
 
 def _generate_fallback_routes(
     origin_lat: float, origin_lon: float,
     dest_lat: float, dest_lon: float,
-    preferences: str
 ) -> List[Dict[str, Any]]:
     """
     Generate fallback routes using math-based geometry when OSRM is unavailable.
+    Detours pass through the nearest known segment (SEGMENT_INDEX) around
+    their via point, if there is one within FALLBACK_SNAP_DEG.
     """
     base = path_line(origin_lat, origin_lon, dest_lat, dest_lon, steps=32)
     
@@ -1905,59 +2798,151 @@ def _generate_fallback_routes(
     px /= norm
     py /= norm
     
-    route_configs = [
-        (0.0, "A"),
-        (0.012, "B"),
-        (-0.012, "C"),
-    ]
+    route_configs = [0.0, 0.012, -0.012]
     
     candidates = []
-    base_distance = path_distance_m(base)
-    
-    for offset, route_id in route_configs:
+    for offset in route_configs:
         if abs(offset) < 1e-9:
             coords = base
         else:
             via_lat = mid_lat + py * offset
             via_lon = mid_lon + px * offset
+            snapped = SEGMENT_INDEX.nearest_point(via_lat, via_lon, FALLBACK_SNAP_DEG)
+            if snapped is not None:
+                _, via_lat, via_lon = snapped
             coords = path_via(origin_lat, origin_lon, dest_lat, dest_lon, via_lat, via_lon, steps_each=18)
         
         distance_m = path_distance_m(coords)
-        duration_s = estimate_duration_s(distance_m)
-        
-        nearby_segs = find_segments_near_route(coords)
-        score, quality_score, pothole_count, bad_road_len, tags, warnings = calculate_route_score(
-            distance_m, nearby_segs, preferences
-        )
-        
-        if offset == 0.0:
-            if preferences == "shortest":
-                tags = ["Fastest"] + [t for t in tags if t != "Best Surface"]
-            else:
-                tags.insert(0, "Shortest")
-        elif distance_m > base_distance:
-            tags.append("Slightly Longer")
-            tags = [t for t in tags if t != "Fastest"]
-        
         candidates.append({
-            "route_id": route_id,
             "coords": coords,
             "distance_m": distance_m,
-            "duration_s": duration_s,
-            "score": score,
-            "quality_score": quality_score,
-            "tags": tags,
-            "warnings": warnings,
+            "duration_s": estimate_duration_s(distance_m),
             "source": "fallback",
         })
     
     return candidates
 
 
+# Called with each candidate route as soon as it is accepted (see path_search_stream)
+CandidateCallback = Callable[[Dict[str, Any]], None]
+
+# ---- Candidate generation budget ----
+# Waypoint probes as (offset_fraction, side), highest priority first. The
+# probes of one offset are issued together; the next offset is only tried
+# while fewer than MIN_DISTINCT_CANDIDATES distinct routes exist.
+WAYPOINT_PROBE_OFFSETS = (0.15, 0.08)
+WAYPOINT_PROBE_SIDES = ("left", "right")
+MIN_DISTINCT_CANDIDATES = 2
+MAX_CANDIDATES = 3
+# Default latency budget for candidate generation; 0 = wait for every probe
+PATH_SEARCH_BUDGET_MS = float(os.environ.get("PATH_SEARCH_BUDGET_MS", "0"))
+
+# Probes still running when their deadline passed; kept alive so their
+# answers land in the OSRM route cache for the next search
+_DETACHED_PROBES: "set[asyncio.Task]" = set()
+
+
+def _detach_probe(task: "asyncio.Task") -> None:
+    _DETACHED_PROBES.add(task)
+    task.add_done_callback(_DETACHED_PROBES.discard)
+
+
+async def _await_probe(task: "asyncio.Task", deadline: Optional[float]) -> Tuple[bool, Any]:
+    """(finished, result) of an OSRM probe, waiting at most until deadline (loop time)."""
+    if deadline is None or task.done():
+        return True, await task
+    remaining = deadline - asyncio.get_running_loop().time()
+    try:
+        return True, await asyncio.wait_for(asyncio.shield(task), max(remaining, 0.0))
+    except asyncio.TimeoutError:
+        _detach_probe(task)
+        return False, None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+async def _probe_waypoints(
+    candidates: List[Dict[str, Any]],
+    origin: Coordinate,
+    dest: Coordinate,
+    offset_fraction: float,
+    deadline: Optional[float],
+    probe_report: List[Dict[str, Any]],
+    on_candidate: Optional[CandidateCallback] = None,
+    max_candidates: Optional[int] = None,
+) -> None:
+    """
+    Fetch OSRM routes via the perpendicular waypoints at offset_fraction
+    concurrently and append the ones that are not duplicates of existing
+    candidates (in side order). Stops once max_candidates exist (if given) or
+    the deadline passes; each probe's outcome is appended to probe_report.
+    Each accepted candidate is passed to on_candidate as soon as it and the
+    probes before it have resolved.
+    """
+    waypoints = calculate_perpendicular_waypoints(
+        origin.lat, origin.lon,
+        dest.lat, dest.lon,
+        offset_fraction=offset_fraction
+    )
+    tasks = [
+        asyncio.create_task(fetch_osrm_route_via_waypoint(
+            origin.lat, origin.lon,
+            wp_lat, wp_lon,
+            dest.lat, dest.lon,
+            profile="bike"
+        ))
+        for wp_lat, wp_lon in waypoints
+    ]
+    try:
+        for side, task in zip(WAYPOINT_PROBE_SIDES, tasks):
+            probe = {"offset_fraction": offset_fraction, "side": side}
+            probe_report.append(probe)
+            if max_candidates is not None and len(candidates) >= max_candidates:
+                probe["status"] = "skipped"
+                continue
+            finished, via_data = await _await_probe(task, deadline)
+            if not finished:
+                probe["status"] = "timed_out"
+                continue
+            if not (via_data and via_data.get("routes")):
+                probe["status"] = "no_route"
+                continue
+            route = via_data["routes"][0]
+            coords = route["geometry"]["coordinates"]
+            distance_m = route["distance"]
+            
+            # Validation: Check if this route is actually different from existing candidates
+            is_duplicate = any(
+                routes_are_similar(coords, existing["coords"], distance_m, existing["distance_m"])
+                for existing in candidates
+            )
+            if is_duplicate:
+                probe["status"] = "duplicate"
+                continue
+            probe["status"] = "accepted"
+            candidate = {
+                "coords": coords,
+                "distance_m": distance_m,
+                "duration_s": route["duration"],
+                "source": "osrm_via_waypoint",
+            }
+            candidates.append(candidate)
+            if on_candidate is not None:
+                on_candidate(candidate)
+    finally:
+        for task in tasks:
+            if task not in _DETACHED_PROBES:
+                task.cancel()
+
+
 @app.post("/api/path/search")
-def path_search(
+async def path_search(
     req: PathSearchRequest,
-    user_id: Optional[int] = Query(default=None)
+    user_id: Optional[int] = Query(default=None),
+    geometry_format: str = Query(default="both"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
 ):
     """
     Search for routes with road quality scoring using "Generate & Evaluate" strategy.
@@ -1980,155 +2965,397 @@ def path_search(
     
     Returns 1-3 candidate routes sorted by preference.
     Includes weather information and localized labels.
+    
+    geometry_format: "both" (default) returns `geometry` (encoded polyline) and
+    `geometry_geojson`; "polyline" or "geojson" returns only that one.
+    zoom / tolerance_m: simplify the returned geometry (scoring and warnings
+    always use full resolution).
+    budget_ms: latency budget for candidate generation (default
+    PATH_SEARCH_BUDGET_MS). Waypoint probes still pending at the deadline are
+    dropped; `candidate_search` reports the outcome of every probe.
     """
-    origin = req.origin
-    dest = req.destination
-    preferences = req.preferences
-    lang = get_user_language(user_id)
+    check_geometry_format(geometry_format)
+    return await _search_paths(
+        req.origin, req.destination, req.preferences,
+        lang=get_user_language(user_id),
+        geometry_format=geometry_format,
+        tolerance=resolve_tolerance_m(zoom, tolerance_m, req.origin.lat),
+        budget_ms=req.budget_ms,
+    )
+
+
+def _route_weather(
+    origin: Coordinate,
+    dest: Coordinate,
+    lang: str,
+    weather_cache: Optional[Dict[Tuple[float, float, str], Tuple[Dict[str, Any], str]]] = None,
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Weather at the route midpoint plus cycling recommendation.
+    With a weather_cache, results are shared per 0.01° cell (the same cell
+    WeatherService seeds its generator from).
+    """
+    mid_lat = (origin.lat + dest.lat) / 2
+    mid_lon = (origin.lon + dest.lon) / 2
+    key = (round(mid_lat, 2), round(mid_lon, 2), lang)
+    if weather_cache is not None and key in weather_cache:
+        return weather_cache[key]
+    weather = WeatherService.get_weather(mid_lat, mid_lon, lang)
+    result = (weather, WeatherService.get_cycling_recommendation(weather, lang))
+    if weather_cache is not None:
+        weather_cache[key] = result
+    return result
+
+
+async def _search_paths(
+    origin: Coordinate,
+    dest: Coordinate,
+    preferences: str,
+    lang: str = "en",
+    geometry_format: str = "both",
+    tolerance: Optional[float] = None,
+    proximity_cache: Optional[Dict[bytes, List[int]]] = None,
+    weather_cache: Optional[Dict[Tuple[float, float, str], Tuple[Dict[str, Any], str]]] = None,
+    on_candidate: Optional[CandidateCallback] = None,
+    budget_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Generate & Evaluate for one origin/destination pair (see path_search),
+    served from PATH_RESULT_CACHE when the segments near its routes are unchanged.
+    Only complete searches are cached, so a hit is valid for any budget_ms.
+    Weather is time-dependent and always attached fresh.
+    on_candidate is passed to _candidate_set (not called on a result cache hit).
+    """
+    key = PathResultCache.make_key(
+        (origin.lat, origin.lon), (dest.lat, dest.lon),
+        preferences, lang, geometry_format, tolerance, ROUTING_ENGINE, ROAD_GRAPH is not None,
+    )
+    result = PATH_RESULT_CACHE.get(key)
+    if result is not None:
+        result = {**result, "candidate_search": {**result["candidate_search"], "cached": True}}
+    else:
+        result, scored_routes = await _generate_and_evaluate(
+            origin, dest, preferences, lang, geometry_format, tolerance, proximity_cache, on_candidate, budget_ms
+        )
+        # Fallback lines are not cached so OSRM recovery shows up immediately;
+        # local graph routes depend on every segment through edge penalties
+        if result["route_source"] != "fallback" and not result["candidate_search"]["deadline_reached"]:
+            PATH_RESULT_CACHE.put(
+                key, result, scored_routes, SCORING_REACH_DEG,
+                global_dependency=result["route_source"] == "local_graph",
+            )
+    weather, cycling_recommendation = _route_weather(origin, dest, lang, weather_cache)
+    return {
+        **result,
+        "weather_summary": weather["summary"],
+        "weather": weather,
+        "cycling_recommendation": cycling_recommendation,
+    }
+
+
+async def _generate_and_evaluate(
+    origin: Coordinate,
+    dest: Coordinate,
+    preferences: str,
+    lang: str,
+    geometry_format: str,
+    tolerance: Optional[float],
+    proximity_cache: Optional[Dict[bytes, List[int]]] = None,
+    on_candidate: Optional[CandidateCallback] = None,
+    budget_ms: Optional[float] = None,
+) -> Tuple[Dict[str, Any], List[List[List[float]]]]:
+    """Uncached path search. Returns (response without weather, full-resolution scored routes)."""
+    candidate_set = await _candidate_set(origin, dest, proximity_cache, on_candidate, budget_ms)
+    ranked = rank_candidates(candidate_set, preferences)
+    route_source = candidate_set["route_source"]
     
-    candidates = []
+    # Build response with localized labels
+    routes = []
+    for rank, candidate in enumerate(ranked, start=1):
+        # Translate tags
+        tags_localized = translate_list(candidate["tags"], lang)
+        
+        # Translate warnings
+        warnings_localized = []
+        for w in candidate.get("warnings", []):
+            w_copy = dict(w)
+            w_copy["type_localized"] = translate(w["type"], lang)
+            warnings_localized.append(w_copy)
+        
+        route = {
+            "route_id": candidate["route_id"],
+            "rank": rank,
+            "total_distance": round(candidate["distance_m"], 1),
+            "duration_s": round(candidate.get("duration_s", estimate_duration_s(candidate["distance_m"])), 1),
+            "duration_display": _format_duration(candidate.get("duration_s", estimate_duration_s(candidate["distance_m"]))),
+            "road_quality_score": round(candidate["quality_score"], 1),
+            "tags": candidate["tags"],
+            "tags_localized": tags_localized,
+            "segments_warning": candidate.get("warnings", []),
+            "segments_warning_localized": warnings_localized,
+            "source": candidate.get("source", route_source),
+        }
+        source = candidate_set["candidates"][candidate["candidate_id"]]
+        route.update(_route_geometry_fields(source, geometry_format, tolerance))
+        routes.append(route)
+    
+    result = {
+        "routes": routes,
+        "route_source": route_source,
+        "algorithm": "generate_and_evaluate",
+        "candidates_generated": candidate_set["candidates_generated"],
+        "candidates_returned": len(routes),
+        "candidate_search": candidate_set["candidate_search"],
+    }
+    return result, [candidate["coords"] for candidate in ranked]
+
+
+def _route_geometry_fields(
+    candidate: Dict[str, Any],
+    geometry_format: str,
+    tolerance: Optional[float],
+) -> Dict[str, Any]:
+    """
+    path_search geometry keys: `geometry` (polyline) and/or `geometry_geojson`.
+    The per-vertex importance is computed on first use and kept on the
+    candidate, so candidate sets served from CANDIDATE_CACHE only threshold it.
+    """
+    coords = candidate["coords"]
+    fields: Dict[str, Any] = {}
+    if tolerance is not None:
+        importance = candidate.get("importance")
+        if importance is None:
+            importance = candidate["importance"] = point_importance(coords, SIMPLIFY_METHOD)
+        coords = simplify_with_importance(coords, importance, tolerance, SIMPLIFY_METHOD)
+        fields["geometry_tolerance_m"] = round(tolerance, 2)
+    if geometry_format in ("polyline", "both"):
+        fields["geometry"] = encode_polyline(coords)
+    if geometry_format in ("geojson", "both"):
+        fields["geometry_geojson"] = {"type": "LineString", "coordinates": coords}
+    return fields
+
+
+async def _generate_candidates(
+    origin: Coordinate,
+    dest: Coordinate,
+    on_candidate: Optional[CandidateCallback] = None,
+    budget_ms: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], str, Dict[str, Any]]:
+    """
+    PHASE 1: CANDIDATE GENERATION. Returns (candidates, route_source, report).
+    
+    - Candidate 1: Direct route (Origin -> Dest)
+    - Candidate 2-3: Routes via perpendicular waypoints for diversity,
+      probed in WAYPOINT_PROBE_OFFSETS order until enough distinct routes exist
+    - Validate routes are actually different (not 99% identical)
+    Falls back to the local road graph, then to straight-line geometry.
+    
+    With a budget (budget_ms, else PATH_SEARCH_BUDGET_MS), OSRM calls still
+    pending at the deadline are given up and the search continues with what
+    has arrived. `report` lists every probe's outcome ("accepted", "duplicate",
+    "no_route", "timed_out", "deadline" when its round was never issued for
+    lack of time, or "skipped" when enough candidates already existed);
+    `deadline_reached` is set when the budget cut the search short.
+    on_candidate sees every candidate in order, as soon as it is known.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    if budget_ms is None:
+        budget_ms = PATH_SEARCH_BUDGET_MS or None
+    deadline = started + budget_ms / 1000 if budget_ms else None
+    
+    candidates: List[Dict[str, Any]] = []
     route_source = "osrm"
+    direct_status = "disabled"
+    probe_report: List[Dict[str, Any]] = []
+    out_of_time = False  # probe rounds left unissued at the deadline
     
-    # ====== PHASE 1: CANDIDATE GENERATION ======
+    # In "local" mode the road graph replaces OSRM entirely
+    use_local_engine = ROAD_GRAPH is not None and ROUTING_ENGINE == "local"
     
     # Candidate 1: Direct route from OSRM (may include OSRM's own alternatives)
-    osrm_data = fetch_osrm_route(
-        origin.lat, origin.lon,
-        dest.lat, dest.lon,
-        profile="bike",
-        alternatives=True
-    )
+    osrm_data = None
+    if not use_local_engine:
+        finished, osrm_data = await _await_probe(asyncio.ensure_future(fetch_osrm_route(
+            origin.lat, origin.lon,
+            dest.lat, dest.lon,
+            profile="bike",
+            alternatives=True
+        )), deadline)
+        direct_status = "no_route" if finished else "timed_out"
     
     if osrm_data and osrm_data.get("routes"):
+        direct_status = "accepted"
         # Add direct route(s) from OSRM
         for route in osrm_data["routes"][:2]:  # Take max 2 from OSRM's alternatives
-            coords = route["geometry"]["coordinates"]
-            distance_m = route["distance"]
-            duration_s = route["duration"]
             candidates.append({
-                "coords": coords,
-                "distance_m": distance_m,
-                "duration_s": duration_s,
+                "coords": route["geometry"]["coordinates"],
+                "distance_m": route["distance"],
+                "duration_s": route["duration"],
                 "source": "osrm_direct",
             })
+            if on_candidate is not None:
+                on_candidate(candidates[-1])
         
-        # Candidates 2-3: Routes via perpendicular waypoints for diversity
-        waypoints = calculate_perpendicular_waypoints(
-            origin.lat, origin.lon,
-            dest.lat, dest.lon,
-            offset_fraction=0.15  # 15% of direct distance
-        )
-        
-        for wp_lat, wp_lon in waypoints:
-            via_data = fetch_osrm_route_via_waypoint(
-                origin.lat, origin.lon,
-                wp_lat, wp_lon,
-                dest.lat, dest.lon,
-                profile="bike"
-            )
-            if via_data and via_data.get("routes"):
-                route = via_data["routes"][0]
-                coords = route["geometry"]["coordinates"]
-                distance_m = route["distance"]
-                duration_s = route["duration"]
-                
-                # Validation: Check if this route is actually different from existing candidates
-                is_duplicate = False
-                for existing in candidates:
-                    if routes_are_similar(
-                        coords, existing["coords"],
-                        distance_m, existing["distance_m"]
-                    ):
-                        is_duplicate = True
-                        break
-                
-                if not is_duplicate:
-                    candidates.append({
-                        "coords": coords,
-                        "distance_m": distance_m,
-                        "duration_s": duration_s,
-                        "source": "osrm_via_waypoint",
-                    })
-        
-        # If we still have less than 2 candidates, try with different offset
-        if len(candidates) < 2:
-            waypoints_small = calculate_perpendicular_waypoints(
-                origin.lat, origin.lon,
-                dest.lat, dest.lon,
-                offset_fraction=0.08  # Smaller offset
+        # Waypoint probes, widest offset first; smaller offsets only while
+        # fewer than MIN_DISTINCT_CANDIDATES distinct routes exist. The first
+        # round is not capped (extra candidates are trimmed in _candidate_set),
+        # later rounds stop at MAX_CANDIDATES
+        for round_no, offset_fraction in enumerate(WAYPOINT_PROBE_OFFSETS):
+            if len(candidates) >= MIN_DISTINCT_CANDIDATES and probe_report:
+                break
+            if deadline is not None and loop.time() >= deadline:
+                out_of_time = True
+                break
+            await _probe_waypoints(
+                candidates, origin, dest, offset_fraction, deadline, probe_report, on_candidate,
+                max_candidates=MAX_CANDIDATES if round_no else None,
             )
-            for wp_lat, wp_lon in waypoints_small:
-                if len(candidates) >= 3:
-                    break
-                via_data = fetch_osrm_route_via_waypoint(
-                    origin.lat, origin.lon,
-                    wp_lat, wp_lon,
-                    dest.lat, dest.lon,
-                    profile="bike"
-                )
-                if via_data and via_data.get("routes"):
-                    route = via_data["routes"][0]
-                    coords = route["geometry"]["coordinates"]
-                    distance_m = route["distance"]
-                    
-                    is_duplicate = False
-                    for existing in candidates:
-                        if routes_are_similar(coords, existing["coords"], distance_m, existing["distance_m"]):
-                            is_duplicate = True
-                            break
-                    
-                    if not is_duplicate:
-                        candidates.append({
-                            "coords": coords,
-                            "distance_m": distance_m,
-                            "duration_s": route["duration"],
-                            "source": "osrm_via_waypoint",
-                        })
+    
+    # Local road graph: primary engine in "local" mode, otherwise used when OSRM fails
+    if not candidates and ROAD_GRAPH is not None:
+        candidates = _local_graph_candidates(origin, dest)
+        if candidates:
+            route_source = "local_graph"
     
     # Fallback to math-based routes if OSRM fails
     if not candidates:
         route_source = "fallback"
-        candidates = _generate_fallback_routes(
-            origin.lat, origin.lon,
-            dest.lat, dest.lon,
-            preferences
+        candidates = _generate_fallback_routes(origin.lat, origin.lon, dest.lat, dest.lon)
+    
+    if on_candidate is not None and route_source != "osrm":
+        for candidate in candidates:
+            on_candidate(candidate)
+    
+    # Probes never issued: "deadline" when no time was left for their round,
+    # "skipped" when enough distinct candidates already existed
+    if direct_status != "disabled":
+        probed = {(p["offset_fraction"], p["side"]) for p in probe_report}
+        unissued = "deadline" if out_of_time else "skipped"
+        for offset_fraction in WAYPOINT_PROBE_OFFSETS:
+            for side in WAYPOINT_PROBE_SIDES:
+                if (offset_fraction, side) not in probed:
+                    probe_report.append({"offset_fraction": offset_fraction, "side": side, "status": unissued})
+    statuses = [direct_status] + [p["status"] for p in probe_report]
+    report = {
+        "budget_ms": budget_ms,
+        "elapsed_ms": round((loop.time() - started) * 1000, 1),
+        "deadline_reached": "timed_out" in statuses or "deadline" in statuses,
+        "direct": direct_status,
+        "waypoint_probes": probe_report,
+        "probes_skipped": sum(statuses.count(status) for status in ("skipped", "timed_out", "deadline")),
+    }
+    return candidates, route_source, report
+
+
+async def _candidate_set(
+    origin: Coordinate,
+    dest: Coordinate,
+    proximity_cache: Optional[Dict[bytes, List[int]]] = None,
+    on_candidate: Optional[CandidateCallback] = None,
+    budget_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    The preference-independent half of Generate & Evaluate: up to 3 candidate
+    routes with their raw road metrics (see route_metrics). Every preference
+    and custom weight vector is ranked from the same set, which is cached in
+    CANDIDATE_CACHE with the same invalidation rules as PATH_RESULT_CACHE.
+    Sets cut short by the time budget are not cached, so a later search
+    can complete them.
+    
+    on_candidate receives each of the (at most 3) candidates, metrics included,
+    while the rest are still being fetched; all at once on a cache hit.
+    "candidate_search" is the probe report of _generate_candidates.
+    """
+    key = PathResultCache.make_key(
+        (origin.lat, origin.lon), (dest.lat, dest.lon), ROUTING_ENGINE, ROAD_GRAPH is not None,
+    )
+    candidate_set = CANDIDATE_CACHE.get(key)
+    if candidate_set is not None:
+        if on_candidate is not None:
+            for candidate in candidate_set["candidates"]:
+                on_candidate(candidate)
+        return {**candidate_set, "candidate_search": {**candidate_set["candidate_search"], "cached": True}}
+    
+    emitted = 0
+    
+    def evaluate(candidate: Dict[str, Any]) -> None:
+        nonlocal emitted
+        if emitted >= MAX_CANDIDATES:
+            return
+        emitted += 1
+        candidate["metrics"] = candidate_metrics(candidate["coords"], proximity_cache)
+        on_candidate(candidate)
+    
+    candidates, route_source, report = await _generate_candidates(
+        origin, dest, on_candidate=evaluate if on_candidate is not None else None, budget_ms=budget_ms
+    )
+    generated = len(candidates)
+    candidates = candidates[:MAX_CANDIDATES]
+    for candidate in candidates:
+        if "metrics" not in candidate:
+            # Find segments near this route
+            candidate["metrics"] = candidate_metrics(candidate["coords"], proximity_cache)
+    candidate_set = {
+        "candidates": candidates,
+        "route_source": route_source,
+        "candidates_generated": generated,
+        "candidate_search": {**report, "cached": False},
+    }
+    if route_source != "fallback" and not report["deadline_reached"]:
+        CANDIDATE_CACHE.put(
+            key, candidate_set, [c["coords"] for c in candidates], SCORING_REACH_DEG,
+            global_dependency=route_source == "local_graph",
         )
-        # Skip scoring phase for fallback routes (already scored)
-        # Jump directly to response building
-        candidates_scored = candidates
-    else:
-        # ====== PHASE 2: SCORING & RANKING ======
-        candidates_scored = []
-        
-        for candidate in candidates[:3]:  # Max 3 candidates
-            coords = candidate["coords"]
-            distance_m = candidate["distance_m"]
-            duration_s = candidate["duration_s"]
-            
-            # Find segments near this route and calculate score
-            nearby_segs = find_segments_near_route(coords)
-            score, quality_score, pothole_count, bad_road_len, base_tags, warnings = calculate_route_score(
-                distance_m, nearby_segs, preferences
-            )
-            
-            candidates_scored.append({
-                "coords": coords,
-                "distance_m": distance_m,
-                "duration_s": duration_s,
-                "score": score,
-                "quality_score": quality_score,
-                "pothole_count": pothole_count,
-                "bad_road_len": bad_road_len,
-                "base_tags": base_tags,
-                "warnings": warnings,
-                "source": candidate["source"],
-            })
+    return candidate_set
+
+
+def rank_candidates(
+    candidate_set: Dict[str, Any],
+    preferences: str = "balanced",
+    weights: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    PHASE 2 + 3: score, rank and tag a candidate set for one preference.
+    With custom `weights`, routes are scored with them and ranked by score
+    (like "balanced"). The candidate set itself is not modified.
+    
+    - safety_first: Sort by road_quality_score descending (best surface first)
+    - shortest: Sort by total_distance ascending
+    - balanced: Sort by weighted score ascending
+    Fallback routes keep their generated order.
+    """
+    candidates = candidate_set["candidates"]
+    is_fallback = candidate_set["route_source"] == "fallback"
+    
+    # ====== PHASE 2: SCORING & RANKING ======
+    candidates_scored = []
+    for candidate_id, candidate in enumerate(candidates):
+        score, quality_score, base_tags = score_route(
+            candidate["distance_m"], candidate["metrics"], preferences, weights
+        )
+        if is_fallback:
+            # Fallback routes are only tagged by rank, quality and distance (phase 3)
+            base_tags = []
         
+        candidates_scored.append({
+            "candidate_id": candidate_id,
+            "coords": candidate["coords"],
+            "distance_m": candidate["distance_m"],
+            "duration_s": candidate["duration_s"],
+            "score": score,
+            "quality_score": quality_score,
+            "base_tags": base_tags,
+            "warnings": candidate["metrics"]["warnings"],
+            "source": candidate["source"],
+        })
+    
+    if not is_fallback:
         # Sort based on user preference
-        if preferences == "safety_first":
+        if preferences == "safety_first" and weights is None:
             # Sort by road_quality_score DESCENDING (higher quality = better)
             candidates_scored.sort(key=lambda x: -x["quality_score"])
-        elif preferences == "shortest":
+        elif preferences == "shortest" and weights is None:
             # Sort by distance ASCENDING (shorter = better)
             candidates_scored.sort(key=lambda x: x["distance_m"])
         else:  # balanced
@@ -2172,51 +3399,241 @@ def path_search(
         
         candidate["tags"] = tags
     
-    # Get weather for the route
-    mid_lat = (origin.lat + dest.lat) / 2
-    mid_lon = (origin.lon + dest.lon) / 2
-    weather = WeatherService.get_weather(mid_lat, mid_lon, lang)
-    weather_summary = weather["summary"]
-    cycling_recommendation = WeatherService.get_cycling_recommendation(weather, lang)
+    return candidates_scored
+
+
+@app.get("/api/path/search/cache")
+def path_search_cache_stats():
+    """Hit/miss counters of the path_search result cache and the candidate-set cache."""
+    return {
+        **PATH_RESULT_CACHE.stats(),
+        "candidate_sets": CANDIDATE_CACHE.stats(),
+        "scoring": {"mode": ROUTE_SCORING, "raster": COST_RASTER.stats()},
+    }
+
+
+@app.delete("/api/path/search/cache")
+def clear_path_search_cache():
+    PATH_RESULT_CACHE.clear()
+    CANDIDATE_CACHE.clear()
+    return {"ok": True}
+
+
+@app.post("/api/path/search/batch")
+async def path_search_batch(
+    req: PathSearchBatchRequest,
+    user_id: Optional[int] = Query(default=None),
+    geometry_format: str = Query(default="both"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+):
+    """
+    Path search for many origin/destination pairs in one request.
     
-    # Build response with localized labels
-    routes = []
-    for rank, candidate in enumerate(candidates_scored, start=1):
-        # Translate tags
-        tags_localized = translate_list(candidate["tags"], lang)
-        
-        # Translate warnings
-        warnings_localized = []
-        for w in candidate.get("warnings", []):
-            w_copy = dict(w)
-            w_copy["type_localized"] = translate(w["type"], lang)
-            warnings_localized.append(w_copy)
-        
-        routes.append({
-            "route_id": candidate["route_id"],
-            "rank": rank,
+    Pairs are searched with at most `concurrency` in flight (OSRM calls go
+    through the shared pooled client and route cache). Segment lookups and
+    weather are shared across the whole batch.
+    
+    Streams NDJSON, one line per pair in completion order:
+    {"index", "id", "status": "ok", ...path_search response} or
+    {"index", "id", "status": "error", "detail"}.
+    """
+    check_geometry_format(geometry_format)
+    lang = get_user_language(user_id)
+    proximity_cache: Dict[bytes, List[int]] = {}
+    weather_cache: Dict[Tuple[float, float, str], Tuple[Dict[str, Any], str]] = {}
+    semaphore = asyncio.Semaphore(req.concurrency)
+
+    async def run(index: int, pair: PathSearchPair) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await _search_paths(
+                    pair.origin, pair.destination, pair.preferences or req.preferences,
+                    lang=lang,
+                    geometry_format=geometry_format,
+                    tolerance=resolve_tolerance_m(zoom, tolerance_m, pair.origin.lat),
+                    proximity_cache=proximity_cache,
+                    weather_cache=weather_cache,
+                    budget_ms=req.budget_ms,
+                )
+            except Exception as exc:  # one failing pair must not abort the stream
+                return {"index": index, "id": pair.id, "status": "error", "detail": str(exc)}
+        return {"index": index, "id": pair.id, "status": "ok", **result}
+
+    async def stream():
+        tasks = [asyncio.create_task(run(i, pair)) for i, pair in enumerate(req.pairs)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: stop the remaining searches
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/api/path/search/stream")
+async def path_search_stream(
+    origin_lat: float = Query(...),
+    origin_lon: float = Query(...),
+    dest_lat: float = Query(...),
+    dest_lon: float = Query(...),
+    preferences: str = Query(default="balanced"),
+    user_id: Optional[int] = Query(default=None),
+    geometry_format: str = Query(default="both"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+    budget_ms: Optional[float] = Query(default=None, gt=0),
+):
+    """
+    Progressive path_search over Server-Sent Events (GET, so browsers can use EventSource).
+    
+    Events:
+    - "candidate": one per candidate route as soon as it is available (the
+      direct OSRM route first, then waypoint alternatives), scored for
+      `preferences` but not yet ranked or tagged.
+    - "result": the complete path_search response (ranked, tagged, with weather).
+    - "error": {"detail"} if the search failed.
+    
+    When the full result is already cached, only the "result" event is sent.
+    """
+    check_geometry_format(geometry_format)
+    origin = Coordinate(lat=origin_lat, lon=origin_lon)
+    dest = Coordinate(lat=dest_lat, lon=dest_lon)
+    lang = get_user_language(user_id)
+    tolerance = resolve_tolerance_m(zoom, tolerance_m, origin_lat)
+    queue: asyncio.Queue = asyncio.Queue()
+    emitted = 0
+    
+    def on_candidate(candidate: Dict[str, Any]) -> None:
+        nonlocal emitted
+        metrics = candidate["metrics"]
+        score, quality_score, _ = score_route(candidate["distance_m"], metrics, preferences)
+        event = {
+            "candidate_id": emitted,
+            "source": candidate["source"],
             "total_distance": round(candidate["distance_m"], 1),
-            "duration_s": round(candidate.get("duration_s", estimate_duration_s(candidate["distance_m"])), 1),
-            "duration_display": _format_duration(candidate.get("duration_s", estimate_duration_s(candidate["distance_m"]))),
-            "road_quality_score": round(candidate["quality_score"], 1),
-            "tags": candidate["tags"],
-            "tags_localized": tags_localized,
-            "geometry": encode_polyline(candidate["coords"]),
-            "geometry_geojson": {"type": "LineString", "coordinates": candidate["coords"]},
-            "segments_warning": candidate.get("warnings", []),
-            "segments_warning_localized": warnings_localized,
-            "source": candidate.get("source", route_source),
-        })
+            "duration_s": round(candidate["duration_s"], 1),
+            "duration_display": _format_duration(candidate["duration_s"]),
+            "score": round(score, 1),
+            "road_quality_score": round(quality_score, 1),
+            "segments_warning": metrics["warnings"],
+        }
+        event.update(_route_geometry_fields(candidate, geometry_format, tolerance))
+        emitted += 1
+        queue.put_nowait(("candidate", event))
+    
+    async def search() -> None:
+        try:
+            result = await _search_paths(
+                origin, dest, preferences,
+                lang=lang,
+                geometry_format=geometry_format,
+                tolerance=tolerance,
+                on_candidate=on_candidate,
+                budget_ms=budget_ms,
+            )
+            queue.put_nowait(("result", result))
+        except Exception as exc:
+            queue.put_nowait(("error", {"detail": str(exc)}))
+    
+    async def stream():
+        task = asyncio.create_task(search())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield _sse_event(event, data)
+                if event != "candidate":
+                    break
+        finally:
+            # Client went away: stop fetching the remaining candidates
+            task.cancel()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/path/search/rerank")
+async def path_search_rerank(
+    req: RerankRequest,
+    user_id: Optional[int] = Query(default=None),
+    geometry_format: str = Query(default="both"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=22),
+    tolerance_m: Optional[float] = Query(default=None, ge=0),
+):
+    """
+    Rank one origin/destination pair for several preferences at once.
+    
+    Candidates and their raw metrics are generated once (and cached, shared with
+    /api/path/search); each ranking only re-scores them, so asking for all
+    preferences or a custom `weights` vector costs no extra OSRM calls.
+    
+    `candidates` carries each route's geometry and metrics once; `rankings`
+    maps each preference (and "custom") to an ordered list referencing
+    candidates by `candidate_id`.
+    """
+    check_geometry_format(geometry_format)
+    preferences = req.preferences if req.preferences is not None else list(ROUTE_PENALTY_WEIGHTS)
+    if any(p not in ROUTE_PENALTY_WEIGHTS for p in preferences):
+        raise HTTPException(status_code=400, detail="invalid preferences")
+    lang = get_user_language(user_id)
+    tolerance = resolve_tolerance_m(zoom, tolerance_m, req.origin.lat)
+    
+    candidate_set = await _candidate_set(req.origin, req.destination, budget_ms=req.budget_ms)
+    candidates = []
+    for candidate_id, candidate in enumerate(candidate_set["candidates"]):
+        metrics = candidate["metrics"]
+        entry = {
+            "candidate_id": candidate_id,
+            "source": candidate["source"],
+            "total_distance": round(candidate["distance_m"], 1),
+            "duration_s": round(candidate["duration_s"], 1),
+            "duration_display": _format_duration(candidate["duration_s"]),
+            "pothole_count": metrics["pothole_count"],
+            "maintenance_length_m": round(metrics["maintenance_length_m"], 1),
+            "bad_road_length_m": round(metrics["bad_road_length_m"], 1),
+            "medium_length_m": round(metrics["medium_length_m"], 1),
+            "segments_warning": metrics["warnings"],
+        }
+        entry.update(_route_geometry_fields(candidate, geometry_format, tolerance))
+        candidates.append(entry)
+    
+    def ranking(ranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "candidate_id": r["candidate_id"],
+                "route_id": r["route_id"],
+                "rank": rank,
+                "score": round(r["score"], 1),
+                "road_quality_score": round(r["quality_score"], 1),
+                "tags": r["tags"],
+                "tags_localized": translate_list(r["tags"], lang),
+            }
+            for rank, r in enumerate(ranked, start=1)
+        ]
+    
+    rankings = {pref: ranking(rank_candidates(candidate_set, pref)) for pref in preferences}
+    weights = {pref: ROUTE_PENALTY_WEIGHTS[pref] for pref in preferences}
+    if req.weights is not None:
+        custom = req.weights.model_dump()
+        rankings["custom"] = ranking(rank_candidates(candidate_set, "custom", custom))
+        weights["custom"] = custom
     
     return {
-        "routes": routes,
-        "weather_summary": weather_summary,
-        "weather": weather,
-        "cycling_recommendation": cycling_recommendation,
-        "route_source": route_source,
-        "algorithm": "generate_and_evaluate",
-        "candidates_generated": len(candidates),
-        "candidates_returned": len(routes),
+        "candidates": candidates,
+        "rankings": rankings,
+        "weights": weights,
+        "route_source": candidate_set["route_source"],
+        "candidates_generated": candidate_set["candidates_generated"],
+        "candidate_search": candidate_set["candidate_search"],
     }
 
 
@@ -2232,6 +3649,158 @@ def _format_duration(seconds: float) -> str:
     return f"{hours} hr {mins} min"
 
 
+# ---- Background jobs ----
+# Maintenance work submitted through /api/jobs instead of running inline in a
+# request. Handlers process in chunks and yield to the event loop in between.
+JOB_CHUNK_SIZE = int(os.environ.get("JOB_CHUNK_SIZE", "100"))
+
+
+async def _job_aggregation(job: Job) -> Dict[str, Any]:
+    """Full aggregation in spatial chunks (see aggregate_partitions)."""
+    partitions = aggregation_partitions()
+    job.set_progress(0, sum(len(ids) for _, ids in partitions))
+    processed = status_changes = 0
+    async for _, results in aggregate_partitions(partitions):
+        # Segments deleted since the partitioning are not counted
+        status_changes += sum(1 for result in results if result["status_changed"])
+        processed += len(results)
+        job.set_progress(processed)
+    return {"segments_processed": processed, "status_changes": status_changes}
+
+
+async def _job_auto_confirm(job: Job) -> Dict[str, Any]:
+    """auto_confirm_reports on every segment that has reports."""
+    threshold = int(job.params.get("threshold", 2))
+    segment_ids = REPORTS_BY_SEGMENT.keys()
+    job.set_progress(0, len(segment_ids))
+    confirmed = segments = 0
+    for i, segment_id in enumerate(segment_ids, 1):
+        ids = (auto_confirm_segment(segment_id, threshold) if segment_id in SEGMENTS else None) or []
+        confirmed += len(ids)
+        segments += bool(ids)
+        if i % JOB_CHUNK_SIZE == 0:
+            job.set_progress(i)
+            await asyncio.sleep(0)
+    job.set_progress(len(segment_ids))
+    return {"segments": segments, "auto_confirmed": confirmed}
+
+
+async def _job_segment_import(job: Job) -> Dict[str, Any]:
+    """Create segments from params["segments"] (SegmentCreate objects); bad items are reported, not fatal."""
+    items = job.params.get("segments")
+    if not isinstance(items, list):
+        raise ValueError("params.segments must be a list")
+    job.set_progress(0, len(items))
+    imported: List[int] = []
+    errors: List[Dict[str, Any]] = []
+    for i, item in enumerate(items):
+        try:
+            imported.append(create_segment(SegmentCreate.model_validate(item))["id"])
+        except HTTPException as exc:
+            errors.append({"index": i, "detail": exc.detail})
+        except ValidationError as exc:
+            errors.append({"index": i, "detail": "; ".join(
+                "%s: %s" % (".".join(map(str, err["loc"])), err["msg"]) for err in exc.errors()
+            )})
+        if (i + 1) % JOB_CHUNK_SIZE == 0:
+            job.set_progress(i + 1)
+            await asyncio.sleep(0)
+    job.set_progress(len(items))
+    return {"imported": len(imported), "segment_ids": imported, "errors": errors}
+
+
+async def _job_trip_clusters(job: Job) -> Dict[str, Any]:
+    """
+    cluster_trips for every user with trips (only clusters of 2+ trips are
+    listed); the clustering runs in the process pool.
+    """
+    method = job.params.get("method", "frechet")
+    tolerance_m = float(job.params.get("tolerance_m", 150.0))
+    if method not in SIMILARITY_METHODS:
+        raise ValueError("invalid method")
+    user_ids = TRIPS_BY_USER.keys()
+    job.set_progress(0, len(user_ids))
+    users = []
+    for i, user_id in enumerate(user_ids, 1):
+        trip_ids = TRIPS_BY_USER.ids(user_id)
+        groups = await JOBS.run_in_process(
+            cluster_routes,
+            [TRIPS[tid]["_private_geometry"]["coordinates"] for tid in trip_ids],
+            method=method,
+            tolerance_m=tolerance_m,
+        )
+        users.append({
+            "user_id": user_id,
+            "clusters": [[trip_ids[k] for k in group] for group in groups if len(group) > 1],
+        })
+        job.set_progress(i)
+    return {"method": method, "tolerance_m": tolerance_m, "users": users}
+
+
+JOBS = JobManager(
+    {
+        "aggregation": _job_aggregation,
+        "auto_confirm": _job_auto_confirm,
+        "segment_import": _job_segment_import,
+        "trip_clusters": _job_trip_clusters,
+    },
+    concurrency=int(os.environ.get("JOB_CONCURRENCY", "2")),
+    max_queued=int(os.environ.get("JOB_MAX_QUEUED", "100")),
+    process_workers=int(os.environ.get("JOB_PROCESS_WORKERS", "2")),
+)
+
+
+# The job endpoints are async so that they touch JOBS (and its asyncio.Queue)
+# on the event loop thread, not from the threadpool
+class JobCreate(BaseModel):
+    type: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+@app.post("/api/jobs")
+async def submit_job(payload: JobCreate):
+    """
+    Queue a maintenance job: "aggregation", "auto_confirm" (params: threshold),
+    "segment_import" (params: segments) or "trip_clusters" (params: method, tolerance_m).
+    Poll GET /api/jobs/{id} for progress and the result.
+    """
+    try:
+        job = JOBS.submit(payload.type, payload.params)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="invalid job type")
+    except JobQueueFull:
+        raise HTTPException(status_code=429, detail="job queue full")
+    return job.to_dict()
+
+
+@app.get("/api/jobs")
+async def list_jobs(status: Optional[str] = Query(default=None)):
+    return {
+        "queued": JOBS.queued(),
+        "running": JOBS.running(),
+        "jobs": [job.to_dict() for job in JOBS.list(status)],
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: int):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job_id not found")
+    return job.to_dict()
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: int):
+    """Cancel a queued or running job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job_id not found")
+    if not JOBS.cancel(job_id):
+        raise HTTPException(status_code=409, detail="job already finished")
+    return job.to_dict()
+
+
 # ---- Initialize demo data on startup ----
 # This is called at module level after all classes are defined
 seed_demo_data()
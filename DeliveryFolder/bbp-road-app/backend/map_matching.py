@@ -0,0 +1,185 @@
+"""
+HMM map matching of GPS traces onto road segments.
+
+Each trace point's hidden state is the segment it was recorded on. Candidate
+states come from the segment spatial index (segments within `radius_m`), and
+the most likely sequence is found with Viterbi:
+
+- emission: Gaussian in the distance from the point to the segment (GPS noise
+  `sigma_m`)
+- transition: exponential in the difference between the distance travelled
+  between two fixes and the distance between their projections onto the two
+  candidate segments (Newson & Krumm), plus a cost for switching segments
+- heading: segments running across the direction of travel (measured over a
+  few fixes on each side, so GPS jitter does not flip it) are penalized
+
+A point without candidates breaks the chain; matching restarts after it.
+Consecutive points on the same segment collapse into one traversal.
+
+match_trace only reads the index it is given, so it can run in a worker
+thread against trace_index(), a copy of the segments the trace can reach.
+
+Coordinates are [lon, lat] pairs; distances are measured in a local
+equirectangular projection (see route_similarity.project_m).
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from route_similarity import project_m, reference_lat
+from spatial_index import SegmentGridIndex
+
+DEFAULT_RADIUS_M = 25.0
+DEFAULT_SIGMA_M = 10.0
+# Scale (m) of the travelled vs projected distance mismatch
+TRANSITION_BETA_M = 5.0
+# Log-probability cost of riding perpendicular to a segment
+HEADING_WEIGHT = 2.0
+# Log-probability cost of changing segment between two fixes
+SWITCH_PENALTY = 2.0
+# Heading is taken over this many fixes on each side, to average out GPS noise
+HEADING_WINDOW = 2
+# Moves shorter than this (m) carry no usable heading
+MIN_HEADING_MOVE_M = 3.0
+
+_M_PER_DEG = math.pi / 180.0 * 6_371_000.0
+
+
+def _radius_deg(radius_m: float, lat: Any) -> Any:
+    # Degree radius wide enough along the (shorter) longitude axis
+    return radius_m / (_M_PER_DEG * np.maximum(np.cos(np.radians(lat)), 0.01))
+
+
+def trace_index(
+    index: SegmentGridIndex,
+    coords: Sequence[Sequence[float]],
+    radius_m: float = DEFAULT_RADIUS_M,
+) -> SegmentGridIndex:
+    """Snapshot of `index` holding every segment match_trace can consider for the trace."""
+    points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    radius = _radius_deg(radius_m, points[:, 1])[:, None]
+    lows = np.floor((points - radius) / index.cell_size_deg).astype(np.int64)
+    highs = np.floor((points + radius) / index.cell_size_deg).astype(np.int64)
+    cells = set()
+    for x0, y0, x1, y1 in np.unique(np.hstack([lows, highs]), axis=0).tolist():
+        cells.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return index.snapshot(cells)
+
+
+def _point_candidates(
+    index: SegmentGridIndex,
+    lon: float, lat: float,
+    xy: np.ndarray,
+    ref_lat: float,
+    radius_m: float,
+) -> Dict[str, np.ndarray]:
+    """Segments within radius_m of a point: ids, distances, projections and unit directions."""
+    radius_deg = float(_radius_deg(radius_m, lat))
+    sids = [sid for _, sid in index.query_point(lat, lon, radius_deg)]
+    if not sids:
+        return {"ids": np.empty(0, dtype=np.int64)}
+    ends = project_m([c for sid in sids for c in index.segment_endpoints(sid)], ref_lat).reshape(-1, 2, 2)
+    a, b = ends[:, 0], ends[:, 1]
+    ab = b - a
+    ab_sq = np.einsum("ij,ij->i", ab, ab)
+    t = np.clip(np.einsum("ij,ij->i", xy - a, ab) / np.where(ab_sq > 0, ab_sq, 1.0), 0.0, 1.0)
+    proj = a + t[:, None] * ab
+    dist = np.hypot(*(xy - proj).T)
+    length = np.sqrt(ab_sq)
+    direction = ab / np.where(length > 0, length, 1.0)[:, None]
+    keep = dist <= radius_m
+    return {
+        "ids": np.array(sids, dtype=np.int64)[keep],
+        "dist": dist[keep],
+        "proj": proj[keep],
+        "direction": direction[keep],
+    }
+
+
+def match_trace(
+    index: SegmentGridIndex,
+    coords: Sequence[Sequence[float]],
+    radius_m: float = DEFAULT_RADIUS_M,
+    sigma_m: float = DEFAULT_SIGMA_M,
+) -> List[Optional[int]]:
+    """Matched segment id per trace point (None where no segment is in range)."""
+    n = len(coords)
+    if n == 0:
+        return []
+    ref_lat = reference_lat(coords)
+    xy = project_m(coords, ref_lat)
+    candidates = [
+        _point_candidates(index, coords[k][0], coords[k][1], xy[k], ref_lat, radius_m)
+        for k in range(n)
+    ]
+
+    matched: List[Optional[int]] = [None] * n
+    # Viterbi over each run of points that all have candidates
+    k = 0
+    while k < n:
+        if not len(candidates[k]["ids"]):
+            k += 1
+            continue
+        start = k
+        score = -0.5 * (candidates[k]["dist"] / sigma_m) ** 2
+        back: List[np.ndarray] = []
+        k += 1
+        while k < n and len(candidates[k]["ids"]):
+            prev, cur = candidates[k - 1], candidates[k]
+            travelled = float(np.hypot(*(xy[k] - xy[k - 1])))
+            heading = xy[min(k + HEADING_WINDOW, n - 1)] - xy[max(k - HEADING_WINDOW, 0)]
+            heading_m = float(np.hypot(*heading))
+            # (prev, cur) matrices
+            projected = np.hypot(*(cur["proj"][None, :, :] - prev["proj"][:, None, :]).transpose(2, 0, 1))
+            transition = -np.abs(travelled - projected) / TRANSITION_BETA_M
+            transition -= SWITCH_PENALTY * (prev["ids"][:, None] != cur["ids"][None, :])
+            emission = -0.5 * (cur["dist"] / sigma_m) ** 2
+            if heading_m >= MIN_HEADING_MOVE_M:
+                # Segments are undirected: only the angle to the line matters
+                alignment = np.abs(cur["direction"] @ (heading / heading_m))
+                emission = emission - HEADING_WEIGHT * (1.0 - alignment)
+            total = score[:, None] + transition
+            best_prev = np.argmax(total, axis=0)
+            score = total[best_prev, np.arange(len(cur["ids"]))] + emission
+            back.append(best_prev)
+            k += 1
+        # Backtrack
+        state = int(np.argmax(score))
+        for j in range(k - 1, start - 1, -1):
+            matched[j] = int(candidates[j]["ids"][state])
+            if j > start:
+                state = int(back[j - start - 1][state])
+    return matched
+
+
+def segment_traversals(
+    matched: Sequence[Optional[int]],
+    cumulative: np.ndarray,
+) -> List[Dict[str, Any]]:
+    """
+    Collapse per-point matches into traversals: consecutive points on one
+    segment. cumulative: the trace's cumulative distances (m) per point.
+    """
+    out: List[Dict[str, Any]] = []
+    k = 0
+    n = len(matched)
+    while k < n:
+        sid = matched[k]
+        if sid is None:
+            k += 1
+            continue
+        j = k
+        while j + 1 < n and matched[j + 1] == sid:
+            j += 1
+        out.append({
+            "segment_id": sid,
+            "from_index": k,
+            "to_index": j,
+            "points": j - k + 1,
+            "distance_m": round(float(cumulative[j] - cumulative[k]), 1),
+        })
+        k = j + 1
+    return out
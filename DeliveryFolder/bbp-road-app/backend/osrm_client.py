@@ -0,0 +1,312 @@
+"""
+Async OSRM client.
+
+All route requests share one pooled httpx.AsyncClient (keep-alive, HTTP/2 when
+the server supports it) instead of opening a new connection per call.
+
+Responses go through a RouteCache (see route_cache.py): fresh entries are
+returned without a network call, stale entries are returned immediately while
+a background task revalidates them, and when OSRM errors or times out any
+cached entry is served instead of failing. New entries reach the cache's disk
+tier in batches, written by a worker thread so disk I/O never blocks the loop.
+
+Distance/duration matrices use OSRM `table` requests (`fetch_matrix`): the
+requested cells are split into blocks of at most OSRM_TABLE_MAX_COORDS
+coordinates, fetched concurrently, and cached per cell in a TableCache.
+
+The base URL can be pointed at a local OSRM stand-in through the OSRM_BASE_URL
+environment variable, or at runtime with `configure(base_url=..., transport=...)`
+(e.g. an httpx.MockTransport in tests).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+from route_cache import RouteCache, TableCache
+
+OSRM_BASE_URL = os.environ.get("OSRM_BASE_URL", "http://router.project-osrm.org")
+OSRM_TIMEOUT = 10.0
+OSRM_MAX_CONNECTIONS = 20
+OSRM_MAX_KEEPALIVE = 10
+# Coordinates per table request (the public OSRM server allows 100)
+OSRM_TABLE_MAX_COORDS = int(os.environ.get("OSRM_TABLE_MAX_COORDS", "100"))
+
+ROUTE_CACHE = RouteCache(
+    max_entries=int(os.environ.get("OSRM_CACHE_SIZE", "1024")),
+    ttl_s=float(os.environ.get("OSRM_CACHE_TTL_S", "3600")),
+    stale_while_revalidate_s=float(os.environ.get("OSRM_CACHE_SWR_S", "86400")),
+    disk_path=os.environ.get("OSRM_CACHE_PATH") or None,
+)
+
+TABLE_CACHE = TableCache(
+    max_entries=int(os.environ.get("OSRM_TABLE_CACHE_SIZE", "200000")),
+    ttl_s=float(os.environ.get("OSRM_CACHE_TTL_S", "3600")),
+)
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+_revalidations: Dict[str, "asyncio.Task[None]"] = {}
+_flush_task: Optional["asyncio.Task[None]"] = None
+
+
+def configure(
+    base_url: Optional[str] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    cache: Optional[RouteCache] = None,
+) -> None:
+    """
+    Point the client at another OSRM server, transport and/or route cache.
+    The shared client is rebuilt on next use; call `close_client()` first if one is open.
+    """
+    global OSRM_BASE_URL, ROUTE_CACHE, _transport, _client
+    if base_url is not None:
+        OSRM_BASE_URL = base_url.rstrip("/")
+    if cache is not None:
+        ROUTE_CACHE = cache
+    _transport = transport
+    _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=OSRM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=OSRM_MAX_CONNECTIONS,
+                max_keepalive_connections=OSRM_MAX_KEEPALIVE,
+            ),
+            transport=_transport,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client (called on application shutdown)."""
+    global _client
+    for task in list(_revalidations.values()):
+        task.cancel()
+    _revalidations.clear()
+    if _flush_task is not None:
+        await _flush_task
+    await asyncio.to_thread(ROUTE_CACHE.flush)
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _request_route(url: str) -> Optional[Dict[str, Any]]:
+    """
+    Perform the HTTP request. Returns None when OSRM answers without a route;
+    raises on transport errors, timeouts and non-2xx responses.
+    """
+    resp = await get_client().get(url)
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("code") == "Ok" and data.get("routes"):
+        return data
+    return None
+
+
+def _cache_put(key: str, data: Dict[str, Any]) -> None:
+    ROUTE_CACHE.put(key, data)
+    _schedule_flush()
+
+
+def _schedule_flush() -> None:
+    """Write pending disk-tier entries in a worker thread; one flush at a time, the rest batch up."""
+    global _flush_task
+    if _flush_task is not None or not ROUTE_CACHE.pending_writes:
+        return
+    _flush_task = asyncio.create_task(_flush())
+
+
+async def _flush() -> None:
+    global _flush_task
+    try:
+        while ROUTE_CACHE.pending_writes:
+            await asyncio.to_thread(ROUTE_CACHE.flush)
+    except Exception:
+        pass  # the disk tier is best effort; entries stay in memory
+    finally:
+        _flush_task = None
+
+
+async def _revalidate(key: str, url: str) -> None:
+    try:
+        data = await _request_route(url)
+    except Exception:
+        return  # keep serving the stale entry
+    if data is not None:
+        _cache_put(key, data)
+
+
+def _schedule_revalidation(key: str, url: str) -> None:
+    if key in _revalidations:
+        return
+    task = asyncio.create_task(_revalidate(key, url))
+    _revalidations[key] = task
+    task.add_done_callback(lambda _: _revalidations.pop(key, None))
+
+
+async def _get_route(
+    profile: str,
+    points: Sequence[Tuple[float, float]],
+    alternatives: bool,
+) -> Optional[Dict[str, Any]]:
+    """points: (lat, lon) pairs in request order."""
+    coordinates = ";".join(f"{lon},{lat}" for lat, lon in points)
+    alt_param = "true" if alternatives else "false"
+    url = (
+        f"{OSRM_BASE_URL}/route/v1/{profile}/{coordinates}"
+        f"?overview=full&geometries=geojson&alternatives={alt_param}&steps=true"
+    )
+
+    key = RouteCache.make_key(profile, points, alternatives)
+    entry = ROUTE_CACHE.get(key)
+    if entry is not None:
+        if ROUTE_CACHE.is_fresh(entry):
+            ROUTE_CACHE.hits += 1
+            return entry.data
+        if ROUTE_CACHE.can_serve_stale(entry):
+            ROUTE_CACHE.stale_hits += 1
+            _schedule_revalidation(key, url)
+            return entry.data
+
+    ROUTE_CACHE.misses += 1
+    try:
+        data = await _request_route(url)
+    except Exception:
+        # OSRM down or timing out: any cached answer beats the straight-line fallback
+        if entry is not None:
+            ROUTE_CACHE.stale_hits += 1
+            return entry.data
+        return None
+    if data is not None:
+        _cache_put(key, data)
+    return data
+
+
+async def fetch_route(
+    from_lat: float, from_lon: float,
+    to_lat: float, to_lon: float,
+    profile: str = "bike",
+    alternatives: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch route from OSRM.
+    Returns OSRM response with real road geometry, or None on any failure.
+    """
+    return await _get_route(profile, [(from_lat, from_lon), (to_lat, to_lon)], alternatives)
+
+
+async def fetch_route_via_waypoint(
+    from_lat: float, from_lon: float,
+    via_lat: float, via_lon: float,
+    to_lat: float, to_lon: float,
+    profile: str = "bike"
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch route from OSRM with an intermediate waypoint.
+    Used to generate diverse candidate routes.
+    """
+    return await _get_route(
+        profile,
+        [(from_lat, from_lon), (via_lat, via_lon), (to_lat, to_lon)],
+        False,
+    )
+
+
+async def fetch_table(
+    sources: Sequence[Tuple[float, float]],
+    destinations: Sequence[Tuple[float, float]],
+    profile: str = "bike",
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    One OSRM table request for (lat, lon) sources x destinations.
+    Returns (durations_s, distances_m) with NaN for unreachable pairs, or None on any failure.
+    """
+    coordinates = ";".join(f"{lon},{lat}" for lat, lon in [*sources, *destinations])
+    n = len(sources)
+    url = (
+        f"{OSRM_BASE_URL}/table/v1/{profile}/{coordinates}"
+        f"?sources={';'.join(map(str, range(n)))}"
+        f"&destinations={';'.join(map(str, range(n, n + len(destinations))))}"
+        f"&annotations=duration,distance"
+    )
+    try:
+        resp = await get_client().get(url)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception:
+        return None
+    if data.get("code") != "Ok" or "durations" not in data or "distances" not in data:
+        return None
+    durations = np.array(data["durations"], dtype=float)  # null -> nan
+    distances = np.array(data["distances"], dtype=float)
+    if durations.shape != (n, len(destinations)) or distances.shape != durations.shape:
+        return None
+    return durations, distances
+
+
+def _blocks(indices: np.ndarray, size: int) -> List[np.ndarray]:
+    return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+
+async def fetch_matrix(
+    sources: Sequence[Tuple[float, float]],
+    destinations: Sequence[Tuple[float, float]],
+    profile: str = "bike",
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+    """
+    Durations/distances for every (lat, lon) source x destination pair.
+
+    Cached cells are served from TABLE_CACHE; the rows and columns with missing
+    cells are fetched in blocks of OSRM_TABLE_MAX_COORDS coordinates. Cells OSRM
+    could not answer (unreachable, or the request failed) stay NaN. Returns
+    (durations_s, distances_m, counts) where counts has "cached" and "osrm"
+    cell numbers.
+    """
+    durations, distances, found = TABLE_CACHE.get_many(profile, sources, destinations)
+    missing = ~found
+    cached = int(np.count_nonzero(found))
+    rows = np.flatnonzero(missing.any(axis=1))
+    cols = np.flatnonzero(missing.any(axis=0))
+
+    fetched = 0
+    if len(rows) and len(cols):
+        half = max(1, OSRM_TABLE_MAX_COORDS // 2)
+        # Spend unused coordinates of a short side on the other one
+        row_size = max(half, OSRM_TABLE_MAX_COORDS - min(len(cols), half))
+        col_size = max(1, OSRM_TABLE_MAX_COORDS - min(len(rows), row_size))
+        semaphore = asyncio.Semaphore(OSRM_MAX_CONNECTIONS)
+
+        async def fetch_block(block_rows: np.ndarray, block_cols: np.ndarray) -> None:
+            nonlocal fetched
+            src = [sources[i] for i in block_rows.tolist()]
+            dst = [destinations[j] for j in block_cols.tolist()]
+            async with semaphore:
+                answer = await fetch_table(src, dst, profile)
+            if answer is None:
+                return
+            block_durations, block_distances = answer
+            TABLE_CACHE.put_many(profile, src, dst, block_durations, block_distances)
+            cell = np.ix_(block_rows, block_cols)
+            still_missing = missing[cell]
+            durations[cell] = np.where(still_missing, block_durations, durations[cell])
+            distances[cell] = np.where(still_missing, block_distances, distances[cell])
+            fetched += int(np.count_nonzero(still_missing))
+
+        await asyncio.gather(*[
+            fetch_block(block_rows, block_cols)
+            for block_rows in _blocks(rows, row_size)
+            for block_cols in _blocks(cols, col_size)
+        ])
+    return durations, distances, {"cached": cached, "osrm": fetched}
@@ -0,0 +1,121 @@
+"""
+Result cache for path_search.
+
+Entries are keyed on the quantized origin/destination (same ~10m grid as the
+OSRM route cache) plus every request option that changes the response.
+
+Each entry is stamped with the segment versions it depends on: the summed
+versions of the spatial-index cells its scored routes cover (see
+SegmentGridIndex.covered_cells), or the global index version when the routes
+span too many cells or depend on every segment (local road graph routing).
+A lookup only hits while that stamp is unchanged, so creating, deleting or
+re-rating a segment invalidates just the searches whose routes pass near it.
+Entries also expire after `ttl_s` so OSRM updates eventually show through.
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from route_cache import QUANTIZATION_DEG
+from spatial_index import Cell, SegmentGridIndex
+
+
+class _Entry:
+    __slots__ = ("result", "stored_at", "cells", "stamp")
+
+    def __init__(self, result: Dict[str, Any], stored_at: float, cells: Optional[FrozenSet[Cell]], stamp: int):
+        self.result = result
+        self.stored_at = stored_at
+        self.cells = cells
+        self.stamp = stamp
+
+
+class PathResultCache:
+    """LRU of path_search results validated against SegmentGridIndex versions."""
+
+    def __init__(self, index: SegmentGridIndex, max_entries: int = 512, ttl_s: float = 300.0):
+        self.index = index
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        *options: Hashable,
+    ) -> Tuple[Hashable, ...]:
+        """origin/destination: (lat, lon); options: preference, language, output format..."""
+        quantized = tuple(round(v / QUANTIZATION_DEG) for v in (*origin, *destination))
+        return quantized + tuple(options)
+
+    def _stamp(self, cells: Optional[FrozenSet[Cell]]) -> int:
+        return self.index.version if cells is None else self.index.cells_version(cells)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry.stored_at > self.ttl_s:
+            self.expirations += 1
+        elif self._stamp(entry.cells) != entry.stamp:
+            self.invalidations += 1
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+        del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        key: Hashable,
+        result: Dict[str, Any],
+        routes: Iterable[Sequence[Sequence[float]]],
+        tolerance_deg: float,
+        global_dependency: bool = False,
+    ) -> None:
+        """
+        Store a result together with the cells its routes (full-resolution
+        [lon, lat] lists) depend on. global_dependency=True stamps the entry
+        with the global index version instead.
+        """
+        cells: Optional[FrozenSet[Cell]] = None
+        if not global_dependency:
+            covered: List[FrozenSet[Cell]] = []
+            for coords in routes:
+                route_cells = self.index.covered_cells(coords, tolerance_deg)
+                if route_cells is None:
+                    covered = []
+                    break
+                covered.append(route_cells)
+            if covered:
+                cells = frozenset().union(*covered)
+        self._entries[key] = _Entry(result, time.time(), cells, self._stamp(cells))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,160 @@
+"""
+Running per-segment report aggregates.
+
+A report's voting weight only depends on three facts: whether it is fresh,
+whether it is confirmed and how its note is classified (negative, positive
+or neutral). Each segment therefore keeps a count of its reports per
+(fresh, confirmed, polarity) bucket, and the weighted scores are a dot
+product of those counts with the bucket weights.
+
+Every report mutation moves one count between buckets in O(1). Freshness is
+the only time-dependent part: fresh reports sit in a min-heap keyed by their
+expiry time, and `expire` moves the ones that have gone stale (each report
+once, O(log n)). `count_matrix`, which returns the counts of many segments as
+one array for vectorized scoring, expires first, so reads are always current;
+the segments whose counts changed are collected for `take_expired_segments`,
+so a scheduler can re-evaluate just those.
+
+Looking reports up by segment is left to the store indexes (see store_index).
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+POLARITIES = ("negative", "positive", "neutral")
+_POLARITY_INDEX = {name: i for i, name in enumerate(POLARITIES)}
+
+
+def _bucket(fresh: bool, confirmed: bool, polarity: str) -> int:
+    return (int(fresh) * 2 + int(confirmed)) * len(POLARITIES) + _POLARITY_INDEX[polarity]
+
+
+# (fresh, confirmed, polarity) of each count_matrix column
+BUCKETS: Tuple[Tuple[bool, bool, str], ...] = tuple(
+    (fresh, confirmed, polarity)
+    for fresh in (False, True) for confirmed in (False, True) for polarity in POLARITIES
+)
+
+
+class _SegmentAggregate:
+    __slots__ = ("counts", "report_ids")
+
+    def __init__(self):
+        # Report counts per _bucket(fresh, confirmed, polarity)
+        self.counts: List[int] = [0] * (4 * len(POLARITIES))
+        self.report_ids: Set[int] = set()
+
+
+class ReportAggregates:
+    """Per-segment report counts by freshness, confirmation and polarity."""
+
+    def __init__(self, freshness_days: int):
+        # (now - created_at).days <= freshness_days, i.e. fresh for freshness_days + 1 days
+        self.fresh_for = (freshness_days + 1) * 86400.0
+        self._segments: Dict[int, _SegmentAggregate] = {}
+        # report_id -> [segment_id, fresh, confirmed, polarity, expires_at]
+        self._reports: Dict[int, List[Any]] = {}
+        # (expires_at, report_id) of reports counted as fresh
+        self._expiry: List[Tuple[float, int]] = []
+        self._expired_segments: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._reports)
+
+    # ---- updates ----
+    def add(
+        self,
+        report_id: int,
+        segment_id: int,
+        created_at: Optional[float],
+        confirmed: bool,
+        polarity: str,
+        now: float,
+    ) -> None:
+        """Count a new report. Times are epoch seconds; created_at None (unknown) is never fresh."""
+        agg = self._segments.setdefault(segment_id, _SegmentAggregate())
+        expires_at = created_at + self.fresh_for if created_at is not None else None
+        fresh = expires_at is not None and expires_at > now
+        if fresh:
+            heapq.heappush(self._expiry, (expires_at, report_id))
+        agg.report_ids.add(report_id)
+        agg.counts[_bucket(fresh, confirmed, polarity)] += 1
+        self._reports[report_id] = [segment_id, fresh, confirmed, polarity, expires_at]
+
+    def remove(self, report_id: int) -> None:
+        state = self._reports.pop(report_id, None)
+        if state is None:
+            return
+        segment_id, fresh, confirmed, polarity, _ = state
+        agg = self._segments[segment_id]
+        agg.counts[_bucket(fresh, confirmed, polarity)] -= 1
+        agg.report_ids.discard(report_id)
+        # Its expiry entry is skipped when it comes up
+        if not agg.report_ids:
+            del self._segments[segment_id]
+
+    def set_confirmed(self, report_id: int, confirmed: bool = True) -> None:
+        state = self._reports.get(report_id)
+        if state is None or state[2] == confirmed:
+            return
+        segment_id, fresh, _, polarity, _ = state
+        counts = self._segments[segment_id].counts
+        counts[_bucket(fresh, not confirmed, polarity)] -= 1
+        counts[_bucket(fresh, confirmed, polarity)] += 1
+        state[2] = confirmed
+
+    def remove_segment(self, segment_id: int) -> None:
+        """Forget a segment and all its reports."""
+        agg = self._segments.pop(segment_id, None)
+        if agg is None:
+            return
+        for report_id in agg.report_ids:
+            del self._reports[report_id]
+        self._expired_segments.discard(segment_id)
+
+    # ---- freshness ----
+    def expire(self, now: float) -> None:
+        """Move every report that is no longer fresh at `now` to its stale bucket."""
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            expires_at, report_id = heapq.heappop(heap)
+            state = self._reports.get(report_id)
+            if state is None or not state[1] or state[4] != expires_at:
+                continue  # deleted (or re-added) since
+            segment_id, _, confirmed, polarity, _ = state
+            counts = self._segments[segment_id].counts
+            counts[_bucket(True, confirmed, polarity)] -= 1
+            counts[_bucket(False, confirmed, polarity)] += 1
+            state[1] = False
+            self._expired_segments.add(segment_id)
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest time a report may turn stale (None when no report is fresh)."""
+        return self._expiry[0][0] if self._expiry else None
+
+    def scheduled_expiries(self) -> int:
+        """Entries in the expiry heap (including ones of since-deleted reports)."""
+        return len(self._expiry)
+
+    def take_expired_segments(self) -> List[int]:
+        """Segments whose counts changed through expiry since the last call."""
+        expired, self._expired_segments = self._expired_segments, set()
+        return sorted(expired)
+
+    # ---- reads ----
+    def count_matrix(self, segment_ids: Sequence[int], now: float) -> np.ndarray:
+        """(len(segment_ids), len(BUCKETS)) report counts as of now; zero rows for segments without reports."""
+        self.expire(now)
+        empty = [0] * len(BUCKETS)
+        segments = self._segments
+        return np.array(
+            [segments[sid].counts if sid in segments else empty for sid in segment_ids],
+            dtype=np.int64,
+        ).reshape(len(segment_ids), len(BUCKETS))
+
+    def segment_ids(self) -> List[int]:
+        """Segments with at least one report."""
+        return list(self._segments)
@@ -0,0 +1,60 @@
+"""
+Keyword classifier for report notes.
+
+Notes are labelled "negative", "positive" or "neutral" once, when the report
+is created, by a single compiled regex over the keywords of every supported
+language (en, it, zh). Latin keywords must start at a word boundary and may
+carry any suffix, so "potholes" or "danneggiato" match but "unsafe" does not
+count as "safe". A stem that would also start an unrelated word is spelled
+out instead ("rotto", "rotti", ... but not "rotta", a route). Chinese has no
+word separators, so its keywords match anywhere.
+
+A negative keyword anywhere in the note wins over positive ones.
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, Optional, Tuple
+
+LABELS = ("negative", "positive", "neutral")
+
+# Word stems; suffixes are allowed (plurals, Italian gender/verb endings)
+NEGATIVE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "en": ("bad", "pothole", "damage", "broken", "crack", "hole",
+           "rough", "dangerous", "hazard", "poor", "terrible"),
+    "it": ("buca", "buche", "dannegg", "rotto", "rotti", "rotte", "rottur", "crep",
+           "dissest", "sconness", "pericol", "pessim", "brutt"),
+    "zh": ("坑", "损坏", "破损", "裂缝", "颠簸", "危险", "糟糕", "不好", "很差"),
+}
+POSITIVE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "en": ("good", "fixed", "repaired", "smooth", "clear",
+           "excellent", "optimal", "safe", "fine"),
+    "it": ("buon", "riparat", "sistemat", "liscia", "liscio", "ottim", "sicur", "perfett"),
+    "zh": ("好", "平整", "平坦", "修好", "修复", "安全", "顺畅", "良好"),
+}
+_WORD_LANGUAGES = ("en", "it")
+
+
+def _alternation(table: Dict[str, Tuple[str, ...]]) -> str:
+    # Longest first, so e.g. "pothole" is reported rather than a shorter overlap
+    words = sorted({kw for lang in _WORD_LANGUAGES for kw in table[lang]}, key=len, reverse=True)
+    chars = sorted(set(table["zh"]), key=len, reverse=True)
+    return r"\b(?:%s)|%s" % ("|".join(map(re.escape, words)), "|".join(map(re.escape, chars)))
+
+
+_MATCHER = re.compile(
+    r"(?P<negative>%s)|(?P<positive>%s)" % (_alternation(NEGATIVE_KEYWORDS), _alternation(POSITIVE_KEYWORDS)),
+    re.IGNORECASE,
+)
+
+
+def classify_note(note: Optional[str]) -> str:
+    """"negative", "positive" or "neutral" for a report note."""
+    if not note:
+        return "neutral"
+    label = "neutral"
+    for match in _MATCHER.finditer(note):
+        if match.lastgroup == "negative":
+            return "negative"
+        label = "positive"
+    return label
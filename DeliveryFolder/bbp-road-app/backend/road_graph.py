@@ -0,0 +1,255 @@
+"""
+Local road graph and quality-weighted routing engine.
+
+The graph is loaded from an OSM-derived file or generated as a regular grid for
+testing. Routes are computed with A* on cost = edge length + edge penalty, using
+the straight-line (haversine) distance to the destination as heuristic. The
+heuristic stays admissible because penalties are never negative.
+
+Supported file formats (JSON):
+- GeoJSON FeatureCollection of LineString / MultiLineString features, e.g. an
+  osmium or Overpass export of the highway network. Coordinates shared between
+  lines become junction nodes.
+- {"nodes": [[lat, lon], ...], "edges": [[u, v], ...]} with node indices.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from geodesy import haversine_m
+from spatial_index import point_to_segment_distance
+
+Cell = Tuple[int, int]
+
+GRAPH_CELL_SIZE_DEG = 0.005
+
+
+class RoadGraph:
+    """Undirected road graph with a grid index over nodes and edges."""
+
+    def __init__(self, cell_size_deg: float = GRAPH_CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        self.node_lat: List[float] = []
+        self.node_lon: List[float] = []
+        # edge_id -> (u, v, length_m)
+        self.edges: List[Tuple[int, int, float]] = []
+        # node -> [(neighbor, edge_id)]
+        self.adjacency: List[List[Tuple[int, int]]] = []
+        self._node_ids: Dict[Tuple[float, float], int] = {}
+        self._node_cells: Dict[Cell, List[int]] = {}
+        self._edge_cells: Dict[Cell, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.node_lat)
+
+    def _cell_of(self, lon: float, lat: float) -> Cell:
+        return (math.floor(lon / self.cell_size_deg), math.floor(lat / self.cell_size_deg))
+
+    def _cells_around(self, lat: float, lon: float, radius_deg: float) -> Iterable[Cell]:
+        x0, y0 = self._cell_of(lon - radius_deg, lat - radius_deg)
+        x1, y1 = self._cell_of(lon + radius_deg, lat + radius_deg)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield (x, y)
+
+    # ---- construction ----
+    def add_node(self, lat: float, lon: float) -> int:
+        key = (round(lat, 7), round(lon, 7))
+        node = self._node_ids.get(key)
+        if node is not None:
+            return node
+        node = len(self.node_lat)
+        self._node_ids[key] = node
+        self.node_lat.append(lat)
+        self.node_lon.append(lon)
+        self.adjacency.append([])
+        self._node_cells.setdefault(self._cell_of(lon, lat), []).append(node)
+        return node
+
+    def add_edge(self, u: int, v: int) -> Optional[int]:
+        if u == v:
+            return None
+        length = haversine_m(self.node_lat[u], self.node_lon[u], self.node_lat[v], self.node_lon[v])
+        edge_id = len(self.edges)
+        self.edges.append((u, v, length))
+        self.adjacency[u].append((v, edge_id))
+        self.adjacency[v].append((u, edge_id))
+        x0, y0 = self._cell_of(min(self.node_lon[u], self.node_lon[v]), min(self.node_lat[u], self.node_lat[v]))
+        x1, y1 = self._cell_of(max(self.node_lon[u], self.node_lon[v]), max(self.node_lat[u], self.node_lat[v]))
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                self._edge_cells.setdefault((x, y), []).append(edge_id)
+        return edge_id
+
+    def add_polyline(self, coords: Sequence[Sequence[float]]) -> None:
+        """coords: list of [lon, lat] pairs (GeoJSON order)."""
+        prev = None
+        for lon, lat in coords:
+            node = self.add_node(lat, lon)
+            if prev is not None:
+                self.add_edge(prev, node)
+            prev = node
+
+    # ---- spatial queries ----
+    def nearest_node(self, lat: float, lon: float, max_radius_deg: float = 0.05) -> Optional[int]:
+        radius = self.cell_size_deg
+        while radius <= max_radius_deg * 2:
+            best: Optional[Tuple[float, int]] = None
+            for cell in self._cells_around(lat, lon, radius):
+                for node in self._node_cells.get(cell, ()):
+                    d = (self.node_lat[node] - lat) ** 2 + (self.node_lon[node] - lon) ** 2
+                    if best is None or d < best[0]:
+                        best = (d, node)
+            if best is not None and math.sqrt(best[0]) <= radius:
+                return best[1]
+            radius *= 2
+        return None
+
+    def edges_near(self, lat: float, lon: float, radius_deg: float) -> List[int]:
+        """Edge ids whose geometry lies within radius_deg of the point."""
+        seen = set()
+        found: List[int] = []
+        for cell in self._cells_around(lat, lon, radius_deg):
+            for edge_id in self._edge_cells.get(cell, ()):
+                if edge_id in seen:
+                    continue
+                seen.add(edge_id)
+                u, v, _ = self.edges[edge_id]
+                dist = point_to_segment_distance(
+                    lon, lat,
+                    self.node_lon[u], self.node_lat[u],
+                    self.node_lon[v], self.node_lat[v],
+                )
+                if dist < radius_deg:
+                    found.append(edge_id)
+        return found
+
+    def nearest_edge(self, lat: float, lon: float, radius_deg: float) -> Optional[int]:
+        """Id of the edge closest to the point, if within radius_deg."""
+        best: Optional[Tuple[float, int]] = None
+        for cell in self._cells_around(lat, lon, radius_deg):
+            for edge_id in self._edge_cells.get(cell, ()):
+                u, v, _ = self.edges[edge_id]
+                dist = point_to_segment_distance(
+                    lon, lat,
+                    self.node_lon[u], self.node_lat[u],
+                    self.node_lon[v], self.node_lat[v],
+                )
+                if dist < radius_deg and (best is None or (dist, edge_id) < best):
+                    best = (dist, edge_id)
+        return best[1] if best is not None else None
+
+    # ---- routing ----
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        edge_penalty: Optional[Dict[int, float]] = None,
+    ) -> Optional[Tuple[List[int], float, float]]:
+        """
+        A* from source to target. Returns (node path, length_m, cost) or None if unreachable.
+        cost = sum of edge lengths + sum of edge_penalty values along the path.
+        """
+        penalty = edge_penalty or {}
+        t_lat = self.node_lat[target]
+        t_lon = self.node_lon[target]
+
+        def h(node: int) -> float:
+            return haversine_m(self.node_lat[node], self.node_lon[node], t_lat, t_lon)
+
+        best_cost: Dict[int, float] = {source: 0.0}
+        length_to: Dict[int, float] = {source: 0.0}
+        came_from: Dict[int, int] = {}
+        heap: List[Tuple[float, float, int]] = [(h(source), 0.0, source)]
+        closed = set()
+
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            if node == target:
+                path = [node]
+                while path[-1] in came_from:
+                    path.append(came_from[path[-1]])
+                path.reverse()
+                return path, length_to[target], cost
+            closed.add(node)
+            for neighbor, edge_id in self.adjacency[node]:
+                if neighbor in closed:
+                    continue
+                edge_len = self.edges[edge_id][2]
+                new_cost = cost + edge_len + penalty.get(edge_id, 0.0)
+                if new_cost < best_cost.get(neighbor, math.inf):
+                    best_cost[neighbor] = new_cost
+                    length_to[neighbor] = length_to[node] + edge_len
+                    came_from[neighbor] = node
+                    heapq.heappush(heap, (new_cost + h(neighbor), new_cost, neighbor))
+        return None
+
+    def route(
+        self,
+        from_lat: float, from_lon: float,
+        to_lat: float, to_lon: float,
+        edge_penalty: Optional[Dict[int, float]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Snap both endpoints to the nearest graph node and return the path of
+        least cost (length + edge_penalty) as {"coords": [[lon, lat], ...], "distance_m", "cost"}.
+        """
+        source = self.nearest_node(from_lat, from_lon)
+        target = self.nearest_node(to_lat, to_lon)
+        if source is None or target is None:
+            return None
+        result = self.shortest_path(source, target, edge_penalty)
+        if result is None:
+            return None
+        path, length_m, cost = result
+        coords = [[self.node_lon[n], self.node_lat[n]] for n in path]
+        return {"coords": coords, "distance_m": length_m, "cost": cost}
+
+
+def load_road_graph(path: str) -> RoadGraph:
+    """Load a road graph from a GeoJSON or nodes/edges JSON file."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    graph = RoadGraph()
+    if data.get("type") == "FeatureCollection":
+        for feature in data.get("features", []):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "LineString":
+                graph.add_polyline(geometry["coordinates"])
+            elif geometry.get("type") == "MultiLineString":
+                for line in geometry["coordinates"]:
+                    graph.add_polyline(line)
+    else:
+        nodes = [graph.add_node(lat, lon) for lat, lon in data["nodes"]]
+        for u, v in data["edges"]:
+            graph.add_edge(nodes[u], nodes[v])
+    return graph
+
+
+def generate_grid_graph(
+    center_lat: float,
+    center_lon: float,
+    rows: int = 20,
+    cols: int = 20,
+    spacing_m: float = 100.0,
+) -> RoadGraph:
+    """Generate a rows x cols street grid centred on a point (for tests and demos)."""
+    graph = RoadGraph()
+    dlat = spacing_m / 111_000.0
+    dlon = spacing_m / (111_000.0 * max(math.cos(math.radians(center_lat)), 0.1))
+    lat0 = center_lat - dlat * (rows - 1) / 2
+    lon0 = center_lon - dlon * (cols - 1) / 2
+    ids = [[graph.add_node(lat0 + r * dlat, lon0 + c * dlon) for c in range(cols)] for r in range(rows)]
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                graph.add_edge(ids[r][c], ids[r][c + 1])
+            if r + 1 < rows:
+                graph.add_edge(ids[r][c], ids[r + 1][c])
+    return graph
@@ -0,0 +1,236 @@
+"""
+Route-response cache for OSRM requests.
+
+Entries are keyed on the profile, the alternatives flag and the request
+coordinates quantized to ~10m, so repeated requests for the same
+origin/destination (and waypoint) share one OSRM response.
+
+- In-memory LRU bounded to `max_entries`
+- Entries are fresh for `ttl_s`; older entries are stale but kept, so they can
+  be served while revalidating or when OSRM is failing
+- Optional SQLite file tier (`disk_path`) that survives restarts. `put` only
+  queues the row; `flush` writes everything queued in one transaction and is
+  meant to run off the event loop (osrm_client runs it in a worker thread)
+
+TableCache does the same for OSRM `table` answers, one entry per
+source/destination cell, so overlapping matrix requests only ask OSRM for the
+cells they have not seen.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUANTIZATION_DEG = 0.0001  # ~11m latitude, <=11m longitude
+
+
+class CacheEntry:
+    __slots__ = ("data", "stored_at")
+
+    def __init__(self, data: Dict[str, Any], stored_at: float):
+        self.data = data
+        self.stored_at = stored_at
+
+    def age_s(self) -> float:
+        return time.time() - self.stored_at
+
+
+class RouteCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        stale_while_revalidate_s: float = 86400.0,
+        disk_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.stale_while_revalidate_s = stale_while_revalidate_s
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # Entries put since the last flush, not yet on disk
+        self._pending: Dict[str, CacheEntry] = {}
+        # The connection is shared by the event loop (reads) and the flushing thread
+        self._db_lock = threading.Lock()
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS osrm_routes "
+                "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.commit()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(profile: str, points: Sequence[Tuple[float, float]], alternatives: bool) -> str:
+        """points: (lat, lon) pairs in request order, including any waypoint."""
+        coords = ";".join(
+            f"{round(lat / QUANTIZATION_DEG)},{round(lon / QUANTIZATION_DEG)}" for lat, lon in points
+        )
+        return f"{profile}|{int(alternatives)}|{coords}"
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.age_s() <= self.ttl_s
+
+    def can_serve_stale(self, entry: CacheEntry) -> bool:
+        """Stale entries inside the revalidate window are served immediately."""
+        return entry.age_s() <= self.ttl_s + self.stale_while_revalidate_s
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        entry = self._pending.get(key)
+        if entry is not None:
+            self._remember(key, entry)
+            return entry
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT stored_at, data FROM osrm_routes WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None:
+                entry = CacheEntry(json.loads(row[1]), row[0])
+                self._remember(key, entry)
+                return entry
+        return None
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        entry = CacheEntry(data, time.time())
+        self._remember(key, entry)
+        if self._db is not None:
+            self._pending[key] = entry
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Write the queued entries to the disk tier in one transaction; returns how many."""
+        pending, self._pending = self._pending, {}
+        if not pending or self._db is None:
+            return 0
+        rows = [(key, entry.stored_at, json.dumps(entry.data)) for key, entry in pending.items()]
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO osrm_routes (key, stored_at, data) VALUES (?, ?, ?)", rows
+            )
+            self._db.commit()
+        return len(rows)
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "disk_tier": self._db is not None,
+            "pending_writes": len(self._pending),
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+
+CellKey = Tuple[str, int, int, int, int]
+
+
+class TableCache:
+    """LRU of (duration_s, distance_m) per quantized source/destination pair."""
+
+    def __init__(self, max_entries: int = 200_000, ttl_s: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        # key -> (duration_s, distance_m, stored_at)
+        self._cells: "OrderedDict[CellKey, Tuple[float, float, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    @staticmethod
+    def _quantize(points: Sequence[Tuple[float, float]]) -> List[Tuple[int, int]]:
+        return [(round(lat / QUANTIZATION_DEG), round(lon / QUANTIZATION_DEG)) for lat, lon in points]
+
+    def get_many(
+        self,
+        profile: str,
+        sources: Sequence[Tuple[float, float]],
+        destinations: Sequence[Tuple[float, float]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (durations, distances, found) matrices for (lat, lon) points. Cells not
+        in the cache are NaN with found=False; cached unreachable pairs are NaN
+        with found=True.
+        """
+        durations = np.full((len(sources), len(destinations)), np.nan)
+        distances = np.full((len(sources), len(destinations)), np.nan)
+        found = np.zeros((len(sources), len(destinations)), dtype=bool)
+        cells = self._cells
+        oldest = time.time() - self.ttl_s
+        dst_keys = self._quantize(destinations)
+        for i, src in enumerate(self._quantize(sources)):
+            for j, dst in enumerate(dst_keys):
+                key = (profile, *src, *dst)
+                cell = cells.get(key)
+                if cell is None:
+                    continue
+                if cell[2] < oldest:
+                    del cells[key]
+                    continue
+                cells.move_to_end(key)
+                durations[i, j] = cell[0]
+                distances[i, j] = cell[1]
+                found[i, j] = True
+        hits = int(np.count_nonzero(found))
+        self.hits += hits
+        self.misses += found.size - hits
+        return durations, distances, found
+
+    def put_many(
+        self,
+        profile: str,
+        sources: Sequence[Tuple[float, float]],
+        destinations: Sequence[Tuple[float, float]],
+        durations: np.ndarray,
+        distances: np.ndarray,
+    ) -> None:
+        """Store every cell of a (sources x destinations) answer (NaN = unreachable)."""
+        stored_at = time.time()
+        cells = self._cells
+        dst_keys = self._quantize(destinations)
+        for src, duration_row, distance_row in zip(self._quantize(sources), durations.tolist(), distances.tolist()):
+            for dst, duration, distance in zip(dst_keys, duration_row, distance_row):
+                key = (profile, *src, *dst)
+                cells[key] = (duration, distance, stored_at)
+                cells.move_to_end(key)
+        while len(self._cells) > self.max_entries:
+            self._cells.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._cells),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,238 @@
+"""
+Route similarity engine.
+
+Routes are projected to local meters (equirectangular around a shared
+reference latitude), so every tolerance here is in meters rather than degrees.
+
+- RouteIndex hashes one route's edges into a sorted grid once; all query points
+  are then matched against it in a single vectorized pass.
+- `overlap_ratio` is the sampled "fraction of route A close to route B" test
+  used to deduplicate candidates in path_search.
+- `hausdorff_m` and `discrete_frechet_m` give proper shape distances, and
+  `cluster_routes` groups routes (e.g. saved trips) with any of the methods.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from geodesy import EARTH_RADIUS_M
+
+DEFAULT_TOLERANCE_M = 50.0
+# Shape distances are computed on routes resampled to at most this many points
+MAX_SHAPE_POINTS = 200
+
+
+def reference_lat(*routes: Sequence[Sequence[float]]) -> float:
+    lats = [route[0][1] for route in routes if len(route)]
+    return float(np.mean(lats)) if lats else 0.0
+
+
+def project_m(coords: Sequence[Sequence[float]], ref_lat: float) -> np.ndarray:
+    """[lon, lat] pairs -> (N, 2) array of local x/y meters."""
+    arr = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    k = math.pi / 180.0 * EARTH_RADIUS_M
+    xy = np.empty_like(arr)
+    xy[:, 0] = arr[:, 0] * k * math.cos(math.radians(ref_lat))
+    xy[:, 1] = arr[:, 1] * k
+    return xy
+
+
+def _densify(xy: np.ndarray, max_edge_m: float) -> np.ndarray:
+    """Insert points so no edge is longer than max_edge_m."""
+    if len(xy) < 2:
+        return xy
+    seg = np.diff(xy, axis=0)
+    pieces = np.maximum(1, np.ceil(np.hypot(seg[:, 0], seg[:, 1]) / max_edge_m).astype(np.int64))
+    if np.all(pieces == 1):
+        return xy
+    starts = np.repeat(xy[:-1], pieces, axis=0)
+    steps = np.repeat(seg / pieces[:, None], pieces, axis=0)
+    offsets = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    return np.vstack([starts + steps * offsets[:, None], xy[-1:]])
+
+
+def _resample(xy: np.ndarray, max_points: int) -> np.ndarray:
+    if len(xy) <= max_points:
+        return xy
+    idx = np.linspace(0, len(xy) - 1, max_points).round().astype(np.int64)
+    return xy[idx]
+
+
+def _point_edge_distances(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-wise distance from points p to edges a-b (all (K, 2) arrays)."""
+    ab = b - a
+    ab_sq = np.einsum("ij,ij->i", ab, ab)
+    t = np.einsum("ij,ij->i", p - a, ab) / np.where(ab_sq > 0, ab_sq, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    proj = a + ab * t[:, None]
+    return np.hypot(p[:, 0] - proj[:, 0], p[:, 1] - proj[:, 1])
+
+
+class RouteIndex:
+    """
+    Grid hash over the edges of one projected route.
+
+    Edges are densified to at most `cell_m` long and bucketed by midpoint, so any
+    point within `cell_m` of the route finds its nearest edge in the 5x5 block of
+    cells around it.
+    """
+
+    def __init__(self, xy: np.ndarray, cell_m: float = DEFAULT_TOLERANCE_M):
+        self.cell_m = cell_m
+        pts = _densify(xy, cell_m)
+        if len(pts) == 1:
+            pts = np.vstack([pts, pts])
+        self._a = pts[:-1]
+        self._b = pts[1:]
+        mid = (self._a + self._b) / 2
+        cells = np.floor(mid / cell_m).astype(np.int64)
+        keys = self._key(cells[:, 0], cells[:, 1])
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    @staticmethod
+    def _key(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        return (cx << 32) + (cy & 0xFFFFFFFF)
+
+    def distances(self, points: np.ndarray) -> np.ndarray:
+        """
+        Distance from each point to the route, exact up to cell_m.
+        Points farther than cell_m may get inf or a larger-than-true distance.
+        """
+        n = len(points)
+        if n == 0:
+            return np.empty(0)
+        cells = np.floor(points / self.cell_m).astype(np.int64)
+        dx, dy = np.meshgrid(np.arange(-2, 3), np.arange(-2, 3))
+        qx = (cells[:, 0:1] + dx.ravel()).ravel()
+        qy = (cells[:, 1:2] + dy.ravel()).ravel()
+        owner = np.repeat(np.arange(n), 25)
+
+        qkeys = self._key(qx, qy)
+        lo = np.searchsorted(self._keys, qkeys, side="left")
+        hi = np.searchsorted(self._keys, qkeys, side="right")
+        counts = hi - lo
+        total = int(counts.sum())
+        result = np.full(n, np.inf)
+        if total == 0:
+            return result
+
+        # Expand the (lo, hi) ranges into one flat candidate list
+        pair_owner = np.repeat(owner, counts)
+        pos = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        edges = self._order[pos]
+        dist = _point_edge_distances(points[pair_owner], self._a[edges], self._b[edges])
+        np.minimum.at(result, pair_owner, dist)
+        return result
+
+
+def overlap_ratio(
+    route_a: Sequence[Sequence[float]],
+    route_b: Sequence[Sequence[float]],
+    tolerance_m: float = DEFAULT_TOLERANCE_M,
+    samples: int = 10,
+) -> float:
+    """Fraction of ~`samples` evenly spaced points of route A within tolerance_m of route B."""
+    if not len(route_a) or not len(route_b):
+        return 1.0
+    ref = reference_lat(route_a, route_b)
+    a_xy = project_m(route_a, ref)
+    step = max(1, len(a_xy) // samples)
+    sampled = a_xy[::step]
+    dist = RouteIndex(project_m(route_b, ref), cell_m=tolerance_m).distances(sampled)
+    return float(np.count_nonzero(dist < tolerance_m)) / len(sampled)
+
+
+def _directed_hausdorff(a: np.ndarray, b: np.ndarray) -> float:
+    """Max over vertices of a of the distance to polyline b (vectorized in chunks)."""
+    if len(b) == 1:
+        b = np.vstack([b, b])
+    ea, eb = b[:-1], b[1:]
+    worst = 0.0
+    chunk = max(1, 200_000 // len(ea))
+    for i in range(0, len(a), chunk):
+        p = a[i:i + chunk]
+        pp = np.repeat(p, len(ea), axis=0)
+        d = _point_edge_distances(pp, np.tile(ea, (len(p), 1)), np.tile(eb, (len(p), 1)))
+        worst = max(worst, float(d.reshape(len(p), len(ea)).min(axis=1).max()))
+    return worst
+
+
+def hausdorff_m(route_a: Sequence[Sequence[float]], route_b: Sequence[Sequence[float]]) -> float:
+    """Symmetric Hausdorff distance in meters between two [lon, lat] routes."""
+    ref = reference_lat(route_a, route_b)
+    a_xy = _resample(project_m(route_a, ref), MAX_SHAPE_POINTS * 2)
+    b_xy = _resample(project_m(route_b, ref), MAX_SHAPE_POINTS * 2)
+    return max(_directed_hausdorff(a_xy, b_xy), _directed_hausdorff(b_xy, a_xy))
+
+
+def discrete_frechet_m(route_a: Sequence[Sequence[float]], route_b: Sequence[Sequence[float]]) -> float:
+    """
+    Discrete Fréchet distance in meters. Both routes are resampled to at most
+    MAX_SHAPE_POINTS vertices, so the O(N*M) table stays small.
+    """
+    ref = reference_lat(route_a, route_b)
+    a = _resample(project_m(route_a, ref), MAX_SHAPE_POINTS)
+    b = _resample(project_m(route_b, ref), MAX_SHAPE_POINTS)
+    d = np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+
+    prev = np.maximum.accumulate(d[0])
+    for i in range(1, len(a)):
+        # ca[i][j] = max(d[i][j], min(ca[i-1][j], ca[i-1][j-1], ca[i][j-1]))
+        diag = np.minimum(prev, np.concatenate(([np.inf], prev[:-1])))
+        row = np.empty_like(prev)
+        row[0] = max(d[i, 0], prev[0])
+        for j in range(1, len(b)):
+            row[j] = max(d[i, j], min(diag[j], row[j - 1]))
+        prev = row
+    return float(prev[-1])
+
+
+def routes_similar(
+    route_a: Sequence[Sequence[float]],
+    route_b: Sequence[Sequence[float]],
+    method: str = "overlap",
+    tolerance_m: float = DEFAULT_TOLERANCE_M,
+    overlap_threshold: float = 0.8,
+) -> bool:
+    """
+    Shape similarity test.
+    - "overlap": >= overlap_threshold of sampled points of A lie within tolerance_m of B
+    - "hausdorff": Hausdorff distance <= tolerance_m
+    - "frechet": discrete Fréchet distance <= tolerance_m
+    """
+    if not len(route_a) or not len(route_b):
+        return True
+    if method == "hausdorff":
+        return hausdorff_m(route_a, route_b) <= tolerance_m
+    if method == "frechet":
+        return discrete_frechet_m(route_a, route_b) <= tolerance_m
+    return overlap_ratio(route_a, route_b, tolerance_m) >= overlap_threshold
+
+
+def cluster_routes(
+    routes: Sequence[Sequence[Sequence[float]]],
+    method: str = "frechet",
+    tolerance_m: float = 150.0,
+) -> List[List[int]]:
+    """
+    Greedy leader clustering: each route joins the first cluster whose leader
+    is similar, otherwise starts a new cluster. Returns lists of route indices.
+    """
+    leaders: List[int] = []
+    clusters: List[List[int]] = []
+    for i, route in enumerate(routes):
+        target: Optional[int] = None
+        for c, leader in enumerate(leaders):
+            if routes_similar(route, routes[leader], method=method, tolerance_m=tolerance_m):
+                target = c
+                break
+        if target is None:
+            leaders.append(i)
+            clusters.append([i])
+        else:
+            clusters[target].append(i)
+    return clusters
@@ -0,0 +1,226 @@
+"""
+Columnar, array-backed segment store.
+
+Segments live in parallel NumPy columns (one row per segment) instead of one
+dict per segment:
+
+- coordinates, precomputed length and midpoint as float64
+- status as a small int code (see STATUS_CODES), pothole obstacle as a bool flag
+- created_at / last_aggregated as int64 microseconds since the epoch
+
+Free-text fields (obstacle, road_name) are kept in plain lists. An id -> row
+map gives O(1) lookup; deleted rows go on a free list and are reused by the
+next insert, and columns grow by doubling.
+
+Read access keeps the dict-shaped API: `store[sid]`, `store.values()` and
+iteration materialize the same {"id", "user_id", "start_lat", ...} records the
+API always returned. Scans that only need numbers (scoring, stats, penalties)
+work on the columns directly through `rows_of`.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from geodesy import haversine_np
+
+STATUS_CODES = ("optimal", "medium", "suboptimal", "maintenance")
+STATUS_INDEX = {name: code for code, name in enumerate(STATUS_CODES)}
+STATUS_OPTIMAL, STATUS_MEDIUM, STATUS_SUBOPTIMAL, STATUS_MAINTENANCE = range(4)
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_TIME = np.iinfo(np.int64).min
+
+
+def _to_us(iso: str) -> int:
+    delta = datetime.fromisoformat(iso.replace("Z", "")) - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_us(us: int) -> str:
+    return (_EPOCH + timedelta(microseconds=int(us))).isoformat()
+
+
+def is_pothole(obstacle: Optional[str]) -> bool:
+    return bool(obstacle) and "pothole" in obstacle.lower()
+
+
+class SegmentStore:
+    """Segments as NumPy columns with dict-shaped read access."""
+
+    _FLOAT_COLUMNS = ("start_lat", "start_lon", "end_lat", "end_lon", "length_m", "mid_lat", "mid_lon")
+
+    def __init__(self, capacity: int = 64):
+        self._capacity = 0
+        self._row_of: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._size = 0  # rows ever used (high-water mark)
+        self.ids = np.empty(0, dtype=np.int64)  # row -> segment id, -1 if free
+        self.user_id = np.empty(0, dtype=np.int64)
+        self.status = np.empty(0, dtype=np.int8)
+        self.pothole = np.empty(0, dtype=bool)
+        self.created_us = np.empty(0, dtype=np.int64)
+        self.aggregated_us = np.empty(0, dtype=np.int64)
+        for name in self._FLOAT_COLUMNS:
+            setattr(self, name, np.empty(0, dtype=np.float64))
+        self._obstacle: List[Optional[str]] = []
+        self._road_name: List[Optional[str]] = []
+        self._grow(capacity)
+
+    # ---- storage ----
+    def _grow(self, capacity: int) -> None:
+        old = self._capacity
+        for name in ("ids", "user_id", "status", "pothole", "created_us", "aggregated_us") + self._FLOAT_COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:old] = column
+            setattr(self, name, grown)
+        self.ids[old:] = -1
+        self._obstacle.extend([None] * (capacity - old))
+        self._road_name.extend([None] * (capacity - old))
+        self._capacity = capacity
+
+    def _take_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._size == self._capacity:
+            self._grow(max(64, self._capacity * 2))
+        row = self._size
+        self._size += 1
+        return row
+
+    # ---- mapping interface ----
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, sid: object) -> bool:
+        return sid in self._row_of
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.id_list())
+
+    def __getitem__(self, sid: int) -> Dict[str, Any]:
+        return self._record(self._row_of[sid])
+
+    def get(self, sid: int, default: Any = None) -> Any:
+        row = self._row_of.get(sid)
+        return default if row is None else self._record(row)
+
+    def id_list(self) -> List[int]:
+        """Segment ids in creation (id) order."""
+        return sorted(self._row_of)
+
+    def values(self) -> List[Dict[str, Any]]:
+        """All segments as dicts, in id order."""
+        return self.records(self.id_list())
+
+    def row(self, sid: int) -> int:
+        return self._row_of[sid]
+
+    def rows_of(self, sids: Sequence[int]) -> np.ndarray:
+        """Row numbers for segment ids (for indexing the columns)."""
+        return np.fromiter((self._row_of[sid] for sid in sids), dtype=np.int64, count=len(sids))
+
+    def active_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.ids[:self._size] >= 0)
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        return self.records_at(np.array([row]))[0]
+
+    def records(self, sids: Sequence[int]) -> List[Dict[str, Any]]:
+        return self.records_at(self.rows_of(sids))
+
+    def records_at(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Materialize rows as API dicts (columns converted with one tolist() each)."""
+        ids = self.ids[rows].tolist()
+        user_ids = self.user_id[rows].tolist()
+        start_lat = self.start_lat[rows].tolist()
+        start_lon = self.start_lon[rows].tolist()
+        end_lat = self.end_lat[rows].tolist()
+        end_lon = self.end_lon[rows].tolist()
+        status = self.status[rows].tolist()
+        created = self.created_us[rows].tolist()
+        aggregated = self.aggregated_us[rows].tolist()
+
+        out = []
+        for i, row in enumerate(rows.tolist()):
+            record: Dict[str, Any] = {
+                "id": ids[i],
+                "user_id": user_ids[i],
+                "start_lat": start_lat[i],
+                "start_lon": start_lon[i],
+                "end_lat": end_lat[i],
+                "end_lon": end_lon[i],
+                "status": STATUS_CODES[status[i]],
+                "obstacle": self._obstacle[row],
+            }
+            if self._road_name[row] is not None:
+                record["road_name"] = self._road_name[row]
+            record["created_at"] = _from_us(created[i])
+            if aggregated[i] != _NO_TIME:
+                record["last_aggregated"] = _from_us(aggregated[i])
+            out.append(record)
+        return out
+
+    # ---- mutations ----
+    def add(
+        self,
+        sid: int,
+        user_id: int,
+        start_lat: float, start_lon: float,
+        end_lat: float, end_lon: float,
+        status: str,
+        obstacle: Optional[str],
+        created_at: str,
+        road_name: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if sid in self._row_of:
+            raise KeyError(f"segment {sid} already exists")
+        row = self._take_row()
+        self._row_of[sid] = row
+        self.ids[row] = sid
+        self.user_id[row] = user_id
+        self.start_lat[row] = start_lat
+        self.start_lon[row] = start_lon
+        self.end_lat[row] = end_lat
+        self.end_lon[row] = end_lon
+        self.length_m[row] = haversine_np(start_lat, start_lon, end_lat, end_lon)
+        self.mid_lat[row] = (start_lat + end_lat) / 2
+        self.mid_lon[row] = (start_lon + end_lon) / 2
+        self.status[row] = STATUS_INDEX[status]
+        self.pothole[row] = is_pothole(obstacle)
+        self.created_us[row] = _to_us(created_at)
+        self.aggregated_us[row] = _NO_TIME
+        self._obstacle[row] = obstacle
+        self._road_name[row] = road_name
+        return self._record(row)
+
+    def remove(self, sid: int) -> None:
+        row = self._row_of.pop(sid)
+        self.ids[row] = -1
+        self._obstacle[row] = None
+        self._road_name[row] = None
+        self._free.append(row)
+
+    def status_of(self, sid: int) -> str:
+        return STATUS_CODES[self.status[self._row_of[sid]]]
+
+    def set_status(self, sid: int, status: str, aggregated_at: Optional[str] = None) -> None:
+        row = self._row_of[sid]
+        self.status[row] = STATUS_INDEX[status]
+        if aggregated_at is not None:
+            self.aggregated_us[row] = _to_us(aggregated_at)
+
+    def set_status_rows(self, rows: np.ndarray, codes: np.ndarray, aggregated_at: Optional[str] = None) -> None:
+        """set_status for many rows at once (status codes, see STATUS_CODES)."""
+        self.status[rows] = codes
+        if aggregated_at is not None:
+            self.aggregated_us[rows] = _to_us(aggregated_at)
+
+    # ---- reductions ----
+    def status_counts(self) -> Dict[str, int]:
+        """Number of segments per status (only statuses that occur)."""
+        counts = np.bincount(self.status[self.active_rows()], minlength=len(STATUS_CODES))
+        return {STATUS_CODES[code]: int(n) for code, n in enumerate(counts) if n}
@@ -0,0 +1,135 @@
+"""
+Batch decoding and classification of accelerometer samples.
+
+A batch is decoded into one float64 NumPy column per field (SENSOR_FIELDS),
+whatever the wire format:
+
+- columnar JSON: {"acceleration_x": [...], "acceleration_y": [...], ...}
+- NDJSON: one {"acceleration_x": ..., ...} object per line
+- packed little-endian float32 records, `fields` per sample in the given
+  order (by default all of SENSOR_FIELDS); NaN marks a missing value
+
+acceleration_x/y/z are required, the other fields are optional and become
+NaN when absent (null / not sent). Severity is then classified for the whole
+batch at once from |acceleration_z|.
+
+Parsers given `max_samples` raise BatchTooLarge as soon as the batch is
+known to exceed it, before decoding the rest.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+SENSOR_FIELDS = (
+    "acceleration_x", "acceleration_y", "acceleration_z",
+    "speed_mps", "gps_accuracy_m", "latitude", "longitude",
+)
+REQUIRED_FIELDS = ("acceleration_x", "acceleration_y", "acceleration_z")
+
+SEVERITY_LABELS = ("smooth", "bump", "pothole", "severe")
+# |acceleration_z| (m/s²) above which a sample is bump, pothole, severe
+SEVERITY_THRESHOLDS = np.array([8.0, 15.0, 25.0])
+
+Columns = Dict[str, np.ndarray]
+
+
+class BatchTooLarge(ValueError):
+    """The batch has more samples than allowed."""
+
+
+def severity_codes(acceleration_z: np.ndarray) -> np.ndarray:
+    """Index into SEVERITY_LABELS of every sample."""
+    # right=True: a sample exactly at a threshold stays in the lower class
+    return np.digitize(np.abs(acceleration_z), SEVERITY_THRESHOLDS, right=True).astype(np.int8)
+
+
+def _column(values: Sequence[Any], name: str) -> np.ndarray:
+    try:
+        # None -> NaN
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be numbers")
+
+
+def _finish(columns: Columns, size: int) -> Columns:
+    for name in REQUIRED_FIELDS:
+        if name not in columns:
+            raise ValueError(f"{name} is required")
+        if not np.isfinite(columns[name]).all():
+            raise ValueError(f"{name} must be finite numbers")
+    for name in SENSOR_FIELDS:
+        if name not in columns:
+            columns[name] = np.full(size, np.nan)
+        elif columns[name].shape != (size,):
+            raise ValueError(f"{name} must have one value per sample")
+    return columns
+
+
+def parse_columnar(payload: Any, max_samples: Optional[int] = None) -> Columns:
+    """{field: [values]} with equal-length lists."""
+    if not isinstance(payload, dict):
+        raise ValueError("body must be an object of field arrays")
+    unknown = set(payload) - set(SENSOR_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown field {sorted(unknown)[0]}")
+    for name, values in payload.items():
+        if values is not None and not isinstance(values, list):
+            raise ValueError(f"{name} must be an array")
+    if max_samples is not None and any(
+        values is not None and len(values) > max_samples for values in payload.values()
+    ):
+        raise BatchTooLarge(f"more than {max_samples} samples")
+    columns = {
+        name: _column(values, name)
+        for name, values in payload.items() if values is not None
+    }
+    size = len(columns.get("acceleration_z", ()))
+    return _finish(columns, size)
+
+
+def parse_ndjson(body: bytes, max_samples: Optional[int] = None) -> Columns:
+    """One sample object per non-empty line."""
+    rows: List[Dict[str, Any]] = []
+    for line_no, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        if max_samples is not None and len(rows) >= max_samples:
+            raise BatchTooLarge(f"more than {max_samples} samples")
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {line_no}: invalid JSON")
+        if not isinstance(row, dict):
+            raise ValueError(f"line {line_no}: expected an object")
+        rows.append(row)
+    columns = {
+        name: _column([row.get(name) for row in rows], name)
+        for name in SENSOR_FIELDS
+        if any(name in row for row in rows)
+    }
+    return _finish(columns, len(rows))
+
+
+def parse_float32(
+    body: bytes,
+    fields: Optional[Sequence[str]] = None,
+    max_samples: Optional[int] = None,
+) -> Columns:
+    """Packed little-endian float32 records of `fields` (default SENSOR_FIELDS)."""
+    fields = tuple(fields or SENSOR_FIELDS)
+    unknown = set(fields) - set(SENSOR_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown field {sorted(unknown)[0]}")
+    if len(set(fields)) != len(fields):
+        raise ValueError("duplicate field")
+    record = 4 * len(fields)
+    if len(body) % record:
+        raise ValueError(f"body length must be a multiple of {record} bytes")
+    if max_samples is not None and len(body) // record > max_samples:
+        raise BatchTooLarge(f"more than {max_samples} samples")
+    matrix = np.frombuffer(body, dtype="<f4").reshape(-1, len(fields)).astype(np.float64)
+    columns = {name: matrix[:, i] for i, name in enumerate(fields)}
+    return _finish(columns, len(matrix))
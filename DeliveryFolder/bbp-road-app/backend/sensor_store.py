@@ -0,0 +1,214 @@
+"""
+Per-user sensor reading store: a fixed-size ring of NumPy records in memory,
+with older readings spilled to disk.
+
+Readings are SENSOR_DTYPE records (53 bytes each, instead of a dict per
+reading). Each user has a ring of `capacity` records; appends write into the
+ring in place, in O(1) per reading. When the ring is full, its oldest
+readings are evicted in blocks of at least `spill_block` and appended to the
+user's spill file, so the full history is kept. The spill file is a plain
+array of records, read back zero-copy through np.memmap.
+
+Spill files belong to this process: a user's file is truncated on its first
+spill, like the rest of the in-memory data, which is reset on restart.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from sensor_ingest import SEVERITY_LABELS
+
+SENSOR_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("timestamp_us", "<i8"),  # microseconds since the epoch (UTC)
+    ("acceleration_x", "<f4"),
+    ("acceleration_y", "<f4"),
+    ("acceleration_z", "<f4"),
+    ("speed_mps", "<f4"),
+    ("gps_accuracy_m", "<f4"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("severity", "i1"),  # index into SEVERITY_LABELS
+])
+_FLOAT_FIELDS = ("acceleration_x", "acceleration_y", "acceleration_z",
+                 "speed_mps", "gps_accuracy_m", "latitude", "longitude")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp_us(when: datetime) -> int:
+    delta = when - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def make_records(
+    first_id: int,
+    timestamp_us: int,
+    columns: Dict[str, np.ndarray],
+    severity: np.ndarray,
+) -> np.ndarray:
+    """Records with consecutive ids from sensor_ingest columns (NaN = missing)."""
+    records = np.empty(len(severity), dtype=SENSOR_DTYPE)
+    records["id"] = np.arange(first_id, first_id + len(severity))
+    records["timestamp_us"] = timestamp_us
+    for name in _FLOAT_FIELDS:
+        records[name] = columns[name]
+    records["severity"] = severity
+    return records
+
+
+def to_dicts(records: np.ndarray, user_id: int) -> List[Dict[str, Any]]:
+    """Records as the API's reading dicts; missing values become None."""
+    values = {}
+    for name in _FLOAT_FIELDS:
+        column = records[name].astype(np.float64)
+        if records.dtype[name] == np.float32:
+            # Drop float32 noise (9.8 is stored as 9.80000019...)
+            column = np.round(column, 6)
+        values[name] = [None if v != v else v for v in column.tolist()]
+    timestamps = [(_EPOCH + timedelta(microseconds=us)).isoformat() for us in records["timestamp_us"].tolist()]
+    return [
+        {
+            "id": reading_id,
+            "user_id": user_id,
+            "acceleration_x": x,
+            "acceleration_y": y,
+            "acceleration_z": z,
+            "speed_mps": speed,
+            "gps_accuracy_m": accuracy,
+            "latitude": lat,
+            "longitude": lon,
+            "severity": SEVERITY_LABELS[code],
+            "timestamp": timestamp,
+        }
+        for reading_id, x, y, z, speed, accuracy, lat, lon, code, timestamp in zip(
+            records["id"].tolist(),
+            *(values[name] for name in _FLOAT_FIELDS),
+            records["severity"].tolist(),
+            timestamps,
+        )
+    ]
+
+
+class SensorRing:
+    """One user's readings: the newest in a ring buffer, older ones in a spill file."""
+
+    def __init__(self, capacity: int, spill_path: Optional[str], spill_block: int):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.spill_block = spill_block
+        self._buf = np.zeros(capacity, dtype=SENSOR_DTYPE)
+        self._head = 0  # position of the oldest reading in memory
+        self._count = 0
+        self.spilled = 0  # readings in the spill file
+        self._history: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        return self.spilled + self._count
+
+    @property
+    def in_memory(self) -> int:
+        return self._count
+
+    def _positions(self, start: int, n: int) -> np.ndarray:
+        return (start + np.arange(n)) % self.capacity
+
+    def append(self, records: np.ndarray) -> None:
+        n = len(records)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            # Everything in memory and the batch's head go straight to disk
+            self._spill(np.concatenate([self.recent(self._count), records[:n - self.capacity]]))
+            self._buf[:] = records[n - self.capacity:]
+            self._head, self._count = 0, self.capacity
+            return
+        overflow = self._count + n - self.capacity
+        if overflow > 0:
+            evict = min(self._count, max(overflow, self.spill_block))
+            self._spill(self._buf[self._positions(self._head, evict)])
+            self._head = (self._head + evict) % self.capacity
+            self._count -= evict
+        self._buf[self._positions(self._head + self._count, n)] = records
+        self._count += n
+
+    def _spill(self, records: np.ndarray) -> None:
+        if self.spill_path is None:
+            return  # no history kept
+        # First spill of this process truncates a file left by an earlier one
+        with open(self.spill_path, "ab" if self.spilled else "wb") as f:
+            f.write(records.tobytes())
+        self.spilled += len(records)
+        self._history = None
+
+    def recent(self, n: int) -> np.ndarray:
+        """Up to n newest readings in memory, oldest first (a copy)."""
+        n = min(n, self._count)
+        return self._buf[self._positions(self._head + self._count - n, n)]
+
+    def history(self) -> np.ndarray:
+        """Spilled readings, oldest first, memory-mapped (no copy)."""
+        if not self.spilled:
+            return np.empty(0, dtype=SENSOR_DTYPE)
+        if self._history is None:
+            self._history = np.memmap(self.spill_path, dtype=SENSOR_DTYPE, mode="r", shape=(self.spilled,))
+        return self._history
+
+    def latest(self, n: int) -> np.ndarray:
+        """Up to n newest readings, oldest first, reading the spill file when needed."""
+        from_disk = min(max(0, n - self._count), self.spilled)
+        recent = self.recent(n)
+        if not from_disk:
+            return recent
+        return np.concatenate([self.history()[self.spilled - from_disk:], recent])
+
+
+class SensorStore:
+    """
+    user_id -> SensorRing. spill_dir None keeps no history beyond the rings;
+    "" spills to a temporary directory created on first use.
+    """
+
+    def __init__(self, capacity: int = 1000, spill_dir: Optional[str] = None, spill_block: int = 256):
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.spill_block = spill_block
+        self._rings: Dict[int, SensorRing] = {}
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._rings
+
+    def ring(self, user_id: int) -> SensorRing:
+        ring = self._rings.get(user_id)
+        if ring is None:
+            ring = self._rings[user_id] = SensorRing(self.capacity, self._spill_path(user_id), self.spill_block)
+        return ring
+
+    def _spill_path(self, user_id: int) -> Optional[str]:
+        if self.spill_dir is None:
+            return None
+        if not self.spill_dir:
+            self.spill_dir = tempfile.mkdtemp(prefix="bbp-sensor-readings-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        return os.path.join(self.spill_dir, f"user_{user_id}.bin")
+
+    def append(self, user_id: int, records: np.ndarray) -> None:
+        self.ring(user_id).append(records)
+
+    def latest(self, user_id: int, n: int) -> np.ndarray:
+        ring = self._rings.get(user_id)
+        return ring.latest(n) if ring is not None else np.empty(0, dtype=SENSOR_DTYPE)
+
+    def stats(self, user_id: int) -> Dict[str, Any]:
+        ring = self._rings.get(user_id)
+        return {
+            "readings": len(ring) if ring else 0,
+            "in_memory": ring.in_memory if ring else 0,
+            "spilled": ring.spilled if ring else 0,
+            "record_bytes": SENSOR_DTYPE.itemsize,
+        }
@@ -0,0 +1,137 @@
+"""
+Multi-resolution polyline simplification.
+
+Instead of re-running a simplifier for every zoom level, each polyline gets a
+per-vertex importance array computed once:
+
+- "dp" (Douglas-Peucker): the largest tolerance in meters at which the vertex
+  is still kept.
+- "vw" (Visvalingam-Whyatt): the effective triangle area in m² at which the
+  vertex is eliminated.
+
+Importances are made monotone (a vertex never outlives the vertex that
+introduced it), so thresholding at any tolerance gives exactly the result the
+simplifier would have produced for that tolerance, in O(N). Endpoints are
+always kept.
+
+Coordinates are [lon, lat] pairs; distances are measured in a local
+equirectangular projection (see route_similarity.project_m).
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from typing import List, Sequence
+
+import numpy as np
+
+from route_similarity import project_m, reference_lat
+
+SIMPLIFY_METHODS = {"dp", "vw"}
+# Meters per pixel at zoom 0 on the equator (256 px Web Mercator tiles)
+ZOOM0_M_PER_PX = 156_543.03392
+# Deviation allowed per zoom level, in screen pixels
+PIXEL_TOLERANCE = 1.0
+
+
+def zoom_tolerance_m(zoom: float, lat: float, pixels: float = PIXEL_TOLERANCE) -> float:
+    """Simplification tolerance in meters for a Web Mercator zoom level at a latitude."""
+    return ZOOM0_M_PER_PX * math.cos(math.radians(lat)) / (2 ** zoom) * pixels
+
+
+def douglas_peucker_importance(coords: Sequence[Sequence[float]]) -> np.ndarray:
+    n = len(coords)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+    xy = project_m(coords, reference_lat(coords))
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, cap = stack.pop()
+        if j - i < 2:
+            continue
+        a, b = xy[i], xy[j]
+        ab = b - a
+        ab_sq = float(ab @ ab)
+        p = xy[i + 1:j]
+        if ab_sq > 0:
+            t = np.clip((p - a) @ ab / ab_sq, 0.0, 1.0)
+            proj = a + t[:, None] * ab
+        else:
+            proj = a
+        dist = np.hypot(p[:, 0] - proj[..., 0], p[:, 1] - proj[..., 1])
+        k = int(np.argmax(dist))
+        value = min(float(dist[k]), cap)
+        k += i + 1
+        importance[k] = value
+        stack.append((i, k, value))
+        stack.append((k, j, value))
+    return importance
+
+
+def visvalingam_importance(coords: Sequence[Sequence[float]]) -> np.ndarray:
+    n = len(coords)
+    importance = np.full(n, np.inf)
+    if n < 3:
+        return importance
+    xy = project_m(coords, reference_lat(coords))
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+
+    def area(i: int) -> float:
+        (ax, ay), (bx, by), (cx, cy) = xy[prev[i]], xy[i], xy[nxt[i]]
+        return abs((bx - ax) * (cy - ay) - (cx - ax) * (by - ay)) / 2
+
+    current = [0.0] * n
+    heap = []
+    for i in range(1, n - 1):
+        current[i] = area(i)
+        heap.append((current[i], i))
+    heapq.heapify(heap)
+
+    floor = 0.0
+    removed = [False] * n
+    while heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or a != current[i]:
+            continue
+        floor = max(floor, a)
+        importance[i] = floor
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p] = q
+        prev[q] = p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                current[j] = area(j)
+                heapq.heappush(heap, (current[j], j))
+    return importance
+
+
+def point_importance(coords: Sequence[Sequence[float]], method: str = "dp") -> np.ndarray:
+    """Per-vertex importance for `simplify_with_importance` (computed once per polyline)."""
+    if method == "vw":
+        return visvalingam_importance(coords)
+    return douglas_peucker_importance(coords)
+
+
+def simplify_with_importance(
+    coords: Sequence[Sequence[float]],
+    importance: np.ndarray,
+    tolerance_m: float,
+    method: str = "dp",
+) -> List[List[float]]:
+    """
+    Vertices of coords kept at tolerance_m. For "vw" the area threshold is
+    tolerance_m² (a triangle as large as a square of side tolerance_m).
+    """
+    threshold = tolerance_m * tolerance_m if method == "vw" else tolerance_m
+    keep = np.flatnonzero(importance > threshold)
+    return [list(coords[i]) for i in keep]
+
+
+def simplify(coords: Sequence[Sequence[float]], tolerance_m: float, method: str = "dp") -> List[List[float]]:
+    """One-off simplification (when the importance array is not cached)."""
+    return simplify_with_importance(coords, point_importance(coords, method), tolerance_m, method)
@@ -0,0 +1,248 @@
+"""
+Uniform grid spatial index over road segment geometry.
+
+Segments are bucketed into fixed-size lat/lon cells covering their bounding
+box. Route proximity queries only look at the cells a route actually passes
+through, so the cost depends on the route length and the local segment
+density instead of the total number of segments.
+
+Each cell also carries a version counter, bumped whenever a segment whose
+midpoint lies in it is inserted, removed or touched. Since proximity matches
+are decided on midpoints, a cached result that depends on a route is still
+valid as long as the versions of the cells the route covers are unchanged.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+Cell = Tuple[int, int]
+
+DEFAULT_CELL_SIZE_DEG = 0.005  # ~550m at the equator
+# Routes covering more cells than this are tracked by the global version only
+MAX_TRACKED_CELLS = 4096
+
+
+def point_to_segment_distance(px: float, py: float, ax: float, ay: float, bx: float, by: float) -> float:
+    """Distance from point (px, py) to line segment (ax, ay)-(bx, by)."""
+    abx = bx - ax
+    aby = by - ay
+    apx = px - ax
+    apy = py - ay
+    ab_sq = abx * abx + aby * aby
+    if ab_sq == 0:
+        return math.sqrt(apx * apx + apy * apy)
+    t = max(0, min(1, (apx * abx + apy * aby) / ab_sq))
+    proj_x = ax + t * abx
+    proj_y = ay + t * aby
+    return math.sqrt((px - proj_x) ** 2 + (py - proj_y) ** 2)
+
+
+class SegmentGridIndex:
+    """
+    Grid index mapping cells to the ids of segments whose bounding box overlaps them.
+
+    Coordinates are handled in degrees, matching `find_segments_near_route`.
+    `version` is bumped on every mutation so callers can cheaply detect changes;
+    `cells_version` does the same for a set of cells.
+    """
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        self.version = 0
+        self._cells: Dict[Cell, Set[int]] = {}
+        # segment_id -> (start_lon, start_lat, end_lon, end_lat)
+        self._geometry: Dict[int, Tuple[float, float, float, float]] = {}
+        self._segment_cells: Dict[int, List[Cell]] = {}
+        self._midpoint_cell: Dict[int, Cell] = {}
+        self._cell_versions: Dict[Cell, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._geometry)
+
+    def __contains__(self, segment_id: int) -> bool:
+        return segment_id in self._geometry
+
+    def segment_endpoints(self, segment_id: int) -> List[List[float]]:
+        """[[start_lon, start_lat], [end_lon, end_lat]] of an indexed segment."""
+        s_lon, s_lat, e_lon, e_lat = self._geometry[segment_id]
+        return [[s_lon, s_lat], [e_lon, e_lat]]
+
+    def cell_of(self, lon: float, lat: float) -> Cell:
+        return (math.floor(lon / self.cell_size_deg), math.floor(lat / self.cell_size_deg))
+
+    def _cell_range(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> Tuple[int, int, int, int]:
+        x0, y0 = self.cell_of(min_lon, min_lat)
+        x1, y1 = self.cell_of(max_lon, max_lat)
+        return x0, y0, x1, y1
+
+    def _cells_in_range(self, x0: int, y0: int, x1: int, y1: int) -> Iterator[Cell]:
+        # Very large boxes (e.g. a 2-point straight route) would enumerate
+        # mostly empty cells; walk the occupied cells instead.
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            for cell in self._cells:
+                if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1:
+                    yield cell
+            return
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield (x, y)
+
+    # ---- mutation ----
+    def insert(self, segment_id: int, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> None:
+        if segment_id in self._geometry:
+            self.remove(segment_id)
+        x0, y0, x1, y1 = self._cell_range(
+            min(start_lon, end_lon), min(start_lat, end_lat),
+            max(start_lon, end_lon), max(start_lat, end_lat),
+        )
+        cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(segment_id)
+        self._geometry[segment_id] = (start_lon, start_lat, end_lon, end_lat)
+        self._segment_cells[segment_id] = cells
+        self._midpoint_cell[segment_id] = self.cell_of((start_lon + end_lon) / 2, (start_lat + end_lat) / 2)
+        self._bump(self._midpoint_cell[segment_id])
+
+    def remove(self, segment_id: int) -> None:
+        if segment_id not in self._geometry:
+            return
+        for cell in self._segment_cells.pop(segment_id):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(segment_id)
+                if not bucket:
+                    del self._cells[cell]
+        del self._geometry[segment_id]
+        self._bump(self._midpoint_cell.pop(segment_id))
+
+    def touch(self, segment_id: int) -> None:
+        """Record a non-geometric change (e.g. status) to an indexed segment."""
+        if segment_id in self._geometry:
+            self._bump(self._midpoint_cell[segment_id])
+
+    def _bump(self, cell: Cell) -> None:
+        self._cell_versions[cell] = self._cell_versions.get(cell, 0) + 1
+        self.version += 1
+
+    # ---- versions ----
+    def covered_cells(
+        self,
+        coords: Sequence[Sequence[float]],
+        tolerance_deg: float,
+        max_cells: int = MAX_TRACKED_CELLS,
+    ) -> Optional[FrozenSet[Cell]]:
+        """
+        Every cell (occupied or not) in which a segment midpoint could match the
+        polyline in `query_polyline`. None if that is more than max_cells.
+        """
+        cells: Set[Cell] = set()
+        for i in range(len(coords) - 1):
+            lon1, lat1 = coords[i]
+            lon2, lat2 = coords[i + 1]
+            x0, y0, x1, y1 = self._cell_range(
+                min(lon1, lon2) - tolerance_deg, min(lat1, lat2) - tolerance_deg,
+                max(lon1, lon2) + tolerance_deg, max(lat1, lat2) + tolerance_deg,
+            )
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > max_cells:
+                return None
+            cells.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+            if len(cells) > max_cells:
+                return None
+        return frozenset(cells)
+
+    def cells_version(self, cells: FrozenSet[Cell]) -> int:
+        """Sum of cell versions; counters only grow, so any change alters the sum."""
+        versions = self._cell_versions
+        return sum(versions.get(cell, 0) for cell in cells)
+
+    # ---- queries ----
+    def query_polyline(self, coords: Sequence[Sequence[float]], tolerance_deg: float) -> List[int]:
+        """
+        Return ids of segments whose midpoint lies within tolerance_deg of the polyline.
+        coords: list of [lon, lat] pairs. Result is sorted by segment id.
+        """
+        if not self._cells or len(coords) < 2:
+            return []
+
+        # Register every route edge in the cells its tolerance-expanded bbox covers.
+        # A midpoint within tolerance of an edge always falls inside that bbox.
+        cell_edges: Dict[Cell, List[int]] = {}
+        for i in range(len(coords) - 1):
+            lon1, lat1 = coords[i]
+            lon2, lat2 = coords[i + 1]
+            x0, y0, x1, y1 = self._cell_range(
+                min(lon1, lon2) - tolerance_deg, min(lat1, lat2) - tolerance_deg,
+                max(lon1, lon2) + tolerance_deg, max(lat1, lat2) + tolerance_deg,
+            )
+            for cell in self._cells_in_range(x0, y0, x1, y1):
+                if cell in self._cells:
+                    cell_edges.setdefault(cell, []).append(i)
+
+        found: List[int] = []
+        for cell, edge_ids in cell_edges.items():
+            for sid in self._cells[cell]:
+                # Each segment is evaluated only in its midpoint cell
+                if self._midpoint_cell[sid] != cell:
+                    continue
+                s_lon, s_lat, e_lon, e_lat = self._geometry[sid]
+                mid_lon = (s_lon + e_lon) / 2
+                mid_lat = (s_lat + e_lat) / 2
+                for i in edge_ids:
+                    lon1, lat1 = coords[i]
+                    lon2, lat2 = coords[i + 1]
+                    if point_to_segment_distance(mid_lon, mid_lat, lon1, lat1, lon2, lat2) < tolerance_deg:
+                        found.append(sid)
+                        break
+        found.sort()
+        return found
+
+    def query_point(self, lat: float, lon: float, radius_deg: float) -> List[Tuple[float, int]]:
+        """
+        Return (distance_deg, segment_id) for segments whose line lies within
+        radius_deg of the point, nearest first.
+        """
+        x0, y0, x1, y1 = self._cell_range(lon - radius_deg, lat - radius_deg, lon + radius_deg, lat + radius_deg)
+        candidates: Set[int] = set()
+        for cell in self._cells_in_range(x0, y0, x1, y1):
+            bucket = self._cells.get(cell)
+            if bucket:
+                candidates.update(bucket)
+
+        hits: List[Tuple[float, int]] = []
+        for sid in candidates:
+            s_lon, s_lat, e_lon, e_lat = self._geometry[sid]
+            dist = point_to_segment_distance(lon, lat, s_lon, s_lat, e_lon, e_lat)
+            if dist <= radius_deg:
+                hits.append((dist, sid))
+        hits.sort()
+        return hits
+
+    def nearest_point(self, lat: float, lon: float, radius_deg: float) -> Optional[Tuple[int, float, float]]:
+        """
+        (segment_id, lat, lon) of the closest point on the nearest segment
+        within radius_deg of the point, or None.
+        """
+        hits = self.query_point(lat, lon, radius_deg)
+        if not hits:
+            return None
+        sid = hits[0][1]
+        s_lon, s_lat, e_lon, e_lat = self._geometry[sid]
+        dx, dy = e_lon - s_lon, e_lat - s_lat
+        length_sq = dx * dx + dy * dy
+        t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((lon - s_lon) * dx + (lat - s_lat) * dy) / length_sq))
+        return sid, s_lat + t * dy, s_lon + t * dx
+
+    def snapshot(self, cells: Iterable[Cell]) -> "SegmentGridIndex":
+        """
+        Independent index of the segments overlapping `cells`, which can be
+        queried (e.g. from a worker thread) while this one keeps changing.
+        """
+        copy = SegmentGridIndex(self.cell_size_deg)
+        segment_ids: Set[int] = set()
+        for cell in cells:
+            segment_ids.update(self._cells.get(cell, ()))
+        for segment_id in segment_ids:
+            s_lon, s_lat, e_lon, e_lat = self._geometry[segment_id]
+            copy.insert(segment_id, s_lat, s_lon, e_lat, e_lon)
+        return copy
@@ -0,0 +1,68 @@
+"""
+Secondary indexes over the in-memory stores.
+
+The stores themselves are plain dicts keyed by id. A `SortedIndex` groups ids
+by a foreign key (e.g. trips by user_id) and keeps each group ordered by a
+sort key (e.g. created_at), so "all rows of X" is a lookup of the result size
+and comes back already sorted. Callers update the index in the same place
+they insert into or delete from the store.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class SortedIndex:
+    """group key -> ids ordered by (sort_key, id)."""
+
+    def __init__(self):
+        self._groups: Dict[Hashable, List[Tuple[Any, int]]] = {}
+        self._entries: Dict[int, Tuple[Hashable, Any]] = {}  # id -> (group key, sort key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._entries
+
+    def add(self, item_id: int, key: Hashable, sort_key: Any) -> None:
+        if item_id in self._entries:
+            self.remove(item_id)
+        group = self._groups.setdefault(key, [])
+        entry = (sort_key, item_id)
+        # Rows are usually inserted in sort order
+        if not group or group[-1] < entry:
+            group.append(entry)
+        else:
+            insort(group, entry)
+        self._entries[item_id] = (key, sort_key)
+
+    def remove(self, item_id: int) -> None:
+        found = self._entries.pop(item_id, None)
+        if found is None:
+            return
+        key, sort_key = found
+        group = self._groups[key]
+        del group[bisect_left(group, (sort_key, item_id))]
+        if not group:
+            del self._groups[key]
+
+    def pop_group(self, key: Hashable) -> List[int]:
+        """Remove a whole group; returns its ids in order."""
+        ids = [item_id for _, item_id in self._groups.pop(key, [])]
+        for item_id in ids:
+            del self._entries[item_id]
+        return ids
+
+    def ids(self, key: Hashable, reverse: bool = False) -> List[int]:
+        group = self._groups.get(key, [])
+        ordered = reversed(group) if reverse else group
+        return [item_id for _, item_id in ordered]
+
+    def keys(self) -> List[Hashable]:
+        """Group keys with at least one id."""
+        return list(self._groups)
+
+    def count(self, key: Hashable) -> int:
+        return len(self._groups.get(key, ()))
@@ -0,0 +1,64 @@
+"""Tests for budgeted candidate generation (main._generate_candidates / _candidate_set)."""
+import asyncio
+
+import pytest
+
+import main
+
+ORIGIN = main.Coordinate(lat=45.4642, lon=9.19)
+DEST = main.Coordinate(lat=45.4784, lon=9.2275)
+
+
+def osrm_route(coords):
+    return {"routes": [{"geometry": {"coordinates": coords}, "distance": 1000.0 + len(coords), "duration": 100.0}]}
+
+
+@pytest.fixture
+def osrm(monkeypatch):
+    """Direct route after `direct_delay` seconds; every waypoint probe gives a distinct route."""
+    state = {"direct_delay": 0.0}
+
+    async def direct(*args, **kwargs):
+        await asyncio.sleep(state["direct_delay"])
+        return osrm_route([[ORIGIN.lon, ORIGIN.lat], [DEST.lon, DEST.lat]])
+
+    async def via(o_lat, o_lon, w_lat, w_lon, d_lat, d_lon, profile="bike"):
+        return osrm_route([[o_lon, o_lat], [w_lon, w_lat], [d_lon, d_lat]])
+
+    async def wait_for_probe(task, deadline):
+        # Probes always finish: only the check between rounds sees the deadline
+        return True, await task
+
+    monkeypatch.setattr(main, "fetch_osrm_route", direct)
+    monkeypatch.setattr(main, "fetch_osrm_route_via_waypoint", via)
+    monkeypatch.setattr(main, "_await_probe", wait_for_probe)
+    monkeypatch.setattr(main, "routes_are_similar", lambda *args: False)
+    monkeypatch.setattr(main, "ROUTING_ENGINE", "osrm")
+    monkeypatch.setattr(main, "CANDIDATE_CACHE", main.PathResultCache(main.SEGMENT_INDEX))
+    return state
+
+
+def statuses(report):
+    return [p["status"] for p in report["waypoint_probes"]]
+
+
+def test_enough_candidates_skips_later_rounds(osrm):
+    candidates, _, report = asyncio.run(main._generate_candidates(ORIGIN, DEST))
+    assert len(candidates) == 3
+    assert statuses(report) == ["accepted", "accepted", "skipped", "skipped"]
+    assert not report["deadline_reached"]
+
+
+def test_budget_spent_before_probing_is_reported_and_not_cached(osrm):
+    osrm["direct_delay"] = 0.05
+    candidate_set = asyncio.run(main._candidate_set(ORIGIN, DEST, budget_ms=10))
+    report = candidate_set["candidate_search"]
+    assert report["direct"] == "accepted"
+    assert statuses(report) == ["deadline"] * 4
+    assert report["deadline_reached"] and report["probes_skipped"] == 4
+    assert len(candidate_set["candidates"]) == 1
+    # A later search without a budget is not served the truncated set
+    complete = asyncio.run(main._candidate_set(ORIGIN, DEST))
+    assert not complete["candidate_search"]["cached"]
+    assert len(complete["candidates"]) == 3
+    assert asyncio.run(main._candidate_set(ORIGIN, DEST))["candidate_search"]["cached"]
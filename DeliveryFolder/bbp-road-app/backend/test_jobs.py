@@ -0,0 +1,25 @@
+import asyncio
+
+import jobs
+
+
+def test_stop_cancels_running_and_queued_jobs():
+    async def run():
+        started = asyncio.Event()
+
+        async def slow(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        manager = jobs.JobManager({"slow": slow}, concurrency=1, process_workers=0)
+        await manager.start()
+        running = manager.submit("slow", {})
+        queued = manager.submit("slow", {})
+        await started.wait()
+        assert (running.status, queued.status) == (jobs.RUNNING, jobs.QUEUED)
+        await manager.stop()
+        return running, queued
+
+    running, queued = asyncio.run(run())
+    assert (running.status, queued.status) == (jobs.CANCELLED, jobs.CANCELLED)
+    assert queued.finished_at is not None
@@ -0,0 +1,62 @@
+"""Tests for HMM map matching of GPS traces (map_matching.py)."""
+import numpy as np
+
+from geodesy import cumulative_distances
+from map_matching import match_trace, segment_traversals, trace_index
+from spatial_index import SegmentGridIndex
+
+# Two parallel east-west segments ~22 m apart
+A, B = 1, 2
+LAT_A, LAT_B = 45.0, 45.0002
+
+
+def parallel_index():
+    index = SegmentGridIndex()
+    index.insert(A, LAT_A, 9.0, LAT_A, 9.01)
+    index.insert(B, LAT_B, 9.0, LAT_B, 9.01)
+    return index
+
+
+def trace(lats):
+    """[lon, lat] fixes ~39 m apart, eastwards, at the given latitudes."""
+    return [[9.0005 + 0.0005 * i, lat] for i, lat in enumerate(lats)]
+
+
+def test_straight_trace_along_one_segment():
+    coords = trace([LAT_A + 0.00002] * 18)
+    assert match_trace(parallel_index(), coords) == [A] * 18
+    (traversal,) = segment_traversals([A] * 18, cumulative_distances(coords))
+    assert (traversal["segment_id"], traversal["from_index"], traversal["to_index"]) == (A, 0, 17)
+    assert abs(traversal["distance_m"] - 17 * 39.3) < 1.0
+
+
+def test_trace_crossing_to_the_parallel_segment():
+    coords = trace([LAT_A + 0.00001] * 9 + [LAT_B - 0.00001] * 9)
+    assert match_trace(parallel_index(), coords) == [A] * 9 + [B] * 9
+
+
+def test_single_noisy_fix_does_not_switch_segment():
+    lats = [LAT_A + 0.00002] * 15
+    lats[7] = LAT_A + 0.00013  # closer to B, but only for one fix
+    assert match_trace(parallel_index(), trace(lats)) == [A] * 15
+
+
+def test_points_out_of_range_break_the_chain():
+    lats = [LAT_A] * 5 + [45.01] * 2 + [LAT_A] * 5
+    assert match_trace(parallel_index(), trace(lats)) == [A] * 5 + [None] * 2 + [A] * 5
+    assert match_trace(parallel_index(), []) == []
+
+
+def test_trace_index_snapshot_matches_like_the_full_index():
+    rng = np.random.default_rng(3)
+    index = parallel_index()
+    for sid in range(3, 300):
+        lat, lon = 45.0 + rng.random() * 0.02 - 0.01, 9.0 + rng.random() * 0.02 - 0.005
+        index.insert(sid, lat, lon, lat + rng.uniform(-0.001, 0.001), lon + rng.uniform(-0.001, 0.001))
+    coords = trace(LAT_A + rng.uniform(-0.0002, 0.0004, 18))
+    snapshot = trace_index(index, coords)
+    assert len(snapshot) < len(index)
+    assert match_trace(snapshot, coords) == match_trace(index, coords)
+    # Later changes to the live index do not reach the snapshot
+    index.remove(A)
+    assert A in snapshot
@@ -0,0 +1,280 @@
+"""Tests for the running per-segment report counts (report_aggregates.py)."""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import main
+from report_aggregates import BUCKETS, POLARITIES, ReportAggregates
+from store_index import SortedIndex
+
+DAY = 86400.0
+
+
+def recount(reports, segment_ids, now, fresh_for):
+    """Brute-force count matrix from report dicts {id: (segment_id, created, confirmed, polarity)}."""
+    counts = np.zeros((len(segment_ids), len(BUCKETS)), dtype=np.int64)
+    row = {sid: i for i, sid in enumerate(segment_ids)}
+    for segment_id, created, confirmed, polarity in reports.values():
+        if segment_id in row:
+            fresh = created is not None and created + fresh_for > now
+            counts[row[segment_id], BUCKETS.index((fresh, confirmed, polarity))] += 1
+    return counts
+
+
+def test_random_mutations_match_recount():
+    rng = random.Random(7)
+    aggregates = ReportAggregates(freshness_days=2)
+    reports = {}
+    now = 1_000_000.0
+    next_id = 1
+    segments = list(range(1, 9))
+    for step in range(3000):
+        op = rng.random()
+        if op < 0.45 or not reports:
+            created = None if rng.random() < 0.05 else now - rng.uniform(0, 5 * DAY)
+            segment_id, polarity = rng.choice(segments), rng.choice(POLARITIES)
+            aggregates.add(next_id, segment_id, created, False, polarity, now)
+            reports[next_id] = (segment_id, created, False, polarity)
+            next_id += 1
+        elif op < 0.65:
+            rid = rng.choice(list(reports))
+            confirmed = rng.random() < 0.8
+            aggregates.set_confirmed(rid, confirmed)
+            segment_id, created, _, polarity = reports[rid]
+            reports[rid] = (segment_id, created, confirmed, polarity)
+        elif op < 0.8:
+            rid = rng.choice(list(reports))
+            aggregates.remove(rid)
+            del reports[rid]
+        elif op < 0.83:
+            segment_id = rng.choice(segments)
+            aggregates.remove_segment(segment_id)
+            reports = {rid: r for rid, r in reports.items() if r[0] != segment_id}
+        else:
+            now += rng.uniform(0, DAY)
+        if step % 50 == 0:
+            assert (aggregates.count_matrix(segments, now) == recount(reports, segments, now, aggregates.fresh_for)).all()
+            assert len(aggregates) == len(reports)
+    assert (aggregates.count_matrix(segments, now) == recount(reports, segments, now, aggregates.fresh_for)).all()
+
+
+def test_expiry_moves_reports_once_and_reports_segments():
+    aggregates = ReportAggregates(freshness_days=0)  # fresh for one day
+    aggregates.add(1, 10, 0.0, False, "negative", now=0.0)
+    aggregates.add(2, 10, DAY / 2, True, "positive", now=DAY / 2)
+    aggregates.add(3, 20, 2 * DAY, False, "neutral", now=2 * DAY)  # expires at 3 days
+    assert aggregates.next_expiry() == DAY
+
+    aggregates.expire(DAY - 1)
+    assert aggregates.take_expired_segments() == []
+
+    aggregates.expire(DAY)  # report 1 expires exactly now
+    assert aggregates.take_expired_segments() == [10]
+    row = aggregates.count_matrix([10], DAY)[0]
+    assert row[BUCKETS.index((False, False, "negative"))] == 1
+    assert row[BUCKETS.index((True, True, "positive"))] == 1
+
+    aggregates.expire(2 * DAY)
+    assert aggregates.take_expired_segments() == [10]
+    assert aggregates.take_expired_segments() == []
+    assert aggregates.next_expiry() == 3 * DAY
+
+
+def test_deleted_and_readded_reports_do_not_expire_twice():
+    aggregates = ReportAggregates(freshness_days=0)
+    aggregates.add(1, 10, 0.0, False, "negative", now=0.0)
+    aggregates.remove(1)
+    assert aggregates.scheduled_expiries() == 1  # stale heap entry stays
+    # Same id counted again, fresh for longer: the old heap entry is skipped
+    aggregates.add(1, 10, DAY, False, "negative", now=DAY)
+    aggregates.expire(1.5 * DAY)
+    assert aggregates.take_expired_segments() == []
+    row = aggregates.count_matrix([10], 1.5 * DAY)[0]
+    assert row[BUCKETS.index((True, False, "negative"))] == 1
+
+    aggregates.remove_segment(10)
+    assert len(aggregates) == 0
+    assert (aggregates.count_matrix([10], 3 * DAY) == 0).all()
+    assert aggregates.take_expired_segments() == []
+
+
+@pytest.fixture
+def fresh_report_state(monkeypatch):
+    """main's report store, index and aggregates, empty."""
+    monkeypatch.setattr(main, "REPORTS", {})
+    monkeypatch.setattr(main, "REPORTS_BY_SEGMENT", SortedIndex())
+    monkeypatch.setattr(main, "REPORT_AGGREGATES", ReportAggregates(main.AGGREGATION_FRESHNESS_DAYS))
+
+
+def main_recount(segment_ids, now):
+    """Count matrix rebuilt from main.REPORTS through REPORTS_BY_SEGMENT."""
+    fresh_for = main.REPORT_AGGREGATES.fresh_for
+    reports = {
+        rid: (sid, main.report_timestamp(main.REPORTS[rid]), main.REPORTS[rid]["confirmed"], main.REPORTS[rid]["label"])
+        for sid in segment_ids
+        for rid in main.REPORTS_BY_SEGMENT.ids(sid)
+    }
+    return recount(reports, segment_ids, now, fresh_for)
+
+
+class _ShiftedDatetime(datetime):
+    """datetime whose utcnow() is `shift` in the past."""
+    shift = timedelta(0)
+
+    @classmethod
+    def utcnow(cls):
+        return datetime.utcnow() - cls.shift
+
+
+def test_main_report_endpoints_keep_counts_in_sync(fresh_report_state, monkeypatch):
+    rng = random.Random(3)
+    segment_ids = main.SEGMENTS.id_list()[:4]
+    notes = ["big pothole", "road is smooth", "buca pericolosa", "ok", "路面平整", None]
+    monkeypatch.setattr(main, "datetime", _ShiftedDatetime)
+    created = []
+    for i in range(60):
+        # The first 20 reports are already past the freshness window
+        _ShiftedDatetime.shift = timedelta(days=40 if i < 20 else 0)
+        created.append(main.create_report(rng.choice(segment_ids), main.ReportCreate(note=rng.choice(notes)))["id"])
+
+    for rid in rng.sample(created, 15):
+        main.confirm_report(rid)
+    main.confirm_report(created[0])  # re-confirming is a no-op
+    main.batch_confirm_reports(rng.sample(created, 10))
+    for rid in rng.sample(created, 12):
+        if rid in main.REPORTS:
+            main.delete_report(rid)
+    main.auto_confirm_segment(segment_ids[0], 1)
+
+    now = max(r["created_ts"] for r in main.REPORTS.values())
+    counts = main.REPORT_AGGREGATES.count_matrix(segment_ids, now)
+    assert (counts == main_recount(segment_ids, now)).all()
+    stale = [i for i, (fresh, _, _) in enumerate(BUCKETS) if not fresh]
+    assert 0 < counts[:, stale].sum() < counts.sum()
+    # Everything created now turns stale after the window
+    later = now + (main.AGGREGATION_FRESHNESS_DAYS + 2) * DAY
+    assert (main.REPORT_AGGREGATES.count_matrix(segment_ids, later) == main_recount(segment_ids, later)).all()
+    assert set(main.REPORT_AGGREGATES.take_expired_segments()) <= set(segment_ids)
+
+
+def test_freshness_scheduler_survives_a_failing_run(fresh_report_state, monkeypatch):
+    calls = []
+
+    def flaky(now):
+        calls.append(now)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "expire_report_freshness", flaky)
+    monkeypatch.setattr(main, "FRESHNESS_SCHEDULER_MAX_SLEEP_S", 0.01)
+    monkeypatch.setitem(main.FRESHNESS_SCHEDULER_STATS, "errors", 0)
+    monkeypatch.setitem(main.FRESHNESS_SCHEDULER_STATS, "last_error", None)
+
+    async def run():
+        task = asyncio.create_task(main.freshness_scheduler())
+        while len(calls) < 3:
+            await asyncio.sleep(0.01)
+        assert not task.done()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert main.FRESHNESS_SCHEDULER_STATS["errors"] == 1
+    assert main.FRESHNESS_SCHEDULER_STATS["last_error"] == "boom"
+
+
+def _segments_due_for_maintenance(count):
+    user_id = next(iter(main.USERS))
+    new_ids = [
+        main.create_segment(main.SegmentCreate(
+            user_id=user_id, start_lat=45.40 + i * 1e-3, start_lon=9.10, end_lat=45.40 + i * 1e-3, end_lon=9.101,
+        ))["id"]
+        for i in range(count)
+    ]
+    for sid in new_ids:
+        for _ in range(3):
+            main.create_report(sid, main.ReportCreate(note="big pothole"))
+    return new_ids
+
+
+async def _aggregate(partitions):
+    return [item async for item in main.aggregate_partitions(partitions)]
+
+
+def test_partition_aggregation_skips_segments_deleted_meanwhile(fresh_report_state, monkeypatch):
+    new_ids = _segments_due_for_maintenance(3)
+    kept, deleted = new_ids[:2], new_ids[2]
+
+    score = main.score_segments
+
+    def delete_while_scoring(*args):
+        main.delete_segment(deleted)
+        return score(*args)
+
+    # Thread fallback, so the patched scorer runs
+    monkeypatch.setattr(main.JOBS, "process_workers", 0)
+    monkeypatch.setattr(main, "score_segments", delete_while_scoring)
+    [(tile, results)] = asyncio.run(_aggregate([((0, 0), new_ids)]))
+    assert tile == (0, 0)
+    assert [r["segment_id"] for r in results] == kept
+    assert all(r["status_changed"] and r["recommended_status"] == "maintenance" for r in results)
+    assert [main.SEGMENTS.get(sid)["status"] for sid in kept] == ["maintenance", "maintenance"]
+
+    monkeypatch.setattr(main, "score_segments", score)
+    # Same scores as the synchronous path, nothing left to change
+    assert [r["status_changed"] for r in main.aggregate_segments(kept)] == [False, False]
+    for sid in kept:
+        main.delete_segment(sid)
+
+
+def test_partition_aggregation_keeps_statuses_changed_by_hand_meanwhile(fresh_report_state, monkeypatch):
+    new_ids = _segments_due_for_maintenance(4)
+    score = main.score_segments
+
+    def set_by_hand_while_scoring(*args):
+        main.apply_detection(new_ids[1], new_status="medium")
+        return score(*args)
+
+    monkeypatch.setattr(main.JOBS, "process_workers", 0)
+    monkeypatch.setattr(main, "score_segments", set_by_hand_while_scoring)
+    chunks = asyncio.run(_aggregate([((0, 0), new_ids[:2]), ((0, 1), new_ids[2:])]))
+    # Chunks come back in partition order
+    assert [[r["segment_id"] for r in results] for _, results in chunks] == [new_ids[:2], new_ids[2:]]
+    results = chunks[0][1] + chunks[1][1]
+    assert [r["status_changed"] for r in results] == [True, False, True, True]
+    assert [main.SEGMENTS.get(sid)["status"] for sid in new_ids] == ["maintenance", "medium", "maintenance", "maintenance"]
+    for sid in new_ids:
+        main.delete_segment(sid)
+
+
+def test_partition_aggregation_in_the_process_pool(fresh_report_state):
+    new_ids = _segments_due_for_maintenance(3)
+    chunks = asyncio.run(_aggregate([((0, 0), new_ids[:1]), ((0, 1), new_ids[1:])]))
+    assert [[r["segment_id"] for r in results] for _, results in chunks] == [new_ids[:1], new_ids[1:]]
+    assert [main.SEGMENTS.get(sid)["status"] for sid in new_ids] == ["maintenance"] * 3
+    for sid in new_ids:
+        main.delete_segment(sid)
+
+
+def test_aggregation_job_does_not_count_segments_deleted_meanwhile(fresh_report_state, monkeypatch):
+    new_ids = _segments_due_for_maintenance(3)
+    score = main.score_segments
+
+    def delete_while_scoring(*args):
+        if new_ids[2] in main.SEGMENTS:
+            main.delete_segment(new_ids[2])
+        return score(*args)
+
+    monkeypatch.setattr(main.JOBS, "process_workers", 0)
+    monkeypatch.setattr(main, "score_segments", delete_while_scoring)
+    monkeypatch.setattr(main, "aggregation_partitions", lambda: [((0, 0), list(new_ids))])
+    job = main.Job(1, "aggregation", {})
+    result = asyncio.run(main._job_aggregation(job))
+    assert result == {"segments_processed": 2, "status_changes": 2}
+    assert (job.done, job.total) == (2, 3)
+    for sid in new_ids[:2]:
+        main.delete_segment(sid)
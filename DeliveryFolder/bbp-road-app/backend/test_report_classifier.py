@@ -0,0 +1,42 @@
+"""Tests for the multilingual report note classifier (report_classifier.py)."""
+import pytest
+
+from report_classifier import classify_note
+
+NOTES = [
+    # English
+    ("Big pothole near the crossing", "negative"),
+    ("POTHOLES everywhere", "negative"),
+    ("surface is rough and dangerous", "negative"),
+    ("road was repaired, smooth now", "positive"),
+    ("feels safe", "positive"),
+    ("unsafe at night", "neutral"),  # "safe" only at a word start
+    ("whole street", "neutral"),  # not "hole"
+    ("good asphalt but one broken drain", "negative"),  # negative wins
+    # Italian
+    ("buca pericolosa all'incrocio", "negative"),
+    ("asfalto danneggiato", "negative"),
+    ("tombino rotto", "negative"),
+    ("strade rotte dopo la pioggia", "negative"),
+    ("una rottura nel cordolo", "negative"),
+    ("rotta ciclabile consigliata", "neutral"),  # a route, not broken
+    ("la rotta è liscia", "positive"),
+    ("strada sistemata, ottima", "positive"),
+    ("percorso sicuro", "positive"),
+    # Chinese
+    ("路面有坑", "negative"),
+    ("这里很危险", "negative"),
+    ("路面平整", "positive"),
+    ("已经修好了", "positive"),
+    ("路面不好", "negative"),  # contains 好, negative wins
+    # Mixed and empty
+    ("smooth ma con una buca", "negative"),
+    ("ok", "neutral"),
+    ("", "neutral"),
+    (None, "neutral"),
+]
+
+
+@pytest.mark.parametrize("note, label", NOTES)
+def test_classify_note(note, label):
+    assert classify_note(note) == label
@@ -0,0 +1,121 @@
+"""Tests for the local road graph engine (road_graph.py) and its segment penalties in main."""
+import math
+import random
+
+import pytest
+
+import main
+from road_graph import generate_grid_graph
+from segment_store import SegmentStore
+from spatial_index import SegmentGridIndex
+
+CENTER = (45.4642, 9.19)
+
+
+def path_edges(graph, path):
+    edge_of = {frozenset((u, v)): edge_id for edge_id, (u, v, _) in enumerate(graph.edges)}
+    return [edge_of[frozenset(pair)] for pair in zip(path, path[1:])]
+
+
+def brute_force_best(graph, source, target, penalty):
+    """Least length + penalty over every simple path."""
+    best = math.inf
+    stack = [(source, {source}, 0.0)]
+    while stack:
+        node, seen, cost = stack.pop()
+        if node == target:
+            best = min(best, cost)
+            continue
+        for neighbor, edge_id in graph.adjacency[node]:
+            if neighbor not in seen:
+                edge_cost = graph.edges[edge_id][2] + penalty.get(edge_id, 0.0)
+                stack.append((neighbor, seen | {neighbor}, cost + edge_cost))
+    return best
+
+
+def test_a_star_matches_brute_force_on_a_grid():
+    rng = random.Random(2)
+    graph = generate_grid_graph(*CENTER, rows=3, cols=4, spacing_m=100.0)
+    for _ in range(30):
+        penalty = {e: rng.choice([0.0, 0.0, 50.0, 400.0]) for e in range(len(graph.edges))}
+        source, target = rng.sample(range(len(graph)), 2)
+        path, length_m, cost = graph.shortest_path(source, target, penalty)
+        assert (path[0], path[-1]) == (source, target)
+        edges = path_edges(graph, path)
+        assert cost == pytest.approx(sum(graph.edges[e][2] + penalty.get(e, 0.0) for e in edges))
+        assert length_m == pytest.approx(sum(graph.edges[e][2] for e in edges))
+        assert cost == pytest.approx(brute_force_best(graph, source, target, penalty))
+
+
+def test_nearest_edge():
+    graph = generate_grid_graph(*CENTER, rows=2, cols=2, spacing_m=100.0)
+    lat0, lon0 = graph.node_lat[0], graph.node_lon[0]
+    lat1, lon1 = graph.node_lat[1], graph.node_lon[1]  # same row, east of node 0
+    edge_id = graph.nearest_edge(lat0 + 0.0001, (lon0 + lon1) / 2, 0.002)
+    assert set(graph.edges[edge_id][:2]) == {0, 1}
+    assert graph.nearest_edge(lat0 + 0.05, lon0, 0.002) is None
+
+
+@pytest.fixture
+def grid_segments(monkeypatch):
+    """main routing over a 4x4 grid with its own segment store."""
+    graph = generate_grid_graph(*CENTER, rows=4, cols=4, spacing_m=100.0)
+    monkeypatch.setattr(main, "ROAD_GRAPH", graph)
+    monkeypatch.setattr(main, "SEGMENTS", SegmentStore())
+    monkeypatch.setattr(main, "SEGMENT_INDEX", SegmentGridIndex())
+    monkeypatch.setattr(main, "_ROAD_GRAPH_PENALTIES", {})
+    monkeypatch.setattr(main, "_SEGMENT_EDGES", {})
+
+    def add(sid, lat, lon, status="maintenance"):
+        start = (lat, lon - 0.0002)
+        end = (lat, lon + 0.0002)
+        main.SEGMENTS.add(sid, 1, *start, *end, status, None, "2025-01-01T00:00:00")
+        main.SEGMENT_INDEX.insert(sid, *start, *end)
+
+    return graph, add
+
+
+def test_each_segment_is_charged_on_one_edge(grid_segments):
+    graph, add = grid_segments
+    # At a junction: four edges within tolerance of the midpoint
+    add(1, graph.node_lat[5], graph.node_lon[5])
+    add(2, graph.node_lat[6] + 0.0001, (graph.node_lon[6] + graph.node_lon[7]) / 2)
+    expected = main.segment_penalties(main.SEGMENTS.active_rows(), "safety_first")
+    penalties = main.road_graph_edge_penalties("safety_first")
+    assert len(penalties) == 2
+    assert sorted(penalties.values()) == pytest.approx(sorted(expected.tolist()))
+    assert set(graph.edges[main.segment_graph_edges(main.SEGMENTS.rows_of([2]))[0]][:2]) == {6, 7}
+
+
+def test_penalties_follow_status_changes_without_re_snapping(grid_segments, monkeypatch):
+    graph, add = grid_segments
+    add(1, graph.node_lat[5], graph.node_lon[5])
+    add(2, graph.node_lat[10], graph.node_lon[10], status="optimal")
+    first = main.road_graph_edge_penalties("balanced")
+    assert len(first) == 1
+
+    snapped = []
+    nearest = graph.nearest_edge
+    monkeypatch.setattr(graph, "nearest_edge", lambda *args: snapped.append(args) or nearest(*args))
+    main.SEGMENTS.set_status_rows(main.SEGMENTS.rows_of([2]), [main.STATUS_INDEX["maintenance"]])
+    main.SEGMENT_INDEX.touch(2)
+    assert len(main.road_graph_edge_penalties("balanced")) == 2
+    assert snapped == []
+    # A new segment is the only one snapped
+    add(3, graph.node_lat[0], graph.node_lon[0])
+    assert len(main.road_graph_edge_penalties("balanced")) == 3
+    assert len(snapped) == 1
+
+
+def test_route_pays_each_segment_once(grid_segments):
+    graph, add = grid_segments
+    for sid, node in enumerate(range(len(graph)), start=1):
+        if node % 3 == 0:
+            add(sid, graph.node_lat[node], graph.node_lon[node])
+    penalties = main.road_graph_edge_penalties("balanced")
+    result = graph.shortest_path(0, len(graph) - 1, penalties)
+    edges = path_edges(graph, result[0])
+    mapped = main.segment_graph_edges(main.SEGMENTS.active_rows())
+    charged = [p for p, e in zip(main.segment_penalties(main.SEGMENTS.active_rows(), "balanced"), mapped) if e in edges]
+    assert result[2] - result[1] == pytest.approx(sum(charged))
+    assert result[2] == pytest.approx(brute_force_best(graph, 0, len(graph) - 1, penalties))
@@ -0,0 +1,169 @@
+"""Tests for the OSRM route cache (route_cache.py) and how osrm_client uses it."""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import osrm_client
+from route_cache import RouteCache
+
+ROUTE = [(45.4642, 9.19), (45.4784, 9.2275)]
+
+
+def osrm_answer(tag):
+    return {"code": "Ok", "routes": [{"distance": 1000.0, "duration": 200.0, "tag": tag}]}
+
+
+class FakeOSRM:
+    """httpx transport answering every route request; counts requests, can fail."""
+
+    def __init__(self):
+        self.requests = 0
+        self.tag = "first"
+        self.failing = False
+
+    def __call__(self, request):
+        self.requests += 1
+        if self.failing:
+            return httpx.Response(503)
+        return httpx.Response(200, json=osrm_answer(self.tag))
+
+
+@pytest.fixture
+def osrm(monkeypatch):
+    fake = FakeOSRM()
+    cache = RouteCache(max_entries=8, ttl_s=100.0, stale_while_revalidate_s=1000.0)
+    monkeypatch.setattr(osrm_client, "ROUTE_CACHE", cache)
+    monkeypatch.setattr(osrm_client, "_transport", httpx.MockTransport(fake))
+    monkeypatch.setattr(osrm_client, "_client", None)
+    return fake, cache
+
+
+def age(cache, seconds):
+    """Make every cached entry `seconds` older."""
+    for entry in cache._entries.values():
+        entry.stored_at -= seconds
+
+
+def fetch():
+    async def run():
+        try:
+            data = await osrm_client.fetch_route(*ROUTE[0], *ROUTE[1])
+            # Let revalidation tasks finish before the loop closes
+            await asyncio.gather(*osrm_client._revalidations.values())
+            return data
+        finally:
+            await osrm_client.close_client()
+    return asyncio.run(run())
+
+
+def test_ttl_fresh_stale_and_expired():
+    cache = RouteCache(ttl_s=10.0, stale_while_revalidate_s=20.0)
+    cache.put("k", {"v": 1})
+    entry = cache.get("k")
+    assert cache.is_fresh(entry) and cache.can_serve_stale(entry)
+    entry.stored_at -= 15
+    assert not cache.is_fresh(entry) and cache.can_serve_stale(entry)
+    entry.stored_at -= 20
+    assert not cache.is_fresh(entry) and not cache.can_serve_stale(entry)
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = RouteCache(max_entries=3)
+    for key in "abc":
+        cache.put(key, {"v": key})
+    assert cache.get("a") is not None  # a is now the most recent
+    cache.put("d", {"v": "d"})
+    assert cache.get("b") is None
+    assert [key for key in "acd" if cache.get(key) is not None] == ["a", "c", "d"]
+    cache.put("e", {"v": "e"})
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 3
+
+
+def test_keys_are_quantized():
+    key = RouteCache.make_key("bike", ROUTE, True)
+    nudged = [(lat + 0.00001, lon - 0.00001) for lat, lon in ROUTE]
+    assert RouteCache.make_key("bike", nudged, True) == key
+    assert RouteCache.make_key("bike", ROUTE, False) != key
+    assert RouteCache.make_key("foot", ROUTE, True) != key
+
+
+def test_fresh_entries_skip_osrm(osrm):
+    fake, cache = osrm
+    assert fetch()["routes"][0]["tag"] == "first"
+    assert fetch()["routes"][0]["tag"] == "first"
+    assert fake.requests == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_stale_entry_is_served_then_revalidated(osrm):
+    fake, cache = osrm
+    fetch()
+    age(cache, 500)  # stale, inside the revalidate window
+    fake.tag = "second"
+    assert fetch()["routes"][0]["tag"] == "first"  # served immediately
+    assert cache.stale_hits == 1 and fake.requests == 2
+    # The background revalidation replaced the entry
+    assert fetch()["routes"][0]["tag"] == "second"
+    assert fake.requests == 2
+
+
+def test_expired_entry_is_refetched_and_served_when_osrm_fails(osrm):
+    fake, cache = osrm
+    fetch()
+    age(cache, 5000)  # past ttl + revalidate window
+    fake.tag = "second"
+    assert fetch()["routes"][0]["tag"] == "second"
+    assert fake.requests == 2
+
+    age(cache, 5000)
+    fake.failing = True
+    # Any cached answer beats no route
+    assert fetch()["routes"][0]["tag"] == "second"
+    assert cache.stale_hits == 1
+
+
+def test_disk_tier_writes_in_batches_and_survives_reopen(tmp_path):
+    path = str(tmp_path / "routes.sqlite")
+    cache = RouteCache(disk_path=path)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.pending_writes == 2
+    assert RouteCache(disk_path=path).get("a") is None  # nothing written yet
+    assert cache.flush() == 2
+    assert cache.pending_writes == 0 and cache.flush() == 0
+
+    cache.put("c", {"v": 3})
+    cache.close()  # flushes
+    reopened = RouteCache(disk_path=path)
+    assert [reopened.get(key).data for key in "abc"] == [{"v": 1}, {"v": 2}, {"v": 3}]
+    reopened.close()
+
+
+def test_pending_entries_are_served_after_memory_eviction(tmp_path):
+    cache = RouteCache(max_entries=1, disk_path=str(tmp_path / "routes.sqlite"))
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})  # evicts a from memory before it reached the disk
+    assert cache.get("a").data == {"v": 1}
+    cache.close()
+
+
+def test_client_flushes_disk_tier_in_a_worker_thread(osrm, monkeypatch, tmp_path):
+    fake, _ = osrm
+    cache = RouteCache(disk_path=str(tmp_path / "routes.sqlite"))
+    monkeypatch.setattr(osrm_client, "ROUTE_CACHE", cache)
+    on_main_thread = set()
+
+    flush = cache.flush
+
+    def recording_flush():
+        on_main_thread.add(threading.current_thread() is threading.main_thread())
+        return flush()
+
+    monkeypatch.setattr(cache, "flush", recording_flush)
+    fetch()
+    assert cache.pending_writes == 0
+    assert on_main_thread == {False}
+    cache.close()
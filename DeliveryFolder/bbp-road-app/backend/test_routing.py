@@ -37,20 +37,23 @@ def test_routing():
     print("Testing different preferences...")
     print("=" * 60)
     
-    for pref in ['shortest', 'balanced']:
-        response = httpx.post(
-            'http://127.0.0.1:8000/api/path/search',
-            json={
-                'origin': {'lat': 45.4642, 'lon': 9.1900},
-                'destination': {'lat': 45.4784, 'lon': 9.2275},
-                'preferences': pref
-            },
-            timeout=30.0
-        )
-        data = response.json()
+    # One call ranks the same candidates for every preference
+    response = httpx.post(
+        'http://127.0.0.1:8000/api/path/search/rerank',
+        json={
+            'origin': {'lat': 45.4642, 'lon': 9.1900},
+            'destination': {'lat': 45.4784, 'lon': 9.2275},
+            'preferences': ['shortest', 'balanced']
+        },
+        timeout=30.0
+    )
+    data = response.json()
+    candidates = data.get('candidates', [])
+    for pref, ranking in data.get('rankings', {}).items():
         print(f"\nPreference: {pref}")
-        for route in data.get('routes', []):
-            print(f"  Route {route['route_id']}: {route['total_distance']}m, Quality: {route['road_quality_score']}, Tags: {route['tags']}")
+        for route in ranking:
+            distance = candidates[route['candidate_id']]['total_distance']
+            print(f"  Route {route['route_id']}: {distance}m, Quality: {route['road_quality_score']}, Tags: {route['tags']}")
 
 if __name__ == '__main__':
     test_routing()
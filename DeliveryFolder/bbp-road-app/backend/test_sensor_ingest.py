@@ -0,0 +1,80 @@
+"""Tests for sensor batch decoding limits (sensor_ingest.py) and the batch endpoint's 413s."""
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from sensor_ingest import BatchTooLarge, parse_columnar, parse_float32, parse_ndjson
+
+SAMPLE = {"acceleration_x": 0.1, "acceleration_y": 0.2, "acceleration_z": 9.8}
+
+
+def ndjson(n):
+    return b"\n".join(json.dumps(SAMPLE).encode() for _ in range(n)) + b"\n"
+
+
+def test_parsers_accept_exactly_max_samples():
+    assert len(parse_ndjson(ndjson(3) + b"\n\n", max_samples=3)["acceleration_z"]) == 3
+    body = np.ones((3, 3), dtype="<f4").tobytes()
+    assert len(parse_float32(body, list(SAMPLE), max_samples=3)["acceleration_z"]) == 3
+    payload = {name: [value] * 3 for name, value in SAMPLE.items()}
+    assert len(parse_columnar(payload, max_samples=3)["acceleration_z"]) == 3
+
+
+def test_parsers_stop_once_over_max_samples():
+    # The malformed line after the limit is never parsed
+    with pytest.raises(BatchTooLarge):
+        parse_ndjson(ndjson(4) + b"not json\n", max_samples=3)
+    with pytest.raises(BatchTooLarge):
+        parse_float32(np.ones((4, 3), dtype="<f4").tobytes(), list(SAMPLE), max_samples=3)
+    with pytest.raises(BatchTooLarge):
+        parse_columnar({name: [value] * 4 for name, value in SAMPLE.items()}, max_samples=3)
+
+
+@pytest.mark.parametrize("value", [3, 3.5, "3", {"v": 3}])
+def test_columnar_fields_must_be_arrays(value):
+    payload = {"acceleration_x": [1.0], "acceleration_y": [2.0], "acceleration_z": value}
+    with pytest.raises(ValueError, match="acceleration_z must be an array"):
+        parse_columnar(payload)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "SENSOR_BATCH_MAX", 3)
+    monkeypatch.setattr(main, "SENSOR_BATCH_MAX_BYTES", 1000)
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def post_batch(client, body, **headers):
+    user_id = next(iter(main.USERS))
+    return client.post(
+        f"/api/sensor-readings/batch?user_id={user_id}",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson", **headers},
+    )
+
+
+def test_batch_endpoint_rejects_large_bodies_early(client):
+    assert post_batch(client, ndjson(3)).json()["received"] == 3
+    assert post_batch(client, ndjson(4)).status_code == 413
+    # Declared too large: rejected before the body is read
+    response = post_batch(client, ndjson(1), **{"Content-Length": "5000"})
+    assert response.status_code == 413
+
+    def chunked():
+        for _ in range(20):
+            yield b" " * 100
+
+    assert post_batch(client, chunked()).status_code == 413
+
+
+def test_batch_endpoint_rejects_scalar_columns(client):
+    response = post_batch(
+        client, json.dumps({"acceleration_x": 1, "acceleration_y": 2, "acceleration_z": 3}),
+        **{"Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "acceleration_x must be an array"
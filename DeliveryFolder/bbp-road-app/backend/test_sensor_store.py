@@ -0,0 +1,142 @@
+"""Tests for the ring-buffer sensor store with disk spill (sensor_store.py)."""
+import os
+import random
+import shutil
+
+import numpy as np
+
+from sensor_store import SENSOR_DTYPE, SensorRing, SensorStore, make_records, to_dicts
+
+
+def records(first_id, n):
+    recs = np.zeros(n, dtype=SENSOR_DTYPE)
+    recs["id"] = np.arange(first_id, first_id + n)
+    recs["acceleration_z"] = recs["id"] * 0.5
+    recs["latitude"] = 45.0 + recs["id"] * 1e-6
+    return recs
+
+
+def ids(recs):
+    return recs["id"].tolist()
+
+
+def test_single_appends_wrap_around_and_spill_oldest_in_order(tmp_path):
+    ring = SensorRing(capacity=8, spill_path=str(tmp_path / "u.bin"), spill_block=3)
+    for i in range(1, 31):
+        ring.append(records(i, 1))
+        assert 1 <= ring.in_memory <= 8
+        assert len(ring) == i
+        # Memory holds the newest readings, disk the older ones, nothing lost
+        assert ids(ring.history()) + ids(ring.recent(8)) == list(range(1, i + 1))
+    assert ring.spilled == 30 - ring.in_memory
+    assert ring.spilled % 3 == 0  # evicted in whole blocks
+    history = ring.history()
+    assert isinstance(history, np.memmap)
+    assert history["acceleration_z"].tolist() == [i * 0.5 for i in range(1, ring.spilled + 1)]
+    assert os.path.getsize(ring.spill_path) == ring.spilled * SENSOR_DTYPE.itemsize
+    for n in (1, 5, 8, 12, 30, 100):
+        assert ids(ring.latest(n)) == list(range(max(1, 31 - n), 31))
+
+
+def test_batch_larger_than_capacity(tmp_path):
+    ring = SensorRing(capacity=10, spill_path=str(tmp_path / "u.bin"), spill_block=4)
+    ring.append(records(1, 6))
+    ring.append(records(7, 25))
+    assert ring.in_memory == 10 and ring.spilled == 21
+    assert ids(ring.history()) == list(range(1, 22))
+    assert ids(ring.recent(10)) == list(range(22, 32))
+    ring.append(records(32, 3))
+    assert ids(ring.latest(40)) == list(range(1, 35))
+
+
+def test_random_batches_match_reference(tmp_path):
+    rng = random.Random(5)
+    ring = SensorRing(capacity=50, spill_path=str(tmp_path / "u.bin"), spill_block=8)
+    expected = []
+    next_id = 1
+    for _ in range(300):
+        n = rng.randrange(0, 70)
+        ring.append(records(next_id, n))
+        expected.extend(range(next_id, next_id + n))
+        next_id += n
+        q = rng.randrange(1, 200)
+        assert ids(ring.latest(q)) == expected[-q:]
+    assert ids(ring.history()) + ids(ring.recent(50)) == expected
+
+
+def test_history_views_stay_valid_as_the_spill_file_grows(tmp_path):
+    ring = SensorRing(capacity=4, spill_path=str(tmp_path / "u.bin"), spill_block=2)
+    ring.append(records(1, 8))
+    early = ring.history()
+    ring.append(records(9, 8))
+    assert ids(early) == [1, 2, 3, 4]
+    assert ids(ring.history()) == list(range(1, 13))
+
+
+def test_without_spill_dir_old_readings_are_dropped():
+    store = SensorStore(capacity=5, spill_dir=None, spill_block=2)
+    store.append(1, records(1, 12))
+    assert ids(store.latest(1, 100)) == list(range(8, 13))
+    assert store.stats(1) == {"readings": 5, "in_memory": 5, "spilled": 0, "record_bytes": SENSOR_DTYPE.itemsize}
+
+
+def test_store_keeps_users_apart(tmp_path):
+    store = SensorStore(capacity=4, spill_dir=str(tmp_path), spill_block=2)
+    store.append(1, records(1, 10))
+    store.append(2, records(100, 3))
+    assert ids(store.latest(1, 100)) == list(range(1, 11))
+    assert ids(store.latest(2, 100)) == [100, 101, 102]
+    assert ids(store.latest(3, 100)) == []
+    assert 3 not in store
+    assert store.stats(1)["spilled"] == 6 and store.stats(2)["spilled"] == 0
+
+
+def test_reopened_store_starts_empty_and_overwrites_spill_files(tmp_path):
+    store = SensorStore(capacity=4, spill_dir=str(tmp_path), spill_block=2)
+    store.append(1, records(1, 10))
+    path = store.ring(1).spill_path
+    assert os.path.getsize(path) == 6 * SENSOR_DTYPE.itemsize
+
+    # Like the rest of the in-memory data, a new process starts from scratch
+    reopened = SensorStore(capacity=4, spill_dir=str(tmp_path), spill_block=2)
+    assert len(reopened.ring(1)) == 0
+    assert ids(reopened.latest(1, 100)) == []
+    reopened.append(1, records(500, 3))
+    assert ids(reopened.latest(1, 100)) == [500, 501, 502]  # nothing spilled yet
+    reopened.append(1, records(503, 3))
+    assert ids(reopened.ring(1).history()) == [500, 501]
+    assert os.path.getsize(path) == 2 * SENSOR_DTYPE.itemsize
+    assert ids(reopened.latest(1, 100)) == list(range(500, 506))
+
+
+def test_temporary_spill_dir_created_on_first_use():
+    store = SensorStore(capacity=2, spill_dir="", spill_block=1)
+    store.append(7, records(1, 5))
+    try:
+        assert os.path.isdir(store.spill_dir)
+        assert ids(store.latest(7, 10)) == [1, 2, 3, 4, 5]
+    finally:
+        shutil.rmtree(store.spill_dir)
+
+
+def test_records_round_trip_to_api_dicts():
+    columns = {
+        "acceleration_x": np.array([0.1, 1.0]),
+        "acceleration_y": np.array([0.0, -2.5]),
+        "acceleration_z": np.array([9.8, 30.0]),
+        "speed_mps": np.array([0.0, 4.2]),
+        "gps_accuracy_m": np.array([np.nan, 5.0]),
+        "latitude": np.array([45.4642123, np.nan]),
+        "longitude": np.array([9.1900456, np.nan]),
+    }
+    recs = make_records(10, 1_700_000_000_000_000, columns, np.array([1, 3]))
+    first, second = to_dicts(recs, user_id=3)
+    assert first == {
+        "id": 10, "user_id": 3,
+        "acceleration_x": 0.1, "acceleration_y": 0.0, "acceleration_z": 9.8,
+        "speed_mps": 0.0, "gps_accuracy_m": None,
+        "latitude": 45.4642123, "longitude": 9.1900456,
+        "severity": "bump", "timestamp": "2023-11-14T22:13:20",
+    }
+    assert second["id"] == 11 and second["severity"] == "severe"
+    assert second["latitude"] is None and second["gps_accuracy_m"] == 5.0
@@ -0,0 +1,122 @@
+"""Tests for the segment grid index (spatial_index.py)."""
+import random
+
+from path_cache import PathResultCache
+from spatial_index import SegmentGridIndex, point_to_segment_distance
+
+TOL = 0.0005
+
+
+def brute_force_near(segments, coords, tolerance_deg):
+    found = []
+    for sid, (s_lat, s_lon, e_lat, e_lon) in segments.items():
+        mid_lon, mid_lat = (s_lon + e_lon) / 2, (s_lat + e_lat) / 2
+        if any(
+            point_to_segment_distance(mid_lon, mid_lat, *coords[i], *coords[i + 1]) < tolerance_deg
+            for i in range(len(coords) - 1)
+        ):
+            found.append(sid)
+    return sorted(found)
+
+
+def random_segments(rng, n):
+    segments = {}
+    for sid in range(1, n + 1):
+        lat, lon = 45.45 + rng.random() * 0.05, 9.17 + rng.random() * 0.05
+        segments[sid] = (lat, lon, lat + rng.uniform(-0.003, 0.003), lon + rng.uniform(-0.003, 0.003))
+    return segments
+
+
+def test_query_polyline_matches_brute_force():
+    rng = random.Random(1)
+    segments = random_segments(rng, 400)
+    index = SegmentGridIndex()
+    for sid, geometry in segments.items():
+        index.insert(sid, *geometry)
+    for _ in range(20):
+        coords = [[9.17 + rng.random() * 0.05, 45.45 + rng.random() * 0.05] for _ in range(6)]
+        assert index.query_polyline(coords, TOL) == brute_force_near(segments, coords, TOL)
+
+
+def test_insert_move_and_delete():
+    index = SegmentGridIndex()
+    route = [[9.100, 45.000], [9.110, 45.000]]
+    index.insert(1, 45.0, 9.101, 45.0, 9.103)
+    assert index.query_polyline(route, TOL) == [1]
+    assert 1 in index and len(index) == 1
+
+    # Re-inserting moves the segment: it leaves its old cells
+    index.insert(1, 46.0, 10.0, 46.0, 10.002)
+    assert index.query_polyline(route, TOL) == []
+    assert index.query_polyline([[10.0, 46.0], [10.01, 46.0]], TOL) == [1]
+    assert index.segment_endpoints(1) == [[10.0, 46.0], [10.002, 46.0]]
+    assert len(index) == 1
+
+    index.remove(1)
+    assert 1 not in index and len(index) == 0
+    assert index.query_polyline([[10.0, 46.0], [10.01, 46.0]], TOL) == []
+    assert index.query_point(46.0, 10.001, TOL) == []
+    index.remove(1)  # removing twice is a no-op
+
+
+def test_query_point_and_nearest_point():
+    index = SegmentGridIndex()
+    index.insert(1, 45.0, 9.0, 45.0, 9.01)  # east-west along lat 45.0
+    index.insert(2, 45.002, 9.0, 45.002, 9.01)
+    hits = index.query_point(45.0005, 9.005, 0.003)
+    assert [sid for _, sid in hits] == [1, 2]
+    assert abs(hits[0][0] - 0.0005) < 1e-9
+    assert index.query_point(45.01, 9.005, 0.003) == []
+
+    sid, lat, lon = index.nearest_point(45.0005, 9.005, 0.003)
+    assert sid == 1 and abs(lat - 45.0) < 1e-12 and abs(lon - 9.005) < 1e-12
+    # Clamped to the segment's end
+    sid, lat, lon = index.nearest_point(45.0, 9.012, 0.003)
+    assert (sid, lat, lon) == (1, 45.0, 9.01)
+    assert index.nearest_point(45.5, 9.5, 0.003) is None
+
+
+def test_cell_versions_change_only_for_covered_cells():
+    index = SegmentGridIndex()
+    route = [[9.100, 45.000], [9.104, 45.000]]
+    cells = index.covered_cells(route, TOL)
+    stamp = index.cells_version(cells)
+
+    # Far away: the global version moves, the route's cells do not
+    index.insert(1, 46.0, 10.0, 46.0, 10.001)
+    assert index.cells_version(cells) == stamp
+    index.touch(1)
+    assert index.cells_version(cells) == stamp
+
+    index.insert(2, 45.0001, 9.101, 45.0001, 9.102)
+    after_insert = index.cells_version(cells)
+    assert after_insert != stamp
+    index.touch(2)
+    after_touch = index.cells_version(cells)
+    assert after_touch != after_insert
+    index.remove(2)
+    assert index.cells_version(cells) != after_touch
+
+    version = index.version
+    index.touch(99)  # unknown segment
+    assert index.version == version
+
+
+def test_covered_cells_gives_up_on_huge_routes():
+    index = SegmentGridIndex()
+    assert index.covered_cells([[0.0, 0.0], [10.0, 10.0]], TOL) is None
+    assert index.covered_cells([[9.1, 45.0], [9.101, 45.0]], TOL)
+
+
+def test_path_cache_invalidated_by_nearby_change_only():
+    index = SegmentGridIndex()
+    cache = PathResultCache(index, max_entries=8, ttl_s=60)
+    route = [[9.100, 45.000], [9.104, 45.000]]
+    cache.put("k", {"ok": True}, [route], TOL)
+    assert cache.get("k") == {"ok": True}
+
+    index.insert(1, 46.0, 10.0, 46.0, 10.001)
+    assert cache.get("k") == {"ok": True}
+
+    index.insert(2, 45.0001, 9.101, 45.0001, 9.102)
+    assert cache.get("k") is None
@@ -1,7 +1,15 @@
-import { useMemo, useState, useEffect } from "react";
+import { useMemo, useState, useEffect, useRef } from "react";
 import { MapContainer, Marker, Polyline, TileLayer, useMap, Popup, CircleMarker } from "react-leaflet";
 import L from "leaflet";
-import { searchRoutes, type ScoredRoute, type PathSearchPreference, type Weather, type PathSearchResponse } from "./api";
+import {
+  searchRoutes,
+  streamRoutes,
+  type ScoredRoute,
+  type RouteCandidate,
+  type PathSearchPreference,
+  type Weather,
+  type PathSearchResponse,
+} from "./api";
 import { useAppContext } from "./AppContext";
 
 const icon = new L.Icon({
@@ -147,7 +155,47 @@ export default function RoutePlanningPage() {
     cursor: "pointer",
   };
 
+  const closeStream = useRef<(() => void) | null>(null);
+
+  // Stop a running search stream when leaving the page
+  useEffect(() => () => closeStream.current?.(), []);
+
+  function applyResult(result: PathSearchResponse) {
+    setRoutes(result.routes);
+    if (result.routes.length > 0) {
+      setSelectedRouteId(result.routes[0].route_id);
+    }
+    // Set weather info
+    if (result.weather) {
+      setWeather(result.weather);
+    }
+    if (result.cycling_recommendation) {
+      setCyclingRecommendation(result.cycling_recommendation);
+    }
+    if (result.route_source) {
+      setRouteSource(result.route_source);
+    }
+  }
+
+  // Unranked candidate shown while the remaining routes are still being fetched
+  function candidateRoute(candidate: RouteCandidate): ScoredRoute {
+    return {
+      route_id: String.fromCharCode(65 + candidate.candidate_id),
+      rank: candidate.candidate_id + 1,
+      total_distance: candidate.total_distance,
+      duration_s: candidate.duration_s,
+      duration_display: candidate.duration_display,
+      road_quality_score: candidate.road_quality_score,
+      tags: [],
+      geometry: candidate.geometry,
+      geometry_geojson: candidate.geometry_geojson,
+      segments_warning: candidate.segments_warning,
+      source: candidate.source,
+    };
+  }
+
   async function handleSearch() {
+    closeStream.current?.();
     setLoading(true);
     setError(null);
     setRoutes([]);
@@ -156,26 +204,33 @@ export default function RoutePlanningPage() {
     setCyclingRecommendation(null);
     setRouteSource(null);
 
+    const originCoord = { lat: originLat, lon: originLon };
+    const destCoord = { lat: destLat, lon: destLon };
+
+    if (typeof EventSource !== "undefined") {
+      // Draw each route as soon as it is scored; the final event ranks and tags them
+      closeStream.current = streamRoutes(originCoord, destCoord, preference, {
+        onCandidate: (candidate) => {
+          const route = candidateRoute(candidate);
+          setRoutes((prev) => [...prev, route]);
+          setSelectedRouteId((prev) => prev ?? route.route_id);
+        },
+        onResult: (result) => {
+          closeStream.current = null;
+          applyResult(result);
+          setLoading(false);
+        },
+        onError: (message) => {
+          closeStream.current = null;
+          setError(message);
+          setLoading(false);
+        },
+      });
+      return;
+    }
+
     try {
-      const result = await searchRoutes(
-        { lat: originLat, lon: originLon },
-        { lat: destLat, lon: destLon },
-        preference
-      );
-      setRoutes(result.routes);
-      if (result.routes.length > 0) {
-        setSelectedRouteId(result.routes[0].route_id);
-      }
-      // Set weather info
-      if (result.weather) {
-        setWeather(result.weather);
-      }
-      if (result.cycling_recommendation) {
-        setCyclingRecommendation(result.cycling_recommendation);
-      }
-      if (result.route_source) {
-        setRouteSource(result.route_source);
-      }
+      applyResult(await searchRoutes(originCoord, destCoord, preference));
     } catch (e: any) {
       setError(e?.message ?? "Failed to search routes");
     } finally {
@@ -183,6 +238,7 @@ export default function RoutePlanningPage() {
     }
   }
 
+
   const origin: [number, number] = [originLat, originLon];
   const dest: [number, number] = [destLat, destLon];
   const center: [number, number] = [(originLat + destLat) / 2, (originLon + destLon) / 2];
@@ -433,7 +489,7 @@ export default function RoutePlanningPage() {
                       {route.rank}
                     </div>
                     <div style={{ fontWeight: 700, color: "#111" }}>Route {route.route_id}</div>
-                    {route.rank === 1 && (
+                    {route.rank === 1 && !loading && (
                       <span
                         style={{
                           padding: "2px 8px",
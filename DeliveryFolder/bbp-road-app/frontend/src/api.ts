@@ -295,6 +295,66 @@ export async function searchRoutes(
   });
 }
 
+export type RouteCandidate = {
+  candidate_id: number;
+  source: string;
+  total_distance: number;
+  duration_s: number;
+  duration_display: string;
+  score: number;
+  road_quality_score: number;
+  segments_warning: SegmentWarning[];
+  geometry: string;
+  geometry_geojson: {
+    type: string;
+    coordinates: [number, number][];
+  };
+};
+
+export type RouteStreamHandlers = {
+  onCandidate: (candidate: RouteCandidate) => void;
+  onResult: (result: PathSearchResponse) => void;
+  onError: (message: string) => void;
+};
+
+// Progressive search over Server-Sent Events: each candidate route is
+// delivered as soon as it is scored, then the final ranked result.
+// Returns a function that closes the stream.
+export function streamRoutes(
+  origin: Coordinate,
+  destination: Coordinate,
+  preferences: PathSearchPreference,
+  handlers: RouteStreamHandlers
+): () => void {
+  const query = new URLSearchParams({
+    origin_lat: String(origin.lat),
+    origin_lon: String(origin.lon),
+    dest_lat: String(destination.lat),
+    dest_lon: String(destination.lon),
+    preferences,
+  });
+  const source = new EventSource(`${API_BASE}/path/search/stream?${query}`);
+  let done = false;
+  const finish = () => {
+    done = true;
+    source.close();
+  };
+  source.addEventListener("candidate", (e) => {
+    handlers.onCandidate(JSON.parse((e as MessageEvent).data));
+  });
+  source.addEventListener("result", (e) => {
+    finish();
+    handlers.onResult(JSON.parse((e as MessageEvent).data));
+  });
+  source.addEventListener("error", (e) => {
+    if (done) return;
+    finish();
+    const data = (e as MessageEvent).data;
+    handlers.onError(data ? JSON.parse(data).detail : "Route stream failed");
+  });
+  return finish;
+}
+
 // ---- Weather API ----
 export async function getWeather(lat: number, lon: number, userId?: number): Promise<Weather> {
   const query = userId !== undefined ? `?lat=${lat}&lon=${lon}&user_id=${userId}` : `?lat=${lat}&lon=${lon}`;
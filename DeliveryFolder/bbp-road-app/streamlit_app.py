@@ -53,6 +53,23 @@ def api_post(endpoint: str, json_data: dict = None, params: dict = None):
         st.error(f"API Error: {e}")
         return None
 
+def api_stream_events(endpoint: str, params: dict = None):
+    """Yield (event, data) pairs from a Server-Sent Events endpoint."""
+    try:
+        with requests.get(f"{BACKEND_URL}{endpoint}", params=params, stream=True, timeout=10) as resp:
+            resp.raise_for_status()
+            event = "message"
+            for line in resp.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[5:])
+                    event = "message"
+    except requests.exceptions.ConnectionError:
+        st.error(f"Cannot connect to backend at {BACKEND_URL}. Is it running?")
+    except Exception as e:
+        st.error(f"API Error: {e}")
+
 def get_seg_name(seg):
     """Get segment name from various possible fields."""
     return seg.get("road_name") or seg.get("name") or f"Segment {seg.get('id', '?')}"
@@ -1002,11 +1019,27 @@ elif menu == "Route Planning":
         to_lon = st.session_state.dest_lon
         
         with st.spinner("..."):
-            routes = api_post("/api/path/search", {
-                "origin": {"lat": from_lat, "lon": from_lon},
-                "destination": {"lat": to_lat, "lon": to_lon},
-                "preferences": mode
-            }, {"user_id": user_id})
+            # Progressive search: list each route as soon as it is scored
+            routes = None
+            progress = st.empty()
+            found = []
+            for event, data in api_stream_events("/api/path/search/stream", {
+                "origin_lat": from_lat, "origin_lon": from_lon,
+                "dest_lat": to_lat, "dest_lon": to_lon,
+                "preferences": mode, "user_id": user_id,
+                "geometry_format": "geojson",
+            }):
+                if event == "candidate":
+                    found.append(
+                        f"{data['total_distance'] / 1000:.2f} km, "
+                        f"{t('road_quality')} {data['road_quality_score']:.0f}/100"
+                    )
+                    progress.info("\n\n".join(found))
+                elif event == "result":
+                    routes = data
+                elif event == "error":
+                    st.error(f"API Error: {data.get('detail')}")
+            progress.empty()
             
             if routes and routes.get("routes"):
                 st.success(f"{t('route_details')}: {len(routes['routes'])}")
@@ -1527,9 +1560,29 @@ elif menu == "Trips":
                 document.getElementById('start-btn').style.display = 'inline-block';
                 document.getElementById('stop-btn').style.display = 'none';
                 document.getElementById('track-status').innerHTML = '✅ Stopped · ' + trackData.length + ' points';
+                uploadTrack();
+            }
+            
+            // Upload the recorded trace as a trip; the backend map-matches it to segments
+            function uploadTrack() {
+                if (trackData.length < 2) { return; }
+                fetch('__BACKEND_URL__/api/trips/trace', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ user_id: __USER_ID__, points: trackData })
+                })
+                    .then(function(resp) { return resp.ok ? resp.json() : Promise.reject(resp.status); })
+                    .then(function(trip) {
+                        document.getElementById('track-status').innerHTML =
+                            '✅ Trip #' + trip.id + ' saved · ' + trip.traversals.length + ' segments';
+                        localStorage.removeItem('gps_track');
+                    })
+                    .catch(function() {
+                        document.getElementById('track-status').innerHTML += ' · ⚠️ upload failed';
+                    });
             }
         </script>
-        """
+        """.replace("__BACKEND_URL__", BACKEND_URL).replace("__USER_ID__", str(user_id))
         st.components.v1.html(gps_tracking_html, height=100)
         
         # Current coordinates display